@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Template Matching Benchmark for Ubuntu AI RPA Agent
+Pastes templates at known positions onto synthetic desktops (with noise, scaling
+and occlusion) and reports latency percentiles, throughput and hit accuracy of
+every search mode. Runs headless, no X server needed.
+
+    python benchmark_templates.py --output results.json
+    python benchmark_templates.py --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from template_matching import (
+    TEMPLATE_EXTENSION,
+    Template,
+    TemplateMatcher,
+    match_template,
+    match_template_pyramid,
+    scale_steps,
+)
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+# How the pasted template differs from the stored one
+SCENARIOS = {
+    "clean": {},
+    "noise": {"noise": 12.0},
+    "scaled": {"scale": 1.25},
+    "occluded": {"occlusion": 0.25},
+}
+
+# A hit must land within this many pixels of the true template center
+HIT_TOLERANCE = 3
+
+# Latency increase (fraction) or accuracy drop (absolute) flagged by --compare
+LATENCY_REGRESSION = 0.2
+ACCURACY_REGRESSION = 0.05
+
+
+def synthetic_desktop(width, height, rng):
+    """Draw a fake desktop: gradient wallpaper, windows, buttons and text"""
+    gradient = np.linspace(40, 120, width, dtype=np.float32)
+    screen = np.tile(gradient, (height, 1)).astype(np.uint8)
+
+    for _ in range(max(8, width * height // 200000)):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 150))
+        w, h = int(rng.integers(150, 800)), int(rng.integers(100, 600))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), int(rng.integers(180, 250)), -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + 24), int(rng.integers(60, 100)), -1)
+
+        for _ in range(int(rng.integers(2, 8))):
+            bx, by = x + int(rng.integers(0, w)), y + 24 + int(
+                rng.integers(0, max(1, h - 24))
+            )
+            cv2.rectangle(
+                screen,
+                (bx, by),
+                (bx + int(rng.integers(30, 120)), by + 24),
+                int(rng.integers(0, 255)),
+                -1,
+            )
+            cv2.putText(
+                screen,
+                f"item {int(rng.integers(0, 1000))}",
+                (bx + 4, by + 17),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                int(rng.integers(0, 255)),
+                1,
+            )
+
+    return screen
+
+
+def synthetic_icon(rng):
+    """Draw a small UI element: a framed button with a shape and a label"""
+    w, h = int(rng.integers(40, 160)), int(rng.integers(24, 80))
+    icon = np.full((h, w), int(rng.integers(150, 230)), np.uint8)
+    cv2.rectangle(icon, (0, 0), (w - 1, h - 1), int(rng.integers(0, 80)), 2)
+    cv2.circle(icon, (h // 2, h // 2), max(4, h // 3), int(rng.integers(0, 120)), -1)
+    cv2.putText(
+        icon,
+        f"{int(rng.integers(0, 100))}",
+        (h, h // 2 + 6),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.5,
+        int(rng.integers(0, 60)),
+        1,
+    )
+    return icon
+
+
+def load_templates(template_dir, count, rng):
+    """Templates from the template directory, topped up with synthetic ones"""
+    templates = []
+    if os.path.isdir(template_dir):
+        for filename in sorted(os.listdir(template_dir)):
+            if not filename.endswith(TEMPLATE_EXTENSION):
+                continue
+            image = cv2.imread(
+                os.path.join(template_dir, filename), cv2.IMREAD_GRAYSCALE
+            )
+            if image is not None:
+                templates.append(
+                    Template(
+                        os.path.splitext(filename)[0],
+                        filename,
+                        image,
+                        0,
+                        pyramid_levels=3,
+                    )
+                )
+
+    while len(templates) < count:
+        name = f"synthetic{len(templates)}"
+        templates.append(Template(name, name, synthetic_icon(rng), 0, pyramid_levels=3))
+    return templates[:count]
+
+
+def distort(image, rng, noise=0.0, scale=1.0, occlusion=0.0):
+    """The template as it appears on screen"""
+    if scale != 1.0:
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+    image = image.copy()
+    if occlusion:
+        # Cover a corner, e.g. a tooltip or another window
+        h, w = image.shape[:2]
+        cv2.rectangle(
+            image,
+            (int(w * (1 - occlusion)), 0),
+            (w, int(h * 0.6)),
+            int(rng.integers(0, 255)),
+            -1,
+        )
+    if noise:
+        image = np.clip(image + rng.normal(0, noise, image.shape), 0, 255).astype(
+            np.uint8
+        )
+    return image
+
+
+def make_cases(screen, templates, rng, **distortion):
+    """Paste every template once at a random position, returns [(template, true center)]"""
+    height, width = screen.shape[:2]
+    cases = []
+    for template in templates:
+        image = distort(template.image, rng, **distortion)
+        h, w = image.shape[:2]
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        screen[y : y + h, x : x + w] = image
+        cases.append((template, (x + w // 2, y + h // 2)))
+    return cases
+
+
+class _StaticLibrary:
+    """Stands in for TemplateLibrary with templates that only exist in memory"""
+
+    def __init__(self, templates):
+        self._templates = {t.name: t for t in templates}
+
+    def get(self, name):
+        return self._templates.get(name)
+
+
+def search_modes(templates):
+    """name -> (search(screen, template), warm up before timing)"""
+    library = _StaticLibrary(templates)
+    hinted = TemplateMatcher(library, max_workers=1)
+    multiscale = TemplateMatcher(
+        library, max_workers=1, hint_padding=None, scales=scale_steps(0.8, 1.25, 5)
+    )
+
+    return {
+        "exhaustive": (lambda s, t: match_template(s, t), False),
+        "pyramid-1": (lambda s, t: match_template_pyramid(s, t, levels=1), False),
+        "pyramid-2": (lambda s, t: match_template_pyramid(s, t, levels=2), False),
+        "pyramid-3": (lambda s, t: match_template_pyramid(s, t, levels=3), False),
+        "multiscale": (lambda s, t: multiscale.match(s, t.name), False),
+        "hinted-warm": (lambda s, t: hinted.match(s, t.name), True),
+    }
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def run_mode(search, warm_up, screen, cases, repeat):
+    latencies = []
+    hits = 0
+    for template, (true_x, true_y) in cases:
+        if warm_up:
+            search(screen, template)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = search(screen, template)
+            latencies.append((time.perf_counter() - start) * 1000)
+        if (
+            result
+            and abs(result[0] - true_x) <= HIT_TOLERANCE
+            and abs(result[1] - true_y) <= HIT_TOLERANCE
+        ):
+            hits += 1
+
+    total_seconds = sum(latencies) / 1000
+    return {
+        "lookups": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_per_s": len(latencies) / total_seconds if total_seconds else None,
+        "accuracy": hits / len(cases) if cases else None,
+    }
+
+
+def git_commit():
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                timeout=5,
+            ).stdout.strip()
+            or None
+        )
+    except Exception:
+        return None
+
+
+def compare(results, baseline):
+    """Print the change of every shared result against a baseline run, returns the regressions"""
+    previous = {
+        (r["resolution"], r["scenario"], r["mode"]): r for r in baseline["results"]
+    }
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for r in results:
+        key = (r["resolution"], r["scenario"], r["mode"])
+        old = previous.get(key)
+        if not old or not old["p50_ms"]:
+            continue
+        latency_change = r["p50_ms"] / old["p50_ms"] - 1
+        accuracy_change = r["accuracy"] - old["accuracy"]
+        flag = ""
+        if (
+            latency_change > LATENCY_REGRESSION
+            or accuracy_change < -ACCURACY_REGRESSION
+        ):
+            flag = "  << regression"
+            regressions.append(key)
+        print(
+            f"{' / '.join(key):<36} p50 {latency_change:+7.1%}  accuracy {accuracy_change:+6.0%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--resolutions", nargs="+", choices=RESOLUTIONS, default=list(RESOLUTIONS)
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument("--modes", nargs="+", help="Only run these search modes")
+    parser.add_argument("--template-dir", default="templates")
+    parser.add_argument(
+        "--templates", type=int, default=10, help="Templates pasted per screen"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed lookups per template"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="Write machine-readable results to this JSON file"
+    )
+    parser.add_argument("--compare", help="Compare against a previous --output file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    templates = load_templates(args.template_dir, args.templates, rng)
+    modes = search_modes(templates)
+    if args.modes:
+        modes = {name: mode for name, mode in modes.items() if name in args.modes}
+
+    results = []
+    print(
+        f"{'resolution':<10} {'scenario':<9} {'mode':<12} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+        f"{'lookups/s':>10} {'accuracy':>9}"
+    )
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        for scenario in args.scenarios:
+            screen = synthetic_desktop(width, height, rng)
+            cases = make_cases(screen, templates, rng, **SCENARIOS[scenario])
+            for mode, (search, warm_up) in modes.items():
+                stats = run_mode(search, warm_up, screen, cases, args.repeat)
+                results.append(
+                    {
+                        "resolution": resolution,
+                        "scenario": scenario,
+                        "mode": mode,
+                        **stats,
+                    }
+                )
+                print(
+                    f"{resolution:<10} {scenario:<9} {mode:<12} {stats['p50_ms']:>8.2f} {stats['p90_ms']:>8.2f} "
+                    f"{stats['p99_ms']:>8.2f} {stats['throughput_per_s']:>10.1f} {stats['accuracy']:>9.0%}"
+                )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
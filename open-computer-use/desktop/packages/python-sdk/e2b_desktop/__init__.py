@@ -1,3 +1,5 @@
 from e2b import *
 
-from .main import Sandbox
\ No newline at end of file
+from .main import Sandbox
+from .main_async import AsyncSandbox
+from .pool import SandboxPool
@@ -0,0 +1,159 @@
+"""
+Input actions as both input server operations and the equivalent xdotool command.
+
+Buttons are X button numbers and keys are X keysym names, the mapping from the
+friendly names used by `Sandbox` happens in `main.py`.
+"""
+
+from base64 import b64decode
+from dataclasses import dataclass
+from shlex import quote as quote_string
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class Action(NamedTuple):
+    name: str
+    # Operations for the input server, see `input_server.py`
+    ops: list
+    # Shell command doing the same with xdotool
+    command: str
+    # Time the action itself takes, e.g. typing delays, in milliseconds
+    expected_ms: float = 0
+
+
+@dataclass
+class ActionResult:
+    """
+    Result of one action of a batch.
+    """
+
+    action: str
+    ok: bool
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+def move_mouse(x: int, y: int) -> Action:
+    return Action("move_mouse", [["move", x, y]], f"xdotool mousemove --sync {x} {y}")
+
+
+def click(
+    name: str,
+    button: int,
+    x: Optional[int] = None,
+    y: Optional[int] = None,
+    repeat: int = 1,
+) -> Action:
+    ops, command = [], "xdotool"
+    if x is not None and y is not None:
+        ops.append(["move", x, y])
+        command += f" mousemove --sync {x} {y}"
+    ops.append(["click", button, repeat])
+    command += (
+        f" click --repeat {repeat} {button}" if repeat > 1 else f" click {button}"
+    )
+    return Action(name, ops, command)
+
+
+def scroll(button: int, amount: int) -> Action:
+    return Action(
+        "scroll",
+        [["click", button, amount]],
+        f"xdotool click --repeat {amount} {button}",
+    )
+
+
+def mouse_press(button: int) -> Action:
+    return Action("mouse_press", [["down", button]], f"xdotool mousedown {button}")
+
+
+def mouse_release(button: int) -> Action:
+    return Action("mouse_release", [["up", button]], f"xdotool mouseup {button}")
+
+
+def drag(fr: Tuple[int, int], to: Tuple[int, int], button: int) -> Action:
+    return Action(
+        "drag",
+        [["move", *fr], ["down", button], ["move", *to], ["up", button]],
+        f"xdotool mousemove --sync {fr[0]} {fr[1]} mousedown {button}"
+        f" mousemove --sync {to[0]} {to[1]} mouseup {button}",
+    )
+
+
+def press(key: str) -> Action:
+    return Action("press", [["key", key]], f"xdotool key {key}")
+
+
+def write(text: str, chunk_size: int, delay_in_ms: int) -> Action:
+    # xdotool type takes every remaining argument as text, so chunks can't be chained
+    chunks: List[str] = [
+        text[i : i + chunk_size] for i in range(0, len(text), chunk_size)
+    ]
+    command = (
+        " && ".join(
+            f"xdotool type --delay {delay_in_ms} {quote_string(chunk)}"
+            for chunk in chunks
+        )
+        or "true"
+    )
+    return Action(
+        "write", [["type", text, delay_in_ms]], command, len(text) * delay_in_ms
+    )
+
+
+def wait(ms: int) -> Action:
+    return Action("wait", [["sleep", ms]], f"sleep {ms / 1000}", ms)
+
+
+def server_results(batch: List[Action], reply: dict) -> List[ActionResult]:
+    """
+    Per-action results from the input server's reply to the batch's operations.
+    """
+    timings, results, op_index = reply["timings"], [], 0
+    for action in batch:
+        end = op_index + len(action.ops)
+        if end <= len(timings):
+            results.append(ActionResult(action.name, True, sum(timings[op_index:end])))
+        elif op_index <= len(timings):
+            results.append(
+                ActionResult(
+                    action.name, False, sum(timings[op_index:]), reply.get("error")
+                )
+            )
+        else:
+            results.append(ActionResult(action.name, False, error="Not run"))
+        op_index = end
+    return results
+
+
+def batch_script(batch: List[Action]) -> str:
+    """
+    One shell script running every action's command and printing
+    "<index> ok <ns>" or "<index> error <ns> <base64 output>" for each.
+    """
+    lines = []
+    for i, action in enumerate(batch):
+        lines.append(
+            f"t=$(date +%s%N); if out=$({action.command} 2>&1); "
+            f'then echo "{i} ok $(( $(date +%s%N) - t ))"; '
+            f'else echo "{i} error $(( $(date +%s%N) - t )) $(printf %s "$out" | base64 -w 0)"; exit 0; fi'
+        )
+    return "\n".join(lines)
+
+
+def script_results(batch: List[Action], stdout: str) -> List[ActionResult]:
+    """
+    Per-action results from the output of `batch_script()`.
+    """
+    results = [ActionResult(action.name, False, error="Not run") for action in batch]
+    for line in stdout.splitlines():
+        index, status, elapsed_ns, *output = line.split(" ", 3)
+        result = results[int(index)]
+        result.ok = status == "ok"
+        result.duration_ms = int(elapsed_ns) / 1e6
+        result.error = (
+            None
+            if result.ok
+            else b64decode(output[0] if output else "").decode(errors="replace")
+        )
+    return results
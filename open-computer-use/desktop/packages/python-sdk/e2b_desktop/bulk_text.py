@@ -0,0 +1,99 @@
+"""
+Strategies for writing long text in one go, used by `Sandbox.write(strategy=...)`.
+
+    xtest      The input server types the whole text in one message, with no delay
+    file       The text is passed to one `xdotool type --file` command
+    clipboard  The text is put on the clipboard with xclip and pasted, typing it
+               with `xdotool type --file` instead if xclip is missing
+
+Typing a character the keyboard layout lacks means remapping a key first, so
+long texts full of such characters are faster and safer to paste.
+"""
+
+from base64 import b64encode
+from shlex import quote as quote_string
+from typing import Literal, Optional, get_args
+
+Strategy = Literal["auto", "xtest", "file", "clipboard"]
+STRATEGIES = get_args(Strategy)
+
+# Characters every keyboard layout types directly
+TYPEABLE = frozenset(chr(c) for c in range(0x20, 0x7F)) | {"\n", "\t"}
+
+# Texts longer than this with characters outside the layout are pasted
+CLIPBOARD_MIN_LENGTH = 200
+
+# Encoded texts up to this size go inline in the command, larger ones are uploaded.
+# A shell command must stay below the 128 KiB limit of a single argument.
+INLINE_LIMIT = 64 * 1024
+
+
+def check_strategy(strategy: str) -> str:
+    """
+    Reject unknown strategies instead of falling back to one silently.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Unknown write strategy: {strategy!r}, expected one of {', '.join(STRATEGIES)}"
+        )
+    return strategy
+
+
+def choose_strategy(text: str, input_server: bool) -> str:
+    """
+    Pick the fastest safe way to write the text.
+    """
+    typeable = all(c in TYPEABLE for c in text)
+    if not typeable and len(text) >= CLIPBOARD_MIN_LENGTH:
+        return "clipboard"
+    return "xtest" if input_server else "file"
+
+
+def encode(text: str) -> Optional[str]:
+    """
+    The text as base64 if it's small enough to inline in a command, else None.
+    """
+    encoded = b64encode(text.encode()).decode()
+    return encoded if len(encoded) <= INLINE_LIMIT else None
+
+
+def _source(encoded: Optional[str], path: str) -> str:
+    # Put the text in a file, unless it was uploaded there already
+    if encoded is None:
+        return f"f={quote_string(path)}"
+    return f'f=$(mktemp) && printf %s {encoded} | base64 -d > "$f"'
+
+
+def type_file_script(encoded: Optional[str], path: str, delay_in_ms: int = 0) -> str:
+    """
+    Shell script typing the text with a single xdotool process.
+
+    :param encoded: The text from `encode()`, or None if it was uploaded to `path`
+    :param path: Where the text was uploaded
+    """
+    return (
+        f'{_source(encoded, path)} && xdotool type --delay {delay_in_ms} --file "$f"; '
+        'status=$?; rm -f "$f"; exit $status'
+    )
+
+
+def clipboard_script(
+    encoded: Optional[str], path: str, paste_key: str, delay_in_ms: int = 0
+) -> str:
+    """
+    Shell script pasting the text through the clipboard, see `type_file_script()`.
+
+    xclip keeps serving the clipboard in the background after it returns, the
+    paste waits until it does.
+    """
+    return (
+        f"{_source(encoded, path)} || exit 1; "
+        "if command -v xclip >/dev/null; then "
+        'xclip -selection clipboard -i "$f" >/dev/null 2>&1; '
+        "for i in $(seq 100); do "
+        'xclip -selection clipboard -o 2>/dev/null | cmp -s - "$f" && break; sleep 0.01; '
+        "done; "
+        f"xdotool key --clearmodifiers {paste_key}; "
+        f'else xdotool type --delay {delay_in_ms} --file "$f"; fi; '
+        'status=$?; rm -f "$f"; exit $status'
+    )
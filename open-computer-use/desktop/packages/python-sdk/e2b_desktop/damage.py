@@ -0,0 +1,59 @@
+"""
+Screen change tracking.
+
+The input server tracks which parts of the screen changed with the XDamage
+extension (see `input_server.py`), so asking whether anything changed costs one
+small message instead of a screenshot. Without it, waiting for the screen to
+settle compares tiny frames grabbed inside the sandbox, still in one round trip.
+"""
+
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class ScreenChanges(NamedTuple):
+    # Pass it to the next `changed_since()` call, None if changes are not tracked
+    token: Optional[str]
+    changed: bool
+    # Changed parts of the screen as (x, y, width, height)
+    rects: List[Tuple[int, int, int, int]]
+
+
+def parse_changes(result: dict) -> ScreenChanges:
+    """
+    Parse the result of the input server's "damage" operation.
+    """
+    return ScreenChanges(
+        result["token"], result["changed"], [tuple(rect) for rect in result["rects"]]
+    )
+
+
+def untracked_changes(screen_size: Tuple[int, int]) -> ScreenChanges:
+    """
+    What to assume when changes are not tracked: the whole screen changed.
+    """
+    return ScreenChanges(None, True, [(0, 0, *screen_size)])
+
+
+def settle_script(
+    display: str, quiet_ms: int, timeout: float, interval: float = 0.05
+) -> str:
+    """
+    Shell script waiting until a downscaled frame of the screen stayed the same for `quiet_ms`.
+
+    It prints "ready|timeout <elapsed ns> <frames>" like `readiness.wait_script()`.
+    """
+    grab = (
+        f"ffmpeg -loglevel error -nostdin -f x11grab -draw_mouse 0 -i {display} -frames:v 1"
+        " -vf 'scale=trunc(iw/8):trunc(ih/8)' -f rawvideo - | md5sum"
+    )
+    return (
+        f"start=$(date +%s%N); deadline=$(( start + {int(timeout * 1e9)} )); "
+        "last=; since=$start; frames=0; "
+        "while :; do "
+        f"frame=$({grab}); frames=$(( frames + 1 )); now=$(date +%s%N); "
+        'if [ "$frame" != "$last" ]; then last=$frame; since=$now; '
+        f'elif (( now - since >= {int(quiet_ms * 1e6)} )); then echo "ready $(( now - start )) $frames"; exit 0; fi; '
+        'if (( now >= deadline )); then echo "timeout $(( now - start )) $frames"; exit 0; fi; '
+        f"sleep {interval}; "
+        "done"
+    )
@@ -0,0 +1,579 @@
+"""
+Input server that runs inside the sandbox.
+
+Reads one JSON message per line from stdin, replays its input actions through
+the XTest extension and answers with one JSON line on stdout. It only needs
+python3 and the libX11 / libXtst libraries xdotool already depends on, so the
+SDK can upload and start it in any desktop template.
+
+Message: {"id": 1, "ops": [["move", 10, 20], ["click", 1, 1]]}
+Answer:  {"id": 1, "ok": true, "timings": [0.1, 0.2], "pointer": [10, 20], "screen": [1024, 768]}
+    or   {"id": 1, "ok": false, "error": "...", "done": 0, "timings": [], ...}
+where timings are the milliseconds each finished operation took and done is
+the number of operations that ran before the error. Every answer carries the
+pointer position and screen size after the operations, and the screen size is
+also sent on its own as {"screen": [w, h]} whenever the resolution changes.
+
+Operations:
+    ["move", x, y]
+    ["down", button] / ["up", button]
+    ["click", button, repeat]
+    ["key", "Control_L+c"]
+    ["type", text, delay_ms]
+    ["sleep", ms]
+    ["damage", token]              -> {"token": ..., "changed": bool, "rects": [[x, y, w, h], ...]}
+    ["settle", quiet_ms, timeout_ms] -> {"settled": bool, "waited_ms": ...}
+The last operation returning something puts it in the answer's "result".
+
+Screen changes are tracked with the XDamage extension: every tile of the
+screen remembers the sequence number of its last change, so "damage" tells
+which tiles changed since the token of an earlier answer. Tokens of another
+server instance count as everything changed.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sys
+import time
+
+CURRENT_TIME = 0
+STRUCTURE_NOTIFY_MASK = 1 << 17
+CONFIGURE_NOTIFY = 22
+DAMAGE_REPORT_RAW_RECTANGLES = 0
+DAMAGE_TILE = 32
+SHIFT_KEYSYM = "Shift_L"
+
+# Characters whose keysym name differs from the character itself
+CHARACTER_KEYSYMS = {
+    "\n": "Return",
+    "\t": "Tab",
+    " ": "space",
+}
+
+
+class XRectangle(ctypes.Structure):
+    _fields_ = [
+        ("x", ctypes.c_short),
+        ("y", ctypes.c_short),
+        ("width", ctypes.c_ushort),
+        ("height", ctypes.c_ushort),
+    ]
+
+
+class XDamageNotifyEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("serial", ctypes.c_ulong),
+        ("send_event", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("drawable", ctypes.c_ulong),
+        ("damage", ctypes.c_ulong),
+        ("level", ctypes.c_int),
+        ("more", ctypes.c_int),
+        ("timestamp", ctypes.c_ulong),
+        ("area", XRectangle),
+        ("geometry", XRectangle),
+    ]
+
+
+def load(name):
+    path = ctypes.util.find_library(name)
+    if not path:
+        raise RuntimeError(f"lib{name} not found")
+    return ctypes.CDLL(path)
+
+
+class XTest:
+    def __init__(self, display_name):
+        self.x11 = load("X11")
+        self.xtst = load("Xtst")
+        self.x11.XOpenDisplay.restype = ctypes.c_void_p
+        self.x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.x11.XStringToKeysym.restype = ctypes.c_ulong
+        self.x11.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        self.x11.XKeysymToKeycode.restype = ctypes.c_ubyte
+        self.x11.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        self.x11.XKeycodeToKeysym.restype = ctypes.c_ulong
+        self.x11.XKeycodeToKeysym.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ubyte,
+            ctypes.c_int,
+        ]
+        self.x11.XDisplayKeycodes.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        self.x11.XGetKeyboardMapping.restype = ctypes.POINTER(ctypes.c_ulong)
+        self.x11.XGetKeyboardMapping.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ubyte,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        self.x11.XChangeKeyboardMapping.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.c_int,
+        ]
+        self.x11.XFree.argtypes = [ctypes.c_void_p]
+        self.x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        self.x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        self.x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self.x11.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        self.x11.XSelectInput.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.c_long,
+        ]
+        self.x11.XPending.argtypes = [ctypes.c_void_p]
+        self.x11.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        self.x11.XQueryPointer.argtypes = [ctypes.c_void_p, ctypes.c_ulong] + [
+            ctypes.c_void_p
+        ] * 7
+        self.x11.XGetGeometry.argtypes = [ctypes.c_void_p, ctypes.c_ulong] + [
+            ctypes.c_void_p
+        ] * 7
+        self.xtst.XTestFakeMotionEvent.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        ]
+        self.xtst.XTestFakeButtonEvent.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        ]
+        self.xtst.XTestFakeKeyEvent.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        ]
+
+        self.display = self.x11.XOpenDisplay(
+            display_name.encode() if display_name else None
+        )
+        if not self.display:
+            raise RuntimeError(f"Cannot open display {display_name}")
+        self.scratch_keycode = self._find_scratch_keycode()
+        self.root = self.x11.XDefaultRootWindow(self.display)
+        self.fd = self.x11.XConnectionNumber(self.display)
+        # The root window is resized when the resolution changes
+        self.x11.XSelectInput(self.display, self.root, STRUCTURE_NOTIFY_MASK)
+        self.damage = None
+
+    def _find_scratch_keycode(self):
+        """A keycode without keysyms, remapped on the fly to type characters the layout lacks"""
+        low, high = ctypes.c_int(), ctypes.c_int()
+        self.x11.XDisplayKeycodes(self.display, ctypes.byref(low), ctypes.byref(high))
+        per_keycode = ctypes.c_int()
+        count = high.value - low.value + 1
+        mapping = self.x11.XGetKeyboardMapping(
+            self.display, low.value, count, ctypes.byref(per_keycode)
+        )
+        try:
+            for i in range(count - 1, -1, -1):
+                row = mapping[i * per_keycode.value : (i + 1) * per_keycode.value]
+                if not any(row):
+                    return low.value + i
+        finally:
+            self.x11.XFree(mapping)
+        return None
+
+    def sync(self):
+        self.x11.XSync(self.display, 0)
+
+    def pointer(self):
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        x, y, window_x, window_y = (
+            ctypes.c_int(),
+            ctypes.c_int(),
+            ctypes.c_int(),
+            ctypes.c_int(),
+        )
+        mask = ctypes.c_uint()
+        self.x11.XQueryPointer(
+            self.display,
+            self.root,
+            ctypes.byref(root),
+            ctypes.byref(child),
+            ctypes.byref(x),
+            ctypes.byref(y),
+            ctypes.byref(window_x),
+            ctypes.byref(window_y),
+            ctypes.byref(mask),
+        )
+        return [x.value, y.value]
+
+    def screen_size(self):
+        root = ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height, border, depth = (
+            ctypes.c_uint(),
+            ctypes.c_uint(),
+            ctypes.c_uint(),
+            ctypes.c_uint(),
+        )
+        self.x11.XGetGeometry(
+            self.display,
+            self.root,
+            ctypes.byref(root),
+            ctypes.byref(x),
+            ctypes.byref(y),
+            ctypes.byref(width),
+            ctypes.byref(height),
+            ctypes.byref(border),
+            ctypes.byref(depth),
+        )
+        return [width.value, height.value]
+
+    def screen_changed(self):
+        """Drain the queued X events, returns True if the root window was reconfigured"""
+        changed = False
+        event = (ctypes.c_long * 24)()
+        while self.x11.XPending(self.display):
+            self.x11.XNextEvent(self.display, event)
+            event_type = ctypes.cast(event, ctypes.POINTER(ctypes.c_int))[0]
+            if event_type == CONFIGURE_NOTIFY:
+                changed = True
+            elif self.damage and event_type == self.damage.notify_type:
+                self.damage.add(
+                    ctypes.cast(event, ctypes.POINTER(XDamageNotifyEvent)).contents.area
+                )
+        if self.damage:
+            self.damage.commit()
+            if changed:
+                self.damage.resize(*self.screen_size())
+        return changed
+
+    def state(self):
+        return {"pointer": self.pointer(), "screen": self.screen_size()}
+
+    def keysym(self, name):
+        keysym = self.x11.XStringToKeysym(name.encode())
+        if not keysym:
+            raise ValueError(f"Unknown key: {name}")
+        return keysym
+
+    def move(self, x, y):
+        self.xtst.XTestFakeMotionEvent(self.display, -1, int(x), int(y), CURRENT_TIME)
+
+    def button(self, button, pressed):
+        self.xtst.XTestFakeButtonEvent(
+            self.display, int(button), int(pressed), CURRENT_TIME
+        )
+
+    def click(self, button, repeat=1):
+        for _ in range(int(repeat)):
+            self.button(button, True)
+            self.button(button, False)
+
+    def key_event(self, keycode, pressed):
+        self.xtst.XTestFakeKeyEvent(self.display, keycode, int(pressed), CURRENT_TIME)
+
+    def key(self, combination):
+        keycodes = []
+        for name in combination.split("+"):
+            keycode = self.x11.XKeysymToKeycode(self.display, self.keysym(name))
+            if not keycode:
+                raise ValueError(f"Key is not on the keyboard: {name}")
+            keycodes.append(keycode)
+        for keycode in keycodes:
+            self.key_event(keycode, True)
+        for keycode in reversed(keycodes):
+            self.key_event(keycode, False)
+
+    def character_keysym(self, character):
+        name = CHARACTER_KEYSYMS.get(character)
+        if name:
+            return self.keysym(name)
+        if ord(character) < 0x100:
+            return ord(character)
+        return 0x01000000 | ord(character)
+
+    def type_character(self, character):
+        keysym = self.character_keysym(character)
+        keycode = self.x11.XKeysymToKeycode(self.display, keysym)
+        if keycode:
+            shift = self.x11.XKeycodeToKeysym(self.display, keycode, 0) != keysym
+            shift_keycode = self.x11.XKeysymToKeycode(
+                self.display, self.keysym(SHIFT_KEYSYM)
+            )
+            if shift:
+                self.key_event(shift_keycode, True)
+            self.key_event(keycode, True)
+            self.key_event(keycode, False)
+            if shift:
+                self.key_event(shift_keycode, False)
+            return
+
+        keysyms = (ctypes.c_ulong * 2)(keysym, keysym)
+        self.x11.XChangeKeyboardMapping(
+            self.display, self.scratch_keycode, 2, keysyms, 1
+        )
+        self.sync()
+        self.key_event(self.scratch_keycode, True)
+        self.key_event(self.scratch_keycode, False)
+        self.sync()
+
+    def type(self, text, delay_ms=0):
+        # Fail before typing anything rather than halfway through the text
+        if self.scratch_keycode is None:
+            for character in set(text):
+                if not self.x11.XKeysymToKeycode(
+                    self.display, self.character_keysym(character)
+                ):
+                    raise ValueError(
+                        f"Cannot type {character!r}: no free keycode to remap"
+                    )
+
+        for character in text:
+            self.type_character(character)
+            if delay_ms:
+                self.sync()
+                time.sleep(delay_ms / 1000)
+
+
+class DamageTracker:
+    """Which tiles of the screen changed when, from XDamage events"""
+
+    def __init__(self, xtest):
+        self.xtest = xtest
+        self.xdamage = load("Xdamage")
+        self.xdamage.XDamageQueryExtension.argtypes = [
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int),
+        ]
+        self.xdamage.XDamageCreate.restype = ctypes.c_ulong
+        self.xdamage.XDamageCreate.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.c_int,
+        ]
+
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if not self.xdamage.XDamageQueryExtension(
+            xtest.display, ctypes.byref(event_base), ctypes.byref(error_base)
+        ):
+            raise RuntimeError("The X server has no DAMAGE extension")
+        self.notify_type = event_base.value
+        self.xdamage.XDamageCreate(
+            xtest.display, xtest.root, DAMAGE_REPORT_RAW_RECTANGLES
+        )
+
+        self.epoch = str(time.time_ns())
+        self.seq = 0
+        self.pending = set()
+        self.last_change = time.monotonic()
+        self.resize(*xtest.screen_size())
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        self.columns = -(-width // DAMAGE_TILE)
+        self.rows = -(-height // DAMAGE_TILE)
+        self.seq += 1
+        self.tiles = [[self.seq] * self.columns for _ in range(self.rows)]
+        self.last_change = time.monotonic()
+
+    def add(self, area):
+        x0, y0 = max(0, area.x) // DAMAGE_TILE, max(0, area.y) // DAMAGE_TILE
+        x1 = min(self.columns, -(-(area.x + area.width) // DAMAGE_TILE))
+        y1 = min(self.rows, -(-(area.y + area.height) // DAMAGE_TILE))
+        for row in range(y0, y1):
+            for column in range(x0, x1):
+                self.pending.add((row, column))
+
+    def commit(self):
+        """Give the tiles changed since the last commit a new sequence number"""
+        if not self.pending:
+            return
+        self.seq += 1
+        for row, column in self.pending:
+            if row < self.rows and column < self.columns:
+                self.tiles[row][column] = self.seq
+        self.pending.clear()
+        self.last_change = time.monotonic()
+
+    def changes(self, token):
+        self.xtest.screen_changed()
+        epoch, _, seq = (token or "").partition(":")
+        since = int(seq) if epoch == self.epoch and seq.isdigit() else -1
+        rects = self.rects(since)
+        return {
+            "token": f"{self.epoch}:{self.seq}",
+            "changed": bool(rects),
+            "rects": rects,
+        }
+
+    def rects(self, since):
+        """Rectangles covering the tiles changed after `since`, runs of tiles merged"""
+        rects, open_runs = [], {}
+        for row in range(self.rows):
+            runs, column = {}, 0
+            while column < self.columns:
+                if self.tiles[row][column] <= since:
+                    column += 1
+                    continue
+                start = column
+                while column < self.columns and self.tiles[row][column] > since:
+                    column += 1
+                runs[(start, column)] = open_runs.pop((start, column), row)
+            # Runs that did not continue in this row are finished
+            for (start, end), first_row in open_runs.items():
+                rects.append(self.rect(start, end, first_row, row))
+            open_runs = runs
+        for (start, end), first_row in open_runs.items():
+            rects.append(self.rect(start, end, first_row, self.rows))
+        return rects
+
+    def rect(self, start, end, first_row, end_row):
+        x, y = start * DAMAGE_TILE, first_row * DAMAGE_TILE
+        return [
+            x,
+            y,
+            min(end * DAMAGE_TILE, self.width) - x,
+            min(end_row * DAMAGE_TILE, self.height) - y,
+        ]
+
+    def settle(self, quiet_ms, timeout_ms):
+        """Wait until the screen did not change for quiet_ms"""
+        start = time.monotonic()
+        deadline = start + timeout_ms / 1000
+        while True:
+            self.xtest.screen_changed()
+            now = time.monotonic()
+            quiet_until = self.last_change + quiet_ms / 1000
+            if now >= quiet_until:
+                return {"settled": True, "waited_ms": round((now - start) * 1000, 3)}
+            if now >= deadline:
+                return {"settled": False, "waited_ms": round((now - start) * 1000, 3)}
+            select.select([self.xtest.fd], [], [], min(quiet_until, deadline) - now)
+
+
+class OperationError(Exception):
+    def __init__(self, error, timings):
+        super().__init__(str(error))
+        self.timings = timings
+
+
+def run(xtest, ops):
+    """Run the operations in order, returns how long each took in milliseconds and the last result"""
+    timings, result = [], None
+    for op, *args in ops:
+        start = time.perf_counter()
+        try:
+            value = run_operation(xtest, op, args)
+            xtest.sync()
+        except Exception as e:
+            raise OperationError(e, timings) from e
+        timings.append(round((time.perf_counter() - start) * 1000, 3))
+        result = result if value is None else value
+    return timings, result
+
+
+def run_operation(xtest, op, args):
+    if op == "move":
+        xtest.move(*args)
+    elif op == "down":
+        xtest.button(args[0], True)
+    elif op == "up":
+        xtest.button(args[0], False)
+    elif op == "click":
+        xtest.click(*args)
+    elif op == "key":
+        xtest.key(*args)
+    elif op == "type":
+        xtest.type(*args)
+    elif op == "sleep":
+        xtest.sync()
+        time.sleep(args[0] / 1000)
+    elif op in ("damage", "settle"):
+        if not xtest.damage:
+            raise ValueError("Change tracking is not available")
+        xtest.sync()
+        return (
+            xtest.damage.changes(*args)
+            if op == "damage"
+            else xtest.damage.settle(*args)
+        )
+    else:
+        raise ValueError(f"Unknown operation: {op}")
+
+
+def reply(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def handle(xtest, line):
+    message_id = None
+    try:
+        message = json.loads(line)
+        message_id = message.get("id")
+        timings, result = run(xtest, message["ops"])
+        answer = {"id": message_id, "ok": True, "timings": timings}
+        if result is not None:
+            answer["result"] = result
+    except OperationError as e:
+        answer = {
+            "id": message_id,
+            "ok": False,
+            "error": str(e),
+            "done": len(e.timings),
+            "timings": e.timings,
+        }
+    except Exception as e:
+        answer = {
+            "id": message_id,
+            "ok": False,
+            "error": str(e),
+            "done": 0,
+            "timings": [],
+        }
+    answer.update(xtest.state())
+    reply(answer)
+    return answer["screen"]
+
+
+def main():
+    xtest = XTest(sys.argv[1] if len(sys.argv) > 1 else None)
+    try:
+        xtest.damage = DamageTracker(xtest)
+    except Exception as e:
+        # Input still works without change tracking
+        sys.stderr.write(f"No change tracking: {e}\n")
+    state = xtest.state()
+    screen = state["screen"]
+    reply({"ready": True, **state})
+
+    buffer = b""
+    while True:
+        # Events read while handling a message are already queued, check them before waiting
+        if xtest.screen_changed() and xtest.screen_size() != screen:
+            screen = xtest.screen_size()
+            reply({"screen": screen})
+
+        readable, _, _ = select.select([sys.stdin.fileno(), xtest.fd], [], [])
+        if sys.stdin.fileno() not in readable:
+            continue
+        data = os.read(sys.stdin.fileno(), 65536)
+        if not data:
+            break
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            if line.strip():
+                screen = handle(xtest, line.decode())
+
+
+if __name__ == "__main__":
+    main()
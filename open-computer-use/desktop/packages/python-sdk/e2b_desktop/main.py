@@ -1,16 +1,45 @@
+import json
+import logging
+import threading
 import time
+from base64 import b64decode
+from pathlib import Path
 from re import search as re_search
 from shlex import quote as quote_string
-from typing import Callable, Dict, Iterator, Literal, Optional, overload, Tuple, Union
+from typing import Dict, Iterator, List, Literal, Optional, Tuple, Union, overload
 from uuid import uuid4
 
-from e2b import Sandbox as SandboxBase, CommandHandle, CommandResult, TimeoutException, CommandExitException
-
-MOUSE_BUTTONS = {
-    "left": 1,
-    "right": 3,
-    "middle": 2
-}
+from e2b import (
+    CommandExitException,
+    CommandHandle,
+)
+from e2b import Sandbox as SandboxBase
+from e2b import TimeoutException
+
+from . import actions, bulk_text
+from .actions import Action, ActionResult
+from .bulk_text import Strategy
+from .damage import ScreenChanges, parse_changes, settle_script, untracked_changes
+from .readiness import WaitResult, parse_wait, wait_script
+from .state import DisplayState
+from .windows import (
+    WindowCapture,
+    WindowGeometry,
+    capture_windows_script,
+    check_window_id,
+    parse_window_captures,
+    parse_window_geometry,
+)
+
+logger = logging.getLogger(__name__)
+
+# Succeeds once a window manager runs and the xfce desktop window is shown
+DESKTOP_READY_CHECK = (
+    "xprop -display {display} -root _NET_SUPPORTING_WM_CHECK | grep -q 'window id'"
+    " && xdotool search --onlyvisible --class xfdesktop"
+)
+
+MOUSE_BUTTONS = {"left": 1, "right": 3, "middle": 2}
 
 KEYS = {
     "alt": "Alt_L",
@@ -66,19 +95,111 @@ KEYS = {
     "tab": "Tab",
     "up": "Up",
     "win": "Super_L",
-    "windows": "Super_L"
+    "windows": "Super_L",
+}
+
+# format -> ffmpeg output options, quality range and default quality
+SCREENSHOT_FORMATS = {
+    "png": ("-f image2pipe -c:v png -compression_level {quality}", (0, 9), 3),
+    "jpeg": ("-f image2pipe -c:v mjpeg -q:v {quality}", (0, 100), 90),
+    "webp": ("-f image2pipe -c:v libwebp -quality {quality}", (0, 100), 90),
+    "raw": ("-f rawvideo -pix_fmt rgb24", None, None),
 }
 
+
+def _ffmpeg_grab_command(
+    display: str,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    scale: float = 1.0,
+    image_format: str = "png",
+    quality: Optional[int] = None,
+    pointer: bool = True,
+) -> str:
+    """
+    Build a shell command that grabs a single frame of the X display with ffmpeg
+    and prints it base64 encoded to stdout.
+    """
+    if image_format not in SCREENSHOT_FORMATS:
+        raise ValueError(f"Unsupported screenshot format: {image_format}")
+    if scale <= 0:
+        raise ValueError(f"Invalid screenshot scale: {scale}")
+
+    output, quality_range, default_quality = SCREENSHOT_FORMATS[image_format]
+    if quality_range:
+        quality = default_quality if quality is None else quality
+        low, high = quality_range
+        if not low <= quality <= high:
+            raise ValueError(
+                f"Quality for {image_format} must be between {low} and {high}"
+            )
+        if image_format == "jpeg":
+            # ffmpeg's JPEG scale runs from 2 (best) to 31 (worst)
+            quality = 2 + round((100 - quality) * 29 / 100)
+        output = output.format(quality=quality)
+
+    grab = f"-f x11grab -draw_mouse {int(pointer)}"
+    if region:
+        x, y, width, height = region
+        grab += f" -video_size {width}x{height} -i {display}+{x},{y}"
+    else:
+        grab += f" -i {display}"
+
+    filters = ""
+    if scale != 1.0:
+        filters = f" -vf 'scale=trunc(iw*{scale}):trunc(ih*{scale}):flags=area'"
+
+    return f"set -o pipefail; ffmpeg -loglevel error -nostdin {grab} -frames:v 1{filters} {output} - | base64 -w 0"
+
+
 def map_key(key: str) -> str:
     lower_key = key.lower()
     if lower_key in KEYS:
         return KEYS[lower_key]
     return lower_key
 
+
+def map_keys(key: Union[str, List[str]]) -> str:
+    """
+    Map a key or a list of keys pressed together to an xdotool key combination.
+    """
+    if isinstance(key, list):
+        return "+".join(map_key(k) for k in key)
+    return map_key(key)
+
+
+def parse_cursor_position(stdout: str) -> Tuple[int, int]:
+    """
+    Parse the output of `xdotool getmouselocation`.
+    """
+    groups = re_search(r"x:(\d+)\s+y:(\d+)", stdout)
+    if not groups:
+        raise RuntimeError(f"Failed to parse cursor position from output: {stdout}")
+
+    x, y = groups.group(1), groups.group(2)
+    if not x or not y:
+        raise RuntimeError(f"Invalid cursor position values: x={x}, y={y}")
+
+    return int(x), int(y)
+
+
+def parse_screen_size(stdout: str) -> Tuple[int, int]:
+    """
+    Parse the output of `xrandr`.
+    """
+    _match = re_search(r"(\d+x\d+)", stdout)
+    if not _match:
+        raise RuntimeError(f"Failed to parse screen size from output: {stdout}")
+
+    try:
+        return tuple(map(int, _match.group(1).split("x")))  # type: ignore
+    except (ValueError, IndexError) as e:
+        raise RuntimeError(f"Invalid screen size format: {_match.group(1)}") from e
+
+
 class _VNCServer:
     def __init__(self, desktop: "Sandbox") -> None:
         self.__novnc_handle: Optional[CommandHandle] = None
-        
+
         self._vnc_port = 5900
         self._port = 6080
         self._novnc_auth_enabled = False
@@ -89,26 +210,30 @@ class _VNCServer:
         self.__desktop = desktop
 
     def _wait_for_port(self, port: int) -> bool:
-        return self.__desktop._wait_and_verify(
-            f'netstat -tuln | grep ":{port} "', lambda r: r.stdout.strip() != ""
-        )
-    
+        return self.__desktop._wait_until(f'netstat -tuln | grep -q ":{port} "').ready
+
     def _check_vnc_running(self) -> bool:
         try:
-            self.__desktop.commands.run('pgrep -x x11vnc')
+            self.__desktop.commands.run("pgrep -x x11vnc")
             return True
         except CommandExitException:
             return False
-    
+
     @staticmethod
     def _generate_password(length: int = 16) -> str:
         import secrets
         import string
 
         characters = string.ascii_letters + string.digits
-        return ''.join(secrets.choice(characters) for _ in range(length))
+        return "".join(secrets.choice(characters) for _ in range(length))
 
-    def get_url(self, auto_connect: bool = True, view_only: bool = False, resize: str = "scale", auth_key: Optional[str] = None) -> str:
+    def get_url(
+        self,
+        auto_connect: bool = True,
+        view_only: bool = False,
+        resize: str = "scale",
+        auth_key: Optional[str] = None,
+    ) -> str:
         params = []
         if auto_connect:
             params.append("autoconnect=true")
@@ -121,31 +246,41 @@ class _VNCServer:
         if params:
             return f"{self._url}?{'&'.join(params)}"
         return self._url
-    
+
     def get_auth_key(self) -> str:
         if not self._novnc_password:
-            raise RuntimeError('Unable to retrieve stream auth key, check if require_auth is enabled')
+            raise RuntimeError(
+                "Unable to retrieve stream auth key, check if require_auth is enabled"
+            )
         return self._novnc_password
 
-    def start(self, vnc_port: Optional[int] = None, port: Optional[int] = None, require_auth: bool = False, window_id: Optional[str] = None) -> None:
-        # If stream is already running, throw an error
-        if self._check_vnc_running():
-            raise RuntimeError('Stream is already running')
-
+    def _prepare(
+        self,
+        vnc_port: Optional[int],
+        port: Optional[int],
+        require_auth: bool,
+        window_id: Optional[str],
+    ) -> Tuple[List[str], str, str]:
+        """
+        Update the stream settings, returns the setup commands, the VNC and the noVNC command.
+        """
         # Update parameters if provided
         self._vnc_port = vnc_port or self._vnc_port
         self._port = port or self._port
         self._novnc_auth_enabled = require_auth or self._novnc_auth_enabled
         self._novnc_password = self._generate_password() if require_auth else None
-        
+
         # Update URL with new port
         self._url = f"https://{self.__desktop.get_host(self._port)}/vnc.html"
-        
+
         # Set up VNC command
+        setup_commands = []
         pwd_flag = "-nopw"
         if self._novnc_auth_enabled:
-            self.__desktop.commands.run("mkdir -p ~/.vnc")
-            self.__desktop.commands.run(f"x11vnc -storepasswd {self._novnc_password} ~/.vnc/passwd")
+            setup_commands.append("mkdir -p ~/.vnc")
+            setup_commands.append(
+                f"x11vnc -storepasswd {self._novnc_password} ~/.vnc/passwd"
+            )
             pwd_flag = "-usepw"
 
         window_id_flag = ""
@@ -156,33 +291,280 @@ class _VNCServer:
             f"x11vnc -bg -display {self.__desktop._display} -forever -wait 50 -shared "
             f"-rfbport {self._vnc_port} {pwd_flag} 2>/tmp/x11vnc_stderr.log {window_id_flag}"
         )
-        
+
         novnc_command = (
             f"cd /opt/noVNC/utils && ./novnc_proxy --vnc localhost:{self._vnc_port} "
             f"--listen {self._port} --web /opt/noVNC > /tmp/novnc.log 2>&1"
         )
+        return setup_commands, vnc_command, novnc_command
+
+    def start(
+        self,
+        vnc_port: Optional[int] = None,
+        port: Optional[int] = None,
+        require_auth: bool = False,
+        window_id: Optional[str] = None,
+    ) -> None:
+        # If stream is already running, throw an error
+        if self._check_vnc_running():
+            raise RuntimeError("Stream is already running")
+
+        start = time.perf_counter()
+        setup_commands, vnc_command, novnc_command = self._prepare(
+            vnc_port, port, require_auth, window_id
+        )
+        for command in setup_commands:
+            self.__desktop.commands.run(command)
 
         self.__desktop.commands.run(vnc_command)
 
-        self.__novnc_handle = self.__desktop.commands.run(novnc_command, background=True, timeout=0)
+        self.__novnc_handle = self.__desktop.commands.run(
+            novnc_command, background=True, timeout=0
+        )
+        start = self.__desktop._record_phase("stream_start", start)
         if not self._wait_for_port(self._port):
             raise TimeoutException("Could not start noVNC server")
+        self.__desktop._record_phase("stream_ready", start)
 
     def stop(self) -> None:
         if self._check_vnc_running():
-            self.__desktop.commands.run('pkill x11vnc')
-        
+            self.__desktop.commands.run("pkill x11vnc")
+
         if self.__novnc_handle:
             self.__novnc_handle.kill()
             self.__novnc_handle = None
 
 
+class _InputServer:
+    """
+    Long-lived XTest input server inside the sandbox (see `input_server.py`).
+
+    Actions are sent as JSON lines to its stdin and acknowledged on its stdout,
+    so an action costs one message instead of a process spawn per xdotool call.
+    """
+
+    REMOTE_PATH = "/tmp/e2b_input_server.py"
+    SOURCE_PATH = Path(__file__).with_name("input_server.py")
+
+    def __init__(
+        self, desktop: "Sandbox", start_timeout: float = 10, reply_timeout: float = 30
+    ) -> None:
+        self.__desktop = desktop
+        self._start_timeout = start_timeout
+        self._reply_timeout = reply_timeout
+        self._handle: Optional[CommandHandle] = None
+        self._reader: Optional[threading.Thread] = None
+        self._buffer = ""
+        self._ready = False
+        self._closed = False
+        self._next_id = 0
+        self._replies: Dict[int, dict] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def running(self) -> bool:
+        return self._ready and not self._closed
+
+    def start(self) -> bool:
+        """
+        Upload and start the server, returns False when it could not start.
+        """
+        self.__desktop.files.write(self.REMOTE_PATH, self.SOURCE_PATH.read_text())
+        self._handle = self.__desktop.commands.run(
+            f"python3 -u {self.REMOTE_PATH} {quote_string(self.__desktop._display)}",
+            background=True,
+            timeout=0,
+        )
+        self._reader = threading.Thread(
+            target=self._read, name="e2b-input-server", daemon=True
+        )
+        self._reader.start()
+
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._ready or self._closed, self._start_timeout
+            )
+            return self.running
+
+    def send(self, ops: list, expected_ms: float = 0) -> dict:
+        """
+        Run a list of operations, e.g. `[["move", 10, 20], ["click", 1, 1]]`, and wait for the reply.
+
+        :param expected_ms: How long the operations take on their own, added to the reply timeout
+
+        :raises RuntimeError: If the server is not running
+        :raises TimeoutException: If the server did not reply in time
+        """
+        with self._cond:
+            if not self.running:
+                raise RuntimeError("Input server is not running")
+            self._next_id += 1
+            message_id = self._next_id
+
+        self.__desktop.commands.send_stdin(
+            self._handle.pid, json.dumps({"id": message_id, "ops": ops}) + "\n"
+        )
+
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: message_id in self._replies or self._closed,
+                self._reply_timeout + expected_ms / 1000,
+            ):
+                raise TimeoutException(
+                    f"Input server did not reply to message {message_id}"
+                )
+            if message_id not in self._replies:
+                raise RuntimeError("Input server stopped")
+            return self._replies.pop(message_id)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._handle:
+            self._handle.kill()
+            self._handle = None
+
+    def _read(self) -> None:
+        try:
+            self._handle.wait(
+                on_stdout=self._on_stdout, on_stderr=lambda line: logger.debug(line)
+            )
+        except Exception as e:
+            logger.warning(f"Input server exited: {e}")
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _on_stdout(self, data: str) -> None:
+        # Output arrives in arbitrary chunks, replies are complete lines
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split("\n")
+        with self._cond:
+            for line in lines:
+                if not line.strip():
+                    continue
+                reply = json.loads(line)
+                self.__desktop._state.update(reply)
+                if reply.get("ready"):
+                    self._ready = True
+                elif "id" in reply:
+                    self._replies[reply["id"]] = reply
+            self._cond.notify_all()
+
+
+class ActionBatch:
+    """
+    Input actions collected by `Sandbox.batch()`, run together in a single round trip.
+
+    The methods mirror the ones of `Sandbox` and can be chained.
+    """
+
+    def __init__(self, desktop: "Sandbox", raise_on_error: bool = True) -> None:
+        self._desktop = desktop
+        self._raise_on_error = raise_on_error
+        self._actions: List[Action] = []
+        self.results: List[ActionResult] = []
+        self.round_trip_ms: Optional[float] = None
+
+    def __enter__(self) -> "ActionBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.run()
+
+    def __len__(self) -> int:
+        return len(self._actions)
+
+    def _add(self, action: Action) -> "ActionBatch":
+        self._actions.append(action)
+        return self
+
+    def move_mouse(self, x: int, y: int) -> "ActionBatch":
+        return self._add(actions.move_mouse(x, y))
+
+    def left_click(
+        self, x: Optional[int] = None, y: Optional[int] = None
+    ) -> "ActionBatch":
+        return self._add(actions.click("left_click", MOUSE_BUTTONS["left"], x, y))
+
+    def double_click(
+        self, x: Optional[int] = None, y: Optional[int] = None
+    ) -> "ActionBatch":
+        return self._add(
+            actions.click("double_click", MOUSE_BUTTONS["left"], x, y, repeat=2)
+        )
+
+    def right_click(
+        self, x: Optional[int] = None, y: Optional[int] = None
+    ) -> "ActionBatch":
+        return self._add(actions.click("right_click", MOUSE_BUTTONS["right"], x, y))
+
+    def middle_click(
+        self, x: Optional[int] = None, y: Optional[int] = None
+    ) -> "ActionBatch":
+        return self._add(actions.click("middle_click", MOUSE_BUTTONS["middle"], x, y))
+
+    def scroll(
+        self, direction: Literal["up", "down"] = "down", amount: int = 1
+    ) -> "ActionBatch":
+        return self._add(actions.scroll(4 if direction == "up" else 5, amount))
+
+    def mouse_press(
+        self, button: Literal["left", "right", "middle"] = "left"
+    ) -> "ActionBatch":
+        return self._add(actions.mouse_press(MOUSE_BUTTONS[button]))
+
+    def mouse_release(
+        self, button: Literal["left", "right", "middle"] = "left"
+    ) -> "ActionBatch":
+        return self._add(actions.mouse_release(MOUSE_BUTTONS[button]))
+
+    def drag(self, fr: Tuple[int, int], to: Tuple[int, int]) -> "ActionBatch":
+        return self._add(actions.drag(fr, to, MOUSE_BUTTONS["left"]))
+
+    def press(self, key: Union[str, List[str]]) -> "ActionBatch":
+        return self._add(actions.press(map_keys(key)))
+
+    def write(
+        self, text: str, *, chunk_size: int = 25, delay_in_ms: int = 75
+    ) -> "ActionBatch":
+        return self._add(actions.write(text, chunk_size, delay_in_ms))
+
+    def wait(self, ms: int) -> "ActionBatch":
+        return self._add(actions.wait(ms))
+
+    def run(self) -> List[ActionResult]:
+        """
+        Run the collected actions in order, stopping at the first one that fails.
+
+        :return: One result per action, actions after a failed one are reported as not run
+        :raises RuntimeError: If an action failed and the batch was created with `raise_on_error`
+        """
+        start = time.perf_counter()
+        return self._finish(self._desktop._run_actions(self._take()), start)
+
+    def _take(self) -> List[Action]:
+        batch, self._actions = self._actions, []
+        return batch
+
+    def _finish(self, results: List[ActionResult], start: float) -> List[ActionResult]:
+        self.results = results
+        self.round_trip_ms = (time.perf_counter() - start) * 1000
+
+        failed = next((r for r in self.results if not r.ok), None)
+        if failed and self._raise_on_error:
+            raise RuntimeError(f"Batch action {failed.action} failed: {failed.error}")
+        return self.results
+
+
 class Sandbox(SandboxBase):
     default_template = "desktop"
 
     def __init__(
         self,
-        resolution: Optional[Tuple[int, int]] = None, 
+        resolution: Optional[Tuple[int, int]] = None,
         dpi: Optional[int] = None,
         display: Optional[str] = None,
         template: Optional[str] = None,
@@ -194,6 +576,7 @@ class Sandbox(SandboxBase):
         debug: Optional[bool] = None,
         sandbox_id: Optional[str] = None,
         request_timeout: Optional[float] = None,
+        input_server: bool = True,
     ):
         """
         Create a new desktop sandbox.
@@ -212,10 +595,14 @@ class Sandbox(SandboxBase):
         :param debug: If True, the sandbox will be created in debug mode, defaults to `E2B_DEBUG` environment variable
         :param sandbox_id: Sandbox ID to connect to, defaults to `E2B_SANDBOX_ID` environment variable
         :param request_timeout: Timeout for the request in **seconds**
+        :param input_server: Send mouse and keyboard actions through a long-lived XTest server in the sandbox instead of spawning xdotool for each action. It starts with the first action and falls back to xdotool if it cannot start
 
         :return: sandbox instance for the new sandbox
         """
         self._display = display or ":0"
+        # Milliseconds each startup phase took, see `startup_timings`
+        self._startup_timings: Dict[str, float] = {}
+        started = start = time.perf_counter()
 
         # Initialize environment variables with DISPLAY
         if envs is None:
@@ -235,51 +622,179 @@ class Sandbox(SandboxBase):
         )
 
         self._last_xfce4_pid = None
-
         width, height = resolution or (1024, 768)
+        # Screen size and cursor position, so reading them needs no round trip
+        self._state = DisplayState((width, height))
+        self._input_server = _InputServer(self) if input_server else None
+        self._input_server_started = False
+        self._input_server_lock = threading.Lock()
+        start = self._record_phase("create", start)
+
         self.commands.run(
             f"Xvfb {self._display} -ac -screen 0 {width}x{height}x24"
             f" -retro -dpi {dpi or 96} -nolisten tcp -nolisten unix",
             background=True,
             timeout=0,
         )
+        start = self._record_phase("xvfb_start", start)
 
-        if not self._wait_and_verify(
-            f"xdpyinfo -display {self._display}", lambda r: r.exit_code == 0
-        ):
+        if not self._wait_until(f"xdpyinfo -display {self._display}").ready:
             raise TimeoutException("Could not start Xvfb")
+        start = self._record_phase("xvfb_ready", start)
 
         self.__vnc_server = _VNCServer(self)
         self._start_xfce4()
+        self._record_phase("xfce4_start", start)
+        self._record_phase("total", started)
 
+    @property
+    def startup_timings(self) -> Dict[str, float]:
+        """
+        Milliseconds each startup phase took: `create`, `xvfb_start`, `xvfb_ready`,
+        `xfce4_start` and `total`, plus `desktop_ready` after `wait_for_desktop()`
+        and `stream_start` / `stream_ready` after `stream.start()`.
+        """
+        return dict(self._startup_timings)
+
+    def _record_phase(self, phase: str, start: float) -> float:
+        """
+        Record how long a phase took since `start`, returns the current time.
+        """
+        now = time.perf_counter()
+        self._startup_timings[phase] = (now - start) * 1000
+        return now
+
+    def _wait_until(
+        self,
+        check: str,
+        timeout: float = 10,
+        interval: float = 0.05,
+        max_interval: float = 1.0,
+    ) -> WaitResult:
+        """
+        Retry a shell command inside the sandbox until it succeeds, in a single round trip.
+
+        :param check: Shell command that succeeds once the condition holds
+        :param timeout: Seconds to wait at most
+        :param interval: First pause between attempts in seconds, doubled after every attempt
+        :param max_interval: Longest pause between attempts in seconds
+        """
+        result = self.commands.run(
+            wait_script(check, timeout, interval, max_interval), timeout=timeout + 30
+        )
+        return parse_wait(result.stdout)
+
+    def wait_for_desktop(self, timeout: float = 30) -> bool:
+        """
+        Wait until the window manager and the desktop of the xfce session are up.
+
+        :param timeout: Seconds to wait at most
+        :return: True if the desktop is ready, False on timeout
+        """
+        start = time.perf_counter()
+        ready = self._wait_until(
+            DESKTOP_READY_CHECK.format(display=self._display), timeout
+        ).ready
+        self._record_phase("desktop_ready", start)
+        return ready
+
+    def _input(self) -> Optional[_InputServer]:
+        """
+        The running input server, started on first use, or None to use xdotool.
+        """
+        if self._input_server is None:
+            return None
+        with self._input_server_lock:
+            if not self._input_server_started:
+                self._input_server_started = True
+                try:
+                    if not self._input_server.start():
+                        logger.warning("Input server did not start, using xdotool")
+                except Exception as e:
+                    logger.warning(
+                        f"Input server could not be started, using xdotool: {e}"
+                    )
+        return self._input_server if self._input_server.running else None
+
+    def _run_action(self, action: Action) -> None:
+        """
+        Run an input action through the input server, or as its xdotool command
+        when the server is not available.
+        """
+        server = self._input()
+        if server:
+            reply = server.send(action.ops, action.expected_ms)
+            if reply["ok"]:
+                return
+            if reply.get("done"):
+                # Part of the action already ran, replaying it with xdotool would repeat it
+                raise RuntimeError(
+                    f"Input action {action.name} failed: {reply['error']}"
+                )
+            logger.debug(
+                f"Input server could not run {action.name}, using xdotool: {reply['error']}"
+            )
+        try:
+            self.commands.run(action.command, timeout=60 + action.expected_ms / 1000)
+        except Exception:
+            self._state.invalidate(screen_size=False)
+            raise
+        self._state.apply(action)
+
+    def _run_actions(self, batch: List[Action]) -> List[ActionResult]:
+        """
+        Run a list of input actions in a single round trip, returns one result per action.
+        """
+        if not batch:
+            return []
+
+        server = self._input()
+        if server:
+            reply = server.send(
+                [op for action in batch for op in action.ops],
+                sum(a.expected_ms for a in batch),
+            )
+            if reply["ok"] or reply.get("done"):
+                return actions.server_results(batch, reply)
+            logger.debug(
+                f"Input server could not run the batch, using xdotool: {reply['error']}"
+            )
+
+        result = self.commands.run(
+            actions.batch_script(batch),
+            timeout=60 + sum(a.expected_ms for a in batch) / 1000,
+        )
+        results = actions.script_results(batch, result.stdout)
+        self._state.apply_results(batch, results)
+        return results
+
+    def batch(self, raise_on_error: bool = True) -> ActionBatch:
+        """
+        Collect input actions and run them together in a single round trip.
+
+        ```python
+        with desktop.batch() as batch:
+            batch.left_click(100, 200)
+            batch.write("hello")
+            batch.press("enter")
+        print(batch.results)
+        ```
+
+        The actions run when the `with` block exits, or when `run()` is called.
+
+        :param raise_on_error: Raise a `RuntimeError` if an action fails, otherwise only report it in the results
+        :return: The batch to add actions to
+        """
+        return ActionBatch(self, raise_on_error)
 
-    def _wait_and_verify(
-        self, 
-        cmd: str, 
-        on_result: Callable[[CommandResult], bool],
-        timeout: int = 10,
-        interval: float = 0.5
-    ) -> bool:
-
-        elapsed = 0
-        while elapsed < timeout:
-            try:
-                if on_result(self.commands.run(cmd)):
-                    return True
-            except CommandExitException:
-                continue
-            
-            time.sleep(interval)
-            elapsed += interval
-
-        return False
-    
     def _start_xfce4(self):
         """
         Start xfce4 session if logged out or not running.
         """
         if self._last_xfce4_pid is None or "[xfce4-session] <defunct>" in (
-            self.commands.run(f"ps aux | grep {self._last_xfce4_pid} | grep -v grep | head -n 1").stdout.strip()
+            self.commands.run(
+                f"ps aux | grep {self._last_xfce4_pid} | grep -v grep | head -n 1"
+            ).stdout.strip()
         ):
             self._last_xfce4_pid = self.commands.run(
                 "startxfce4", background=True, timeout=0
@@ -322,21 +837,152 @@ class Sandbox(SandboxBase):
         self.files.remove(screenshot_path)
         return file
 
+    def capture_screen(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> bytes:
+        """
+        Take a screenshot in a single round trip.
+
+        The frame is grabbed and encoded by ffmpeg and streamed back through the
+        command output, without a temporary file in the sandbox.
+
+        :param region: Only capture this `(x, y, width, height)` part of the screen.
+        :param scale: Resize the image by this factor before encoding, e.g. 0.5.
+        :param image_format: "png", "jpeg", "webp" or "raw" (packed RGB, 3 bytes per pixel, no header).
+        :param quality: PNG compression level 0-9, JPEG / WebP quality 0-100.
+        :param pointer: Draw the mouse pointer into the image.
+        :returns: The encoded image.
+        """
+        result = self.commands.run(
+            _ffmpeg_grab_command(
+                self._display, region, scale, image_format, quality, pointer
+            )
+        )
+        return b64decode(result.stdout)
+
+    def changed_since(self, token: Optional[str] = None) -> ScreenChanges:
+        """
+        Tell which parts of the screen changed since an earlier call, without a screenshot.
+
+        ```python
+        changes = desktop.changed_since(token)
+        if changes.changed:
+            image = desktop.capture_screen()
+        token = changes.token
+        ```
+
+        Changes are tracked by the input server. Without it, or before the first call,
+        the whole screen counts as changed.
+
+        :param token: The `token` of an earlier result, None to start tracking
+        :return: A new token, whether anything changed, and the changed rectangles
+        """
+        server = self._input()
+        if server:
+            reply = server.send([["damage", token]])
+            if reply["ok"]:
+                return parse_changes(reply["result"])
+            logger.debug(f"Input server could not track changes: {reply['error']}")
+        return untracked_changes(self.get_screen_size())
+
+    def wait_until_settled(self, quiet_ms: int = 300, timeout: float = 10) -> bool:
+        """
+        Wait until the screen stopped changing, e.g. after an action before taking a screenshot.
+
+        :param quiet_ms: How long the screen must stay unchanged, in milliseconds
+        :param timeout: Seconds to wait at most
+        :return: True if the screen settled, False on timeout
+        """
+        server = self._input()
+        if server:
+            reply = server.send(
+                [["settle", quiet_ms, int(timeout * 1000)]], timeout * 1000
+            )
+            if reply["ok"]:
+                return reply["result"]["settled"]
+            logger.debug(f"Input server could not track changes: {reply['error']}")
+        result = self.commands.run(
+            settle_script(self._display, quiet_ms, timeout), timeout=timeout + 30
+        )
+        return parse_wait(result.stdout).ready
+
+    def capture_window(
+        self,
+        window_id: str,
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> WindowCapture:
+        """
+        Take a screenshot of only one window, in a single round trip.
+
+        The result has the captured part of the screen and translates positions in
+        the image to screen coordinates:
+
+        ```python
+        capture = desktop.capture_window(desktop.get_current_window_id(), scale=0.5)
+        desktop.left_click(*capture.to_screen(40, 12))
+        ```
+
+        :param window_id: The window, e.g. from `get_current_window_id()` or `get_application_windows()`.
+        :param scale, image_format, quality, pointer: See `capture_screen()`.
+        :raises RuntimeError: If the window does not exist or is not on the screen.
+        """
+        captures = self.capture_windows(
+            [window_id], scale, image_format, quality, pointer
+        )
+        if not captures:
+            raise RuntimeError(f"Could not capture window {window_id}")
+        return next(iter(captures.values()))
+
+    def capture_windows(
+        self,
+        window_ids: List[str],
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> Dict[str, WindowCapture]:
+        """
+        Take screenshots of several windows in parallel, in a single round trip.
+
+        :param window_ids: The windows to capture.
+        :param scale, image_format, quality, pointer: See `capture_screen()`.
+        :returns: The captures by window ID, without the windows that could not be captured.
+        """
+        window_ids = [check_window_id(window_id) for window_id in window_ids]
+        if not window_ids:
+            return {}
+        script = capture_windows_script(
+            window_ids,
+            self.get_screen_size(),
+            lambda region: _ffmpeg_grab_command(
+                self._display, region, scale, image_format, quality, pointer
+            ),
+        )
+        return parse_window_captures(
+            window_ids, self.commands.run(script).stdout, scale
+        )
+
     def left_click(self, x: Optional[int] = None, y: Optional[int] = None):
         """
         Left click on the mouse position.
         """
-        if x and y:
-            self.move_mouse(x, y)
-        self.commands.run("xdotool click 1")
+        self._run_action(actions.click("left_click", MOUSE_BUTTONS["left"], x, y))
 
     def double_click(self, x: Optional[int] = None, y: Optional[int] = None):
         """
         Double left click on the mouse position.
         """
-        if x and y:
-            self.move_mouse(x, y)
-        self.commands.run("xdotool click --repeat 2 1")
+        self._run_action(
+            actions.click("double_click", MOUSE_BUTTONS["left"], x, y, repeat=2)
+        )
 
     def right_click(self, x: Optional[int] = None, y: Optional[int] = None):
         if (x is None) != (y is None):
@@ -344,17 +990,13 @@ class Sandbox(SandboxBase):
         """
         Right click on the mouse position.
         """
-        if x and y:
-            self.move_mouse(x, y)
-        self.commands.run("xdotool click 3")
+        self._run_action(actions.click("right_click", MOUSE_BUTTONS["right"], x, y))
 
     def middle_click(self, x: Optional[int] = None, y: Optional[int] = None):
         """
         Middle click on the mouse position.
         """
-        if x and y:
-            self.move_mouse(x, y)
-        self.commands.run("xdotool click 2")
+        self._run_action(actions.click("middle_click", MOUSE_BUTTONS["middle"], x, y))
 
     def scroll(self, direction: Literal["up", "down"] = "down", amount: int = 1):
         """
@@ -363,102 +1005,119 @@ class Sandbox(SandboxBase):
         :param direction: The direction to scroll. Can be "up" or "down".
         :param amount: The amount to scroll.
         """
-        self.commands.run(
-            f"xdotool click --repeat {amount} {'4' if direction == 'up' else '5'}"
-        )
+        self._run_action(actions.scroll(4 if direction == "up" else 5, amount))
 
     def move_mouse(self, x: int, y: int):
         """
         Move the mouse to the given coordinates.
-        
+
         :param x: The x coordinate.
         :param y: The y coordinate.
         """
-        self.commands.run(f"xdotool mousemove --sync {x} {y}")
+        self._run_action(actions.move_mouse(x, y))
 
     def mouse_press(self, button: Literal["left", "right", "middle"] = "left"):
         """
         Press the mouse button.
         """
-        self.commands.run(f"xdotool mousedown {MOUSE_BUTTONS[button]}")
+        self._run_action(actions.mouse_press(MOUSE_BUTTONS[button]))
 
     def mouse_release(self, button: Literal["left", "right", "middle"] = "left"):
         """
         Release the mouse button.
         """
-        self.commands.run(f"xdotool mouseup {MOUSE_BUTTONS[button]}")
-        
-    def get_cursor_position(self) -> tuple[int, int]:
+        self._run_action(actions.mouse_release(MOUSE_BUTTONS[button]))
+
+    def get_cursor_position(self, refresh: bool = False) -> tuple[int, int]:
         """
         Get the current cursor position.
 
+        The position is tracked from the SDK's own actions and only read from the
+        sandbox when it is unknown. Use `refresh` if something else moved the cursor,
+        e.g. a user of the stream.
+
+        :param refresh: Read the position from the sandbox even if it is known
         :return: A tuple with the x and y coordinates
         :raises RuntimeError: If the cursor position cannot be determined
         """
-        result = self.commands.run("xdotool getmouselocation")
-            
-        groups = re_search(r"x:(\d+)\s+y:(\d+)", result.stdout)
-        if not groups:
-            raise RuntimeError(f"Failed to parse cursor position from output: {result.stdout}")
-            
-        x, y = groups.group(1), groups.group(2)
-        if not x or not y:
-            raise RuntimeError(f"Invalid cursor position values: x={x}, y={y}")
-            
-        return int(x), int(y)
-        
-    def get_screen_size(self) -> tuple[int, int]:
+        if self._state.cursor and not refresh:
+            return self._state.cursor
+        position = parse_cursor_position(
+            self.commands.run("xdotool getmouselocation").stdout
+        )
+        self._state.update({"pointer": position})
+        return position
+
+    def get_screen_size(self, refresh: bool = False) -> tuple[int, int]:
         """
         Get the current screen size.
 
+        The size is known from startup and kept up to date by the input server when
+        the resolution changes. Without the input server, use `refresh` after changing it.
+
+        :param refresh: Read the size from the sandbox even if it is known
         :return: A tuple with the width and height
         :raises RuntimeError: If the screen size cannot be determined
         """
-        result = self.commands.run("xrandr")
-            
-        _match = re_search(r"(\d+x\d+)", result.stdout)
-        if not _match:
-            raise RuntimeError(f"Failed to parse screen size from output: {result.stdout}")
-            
-        try:
-            return tuple(map(int, _match.group(1).split("x")))  # type: ignore
-        except (ValueError, IndexError) as e:
-            raise RuntimeError(f"Invalid screen size format: {_match.group(1)}") from e
+        if self._state.screen_size and not refresh:
+            return self._state.screen_size
+        size = parse_screen_size(self.commands.run("xrandr").stdout)
+        self._state.update({"screen": size})
+        return size
 
-    def write(self,        
+    def write(
+        self,
         text: str,
         *,
         chunk_size: int = 25,
-        delay_in_ms: int = 75
+        delay_in_ms: int = 75,
+        strategy: Optional[Strategy] = None,
+        paste_key: Union[str, List[str]] = ["ctrl", "v"],
     ) -> None:
         """
         Write the given text at the current cursor position.
-        
+
         :param text: The text to write.
         :param chunk_size: The size of each chunk of text to write.
         :param delay_in_ms: The delay between each chunk of text.
+        :param strategy: Write the text in bulk instead of typing it like a person, ignoring `chunk_size` and `delay_in_ms`.
+            "xtest" types it through the input server, "file" with a single xdotool command and "clipboard" pastes it.
+            "auto" picks the fastest safe one for the text, see `bulk_text.py`.
+        :param paste_key: The keys the "clipboard" strategy pastes with, e.g. ["ctrl", "shift", "v"] in a terminal.
         """
-        def break_into_chunks(text: str, n: int):
-            for i in range(0, len(text), n):
-                yield text[i : i + n]
-
-        for chunk in break_into_chunks(text, chunk_size):
-            self.commands.run(
-                f"xdotool type --delay {delay_in_ms} {quote_string(chunk)}"
+        if strategy is None:
+            self._run_action(actions.write(text, chunk_size, delay_in_ms))
+            return
+
+        bulk_text.check_strategy(strategy)
+        server = self._input()
+        if strategy == "auto":
+            strategy = bulk_text.choose_strategy(text, server is not None)
+        if strategy == "xtest" and server:
+            self._run_action(actions.write(text, max(1, len(text)), 0))
+            return
+        if strategy == "xtest":
+            logger.warning(
+                'Input server is not running, writing with the "file" strategy instead of "xtest"'
             )
 
-    def press(self, key: Union[str,  list[str]]):
+        path = f"/tmp/e2b-text-{uuid4()}"
+        encoded = bulk_text.encode(text)
+        if encoded is None:
+            self.files.write(path, text)
+        if strategy == "clipboard":
+            script = bulk_text.clipboard_script(encoded, path, map_keys(paste_key))
+        else:
+            script = bulk_text.type_file_script(encoded, path)
+        self.commands.run(script, timeout=60 + len(text) / 1000)
+
+    def press(self, key: Union[str, list[str]]):
         """
         Press a key.
 
         :param key: The key to press (e.g. "enter", "space", "backspace", etc.).
         """
-        if isinstance(key, list):
-            key = "+".join(map_key(k) for k in key)
-        else:
-            key = map_key(key)
-
-        self.commands.run(f"xdotool key {key}")
+        self._run_action(actions.press(map_keys(key)))
 
     def drag(self, fr: tuple[int, int], to: tuple[int, int]):
         """
@@ -467,10 +1126,7 @@ class Sandbox(SandboxBase):
         :param from: The starting position.
         :param to: The ending position.
         """
-        self.move_mouse(fr[0], fr[1])
-        self.mouse_press()
-        self.move_mouse(to[0], to[1])
-        self.mouse_release()
+        self._run_action(actions.drag(fr, to, MOUSE_BUTTONS["left"]))
 
     def wait(self, ms: int):
         """
@@ -498,7 +1154,11 @@ class Sandbox(SandboxBase):
         """
         Get the window IDs of all windows for the given application.
         """
-        return self.commands.run(f"xdotool search --onlyvisible --class {application}").stdout.strip().split("\n")
+        return (
+            self.commands.run(f"xdotool search --onlyvisible --class {application}")
+            .stdout.strip()
+            .split("\n")
+        )
 
     def get_window_title(self, window_id: str) -> str:
         """
@@ -506,8 +1166,23 @@ class Sandbox(SandboxBase):
         """
         return self.commands.run(f"xdotool getwindowname {window_id}").stdout.strip()
 
+    def get_window_geometry(self, window_id: str) -> WindowGeometry:
+        """
+        Get the position and size of the window with the given ID.
+
+        Use `to_screen()` of the result to translate positions relative to the window:
+        `desktop.left_click(*geometry.to_screen(10, 10))`.
+        """
+        return parse_window_geometry(
+            self.commands.run(
+                f"xdotool getwindowgeometry --shell {check_window_id(window_id)}"
+            ).stdout
+        )
+
     def launch(self, application: str, uri: Optional[str] = None):
         """
         Launch an application.
         """
-        self.commands.run(f"gtk-launch {application} {uri or ''}", background=True, timeout=0)
+        self.commands.run(
+            f"gtk-launch {application} {uri or ''}", background=True, timeout=0
+        )
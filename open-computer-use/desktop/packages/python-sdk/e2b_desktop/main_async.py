@@ -0,0 +1,812 @@
+import asyncio
+import json
+import time
+from base64 import b64decode
+from shlex import quote as quote_string
+from typing import AsyncIterator, Dict, List, Literal, Optional, Tuple, Union, overload
+from uuid import uuid4
+
+from e2b import (
+    AsyncCommandHandle,
+)
+from e2b import AsyncSandbox as AsyncSandboxBase
+from e2b import CommandExitException, TimeoutException
+
+from . import actions, bulk_text
+from .actions import Action, ActionResult
+from .bulk_text import Strategy
+from .damage import ScreenChanges, parse_changes, settle_script, untracked_changes
+from .main import (
+    DESKTOP_READY_CHECK,
+    MOUSE_BUTTONS,
+    ActionBatch,
+    _ffmpeg_grab_command,
+    _InputServer,
+    _VNCServer,
+    logger,
+    map_keys,
+    parse_cursor_position,
+    parse_screen_size,
+)
+from .readiness import WaitResult, parse_wait, wait_script
+from .state import DisplayState
+from .windows import (
+    WindowCapture,
+    WindowGeometry,
+    capture_windows_script,
+    check_window_id,
+    parse_window_captures,
+    parse_window_geometry,
+)
+
+
+class _AsyncVNCServer(_VNCServer):
+    def __init__(self, desktop: "AsyncSandbox") -> None:
+        super().__init__(desktop)
+        self.__novnc_handle: Optional[AsyncCommandHandle] = None
+        self.__desktop = desktop
+
+    async def _wait_for_port(self, port: int) -> bool:
+        return (
+            await self.__desktop._wait_until(f'netstat -tuln | grep -q ":{port} "')
+        ).ready
+
+    async def _check_vnc_running(self) -> bool:
+        try:
+            await self.__desktop.commands.run("pgrep -x x11vnc")
+            return True
+        except CommandExitException:
+            return False
+
+    async def start(
+        self,
+        vnc_port: Optional[int] = None,
+        port: Optional[int] = None,
+        require_auth: bool = False,
+        window_id: Optional[str] = None,
+    ) -> None:
+        # If stream is already running, throw an error
+        if await self._check_vnc_running():
+            raise RuntimeError("Stream is already running")
+
+        start = time.perf_counter()
+        setup_commands, vnc_command, novnc_command = self._prepare(
+            vnc_port, port, require_auth, window_id
+        )
+        for command in setup_commands:
+            await self.__desktop.commands.run(command)
+
+        await self.__desktop.commands.run(vnc_command)
+
+        self.__novnc_handle = await self.__desktop.commands.run(
+            novnc_command, background=True, timeout=0
+        )
+        start = self.__desktop._record_phase("stream_start", start)
+        if not await self._wait_for_port(self._port):
+            raise TimeoutException("Could not start noVNC server")
+        self.__desktop._record_phase("stream_ready", start)
+
+    async def stop(self) -> None:
+        if await self._check_vnc_running():
+            await self.__desktop.commands.run("pkill x11vnc")
+
+        if self.__novnc_handle:
+            await self.__novnc_handle.kill()
+            self.__novnc_handle = None
+
+
+class _AsyncInputServer:
+    """
+    Asyncio client of the XTest input server, see `_InputServer`.
+    """
+
+    REMOTE_PATH = _InputServer.REMOTE_PATH
+    SOURCE_PATH = _InputServer.SOURCE_PATH
+
+    def __init__(
+        self,
+        desktop: "AsyncSandbox",
+        start_timeout: float = 10,
+        reply_timeout: float = 30,
+    ) -> None:
+        self.__desktop = desktop
+        self._start_timeout = start_timeout
+        self._reply_timeout = reply_timeout
+        self._handle: Optional[AsyncCommandHandle] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._buffer = ""
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._next_id = 0
+        self._replies: Dict[int, asyncio.Future] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._ready.is_set() and not self._closed
+
+    async def start(self) -> bool:
+        """
+        Upload and start the server, returns False when it could not start.
+        """
+        await self.__desktop.files.write(self.REMOTE_PATH, self.SOURCE_PATH.read_text())
+        self._handle = await self.__desktop.commands.run(
+            f"python3 -u {self.REMOTE_PATH} {quote_string(self.__desktop._display)}",
+            background=True,
+            timeout=0,
+            on_stdout=self._on_stdout,
+        )
+        self._watcher = asyncio.create_task(self._watch())
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), self._start_timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.running
+
+    async def send(self, ops: list, expected_ms: float = 0) -> dict:
+        """
+        Run a list of operations and wait for the reply, see `_InputServer.send`.
+        """
+        if not self.running:
+            raise RuntimeError("Input server is not running")
+        self._next_id += 1
+        message_id = self._next_id
+        reply = self._replies[message_id] = asyncio.get_running_loop().create_future()
+
+        try:
+            await self.__desktop.commands.send_stdin(
+                self._handle.pid, json.dumps({"id": message_id, "ops": ops}) + "\n"
+            )
+            return await asyncio.wait_for(
+                reply, self._reply_timeout + expected_ms / 1000
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutException(
+                f"Input server did not reply to message {message_id}"
+            )
+        finally:
+            self._replies.pop(message_id, None)
+
+    async def stop(self) -> None:
+        self._close()
+        if self._handle:
+            await self._handle.kill()
+            self._handle = None
+
+    async def _watch(self) -> None:
+        try:
+            await self._handle.wait()
+        except Exception as e:
+            logger.warning(f"Input server exited: {e}")
+        self._close()
+
+    def _close(self) -> None:
+        self._closed = True
+        self._ready.set()
+        for reply in self._replies.values():
+            if not reply.done():
+                reply.set_exception(RuntimeError("Input server stopped"))
+
+    def _on_stdout(self, data: str) -> None:
+        # Output arrives in arbitrary chunks, replies are complete lines
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            self.__desktop._state.update(message)
+            if message.get("ready"):
+                self._ready.set()
+                continue
+            reply = self._replies.get(message.get("id"))
+            if reply and not reply.done():
+                reply.set_result(message)
+
+
+class AsyncActionBatch(ActionBatch):
+    """
+    Input actions collected by `AsyncSandbox.batch()`, use it with `async with`.
+    """
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' for the batch of an AsyncSandbox")
+
+    async def __aenter__(self) -> "AsyncActionBatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.run()
+
+    async def run(self) -> List[ActionResult]:
+        """
+        Run the collected actions in order, see `ActionBatch.run`.
+        """
+        start = time.perf_counter()
+        return self._finish(await self._desktop._run_actions(self._take()), start)
+
+
+class AsyncSandbox(AsyncSandboxBase):
+    """
+    Desktop sandbox with awaitable controls, for use in an asyncio event loop.
+
+    ```python
+    desktop = await AsyncSandbox.create()
+    image, _ = await asyncio.gather(desktop.capture_screen(), call_model())
+    ```
+    """
+
+    default_template = "desktop"
+
+    def __init__(self, **opts):
+        """
+        Use `AsyncSandbox.create()` to create a new desktop sandbox instead.
+        """
+        super().__init__(**opts)
+        self._setup_desktop(":0", True)
+
+    def _setup_desktop(
+        self,
+        display: str,
+        input_server: bool,
+        resolution: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        self._display = display
+        # Screen size and cursor position, see `Sandbox.get_screen_size`
+        self._state = DisplayState(resolution)
+        self._startup_timings: Dict[str, float] = {}
+        self._last_xfce4_pid = None
+        self._vnc_server: Optional[_AsyncVNCServer] = None
+        self._input_server = _AsyncInputServer(self) if input_server else None
+        self._input_server_started = False
+        self._input_server_lock = asyncio.Lock()
+
+    @classmethod
+    async def create(
+        cls,
+        resolution: Optional[Tuple[int, int]] = None,
+        dpi: Optional[int] = None,
+        display: Optional[str] = None,
+        template: Optional[str] = None,
+        timeout: Optional[int] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        envs: Optional[Dict[str, str]] = None,
+        api_key: Optional[str] = None,
+        domain: Optional[str] = None,
+        debug: Optional[bool] = None,
+        request_timeout: Optional[float] = None,
+        input_server: bool = True,
+    ) -> "AsyncSandbox":
+        """
+        Create a new desktop sandbox and start its desktop, see `Sandbox` for the parameters.
+
+        :return: sandbox instance for the new sandbox
+        """
+        display = display or ":0"
+        envs = {**(envs or {}), "DISPLAY": display}
+        start = time.perf_counter()
+
+        sandbox = await super().create(
+            template=template,
+            timeout=timeout,
+            metadata=metadata,
+            envs=envs,
+            api_key=api_key,
+            domain=domain,
+            debug=debug,
+            request_timeout=request_timeout,
+        )
+        sandbox._setup_desktop(display, input_server, resolution or (1024, 768))
+        sandbox._record_phase("create", start)
+        await sandbox._start_desktop(resolution, dpi)
+        sandbox._record_phase("total", start)
+        return sandbox
+
+    async def _start_desktop(
+        self, resolution: Optional[Tuple[int, int]], dpi: Optional[int]
+    ) -> None:
+        start = time.perf_counter()
+        width, height = resolution or (1024, 768)
+        await self.commands.run(
+            f"Xvfb {self._display} -ac -screen 0 {width}x{height}x24"
+            f" -retro -dpi {dpi or 96} -nolisten tcp -nolisten unix",
+            background=True,
+            timeout=0,
+        )
+        start = self._record_phase("xvfb_start", start)
+
+        if not (await self._wait_until(f"xdpyinfo -display {self._display}")).ready:
+            raise TimeoutException("Could not start Xvfb")
+        start = self._record_phase("xvfb_ready", start)
+
+        await self._start_xfce4()
+        self._record_phase("xfce4_start", start)
+
+    @property
+    def startup_timings(self) -> Dict[str, float]:
+        """
+        Milliseconds each startup phase took, see `Sandbox.startup_timings`.
+        """
+        return dict(self._startup_timings)
+
+    def _record_phase(self, phase: str, start: float) -> float:
+        """
+        Record how long a phase took since `start`, returns the current time.
+        """
+        now = time.perf_counter()
+        self._startup_timings[phase] = (now - start) * 1000
+        return now
+
+    async def _wait_until(
+        self,
+        check: str,
+        timeout: float = 10,
+        interval: float = 0.05,
+        max_interval: float = 1.0,
+    ) -> WaitResult:
+        """
+        Retry a shell command inside the sandbox until it succeeds, see `Sandbox._wait_until`.
+        """
+        result = await self.commands.run(
+            wait_script(check, timeout, interval, max_interval), timeout=timeout + 30
+        )
+        return parse_wait(result.stdout)
+
+    async def wait_for_desktop(self, timeout: float = 30) -> bool:
+        """
+        Wait until the window manager and the desktop of the xfce session are up.
+
+        :param timeout: Seconds to wait at most
+        :return: True if the desktop is ready, False on timeout
+        """
+        start = time.perf_counter()
+        ready = (
+            await self._wait_until(
+                DESKTOP_READY_CHECK.format(display=self._display), timeout
+            )
+        ).ready
+        self._record_phase("desktop_ready", start)
+        return ready
+
+    async def _start_xfce4(self):
+        """
+        Start xfce4 session if logged out or not running.
+        """
+        if self._last_xfce4_pid is None or "[xfce4-session] <defunct>" in (
+            (
+                await self.commands.run(
+                    f"ps aux | grep {self._last_xfce4_pid} | grep -v grep | head -n 1"
+                )
+            ).stdout.strip()
+        ):
+            self._last_xfce4_pid = (
+                await self.commands.run("startxfce4", background=True, timeout=0)
+            ).pid
+
+    @property
+    def stream(self) -> _AsyncVNCServer:
+        if self._vnc_server is None:
+            self._vnc_server = _AsyncVNCServer(self)
+        return self._vnc_server
+
+    async def _input(self) -> Optional[_AsyncInputServer]:
+        """
+        The running input server, started on first use, or None to use xdotool.
+        """
+        if self._input_server is None:
+            return None
+        async with self._input_server_lock:
+            if not self._input_server_started:
+                self._input_server_started = True
+                try:
+                    if not await self._input_server.start():
+                        logger.warning("Input server did not start, using xdotool")
+                except Exception as e:
+                    logger.warning(
+                        f"Input server could not be started, using xdotool: {e}"
+                    )
+        return self._input_server if self._input_server.running else None
+
+    async def _run_action(self, action: Action) -> None:
+        """
+        Run an input action through the input server, or as its xdotool command
+        when the server is not available.
+        """
+        server = await self._input()
+        if server:
+            reply = await server.send(action.ops, action.expected_ms)
+            if reply["ok"]:
+                return
+            if reply.get("done"):
+                # Part of the action already ran, replaying it with xdotool would repeat it
+                raise RuntimeError(
+                    f"Input action {action.name} failed: {reply['error']}"
+                )
+            logger.debug(
+                f"Input server could not run {action.name}, using xdotool: {reply['error']}"
+            )
+        try:
+            await self.commands.run(
+                action.command, timeout=60 + action.expected_ms / 1000
+            )
+        except Exception:
+            self._state.invalidate(screen_size=False)
+            raise
+        self._state.apply(action)
+
+    async def _run_actions(self, batch: List[Action]) -> List[ActionResult]:
+        """
+        Run a list of input actions in a single round trip, returns one result per action.
+        """
+        if not batch:
+            return []
+
+        server = await self._input()
+        if server:
+            reply = await server.send(
+                [op for action in batch for op in action.ops],
+                sum(a.expected_ms for a in batch),
+            )
+            if reply["ok"] or reply.get("done"):
+                return actions.server_results(batch, reply)
+            logger.debug(
+                f"Input server could not run the batch, using xdotool: {reply['error']}"
+            )
+
+        result = await self.commands.run(
+            actions.batch_script(batch),
+            timeout=60 + sum(a.expected_ms for a in batch) / 1000,
+        )
+        results = actions.script_results(batch, result.stdout)
+        self._state.apply_results(batch, results)
+        return results
+
+    def batch(self, raise_on_error: bool = True) -> AsyncActionBatch:
+        """
+        Collect input actions and run them together in a single round trip.
+
+        ```python
+        async with desktop.batch() as batch:
+            batch.left_click(100, 200)
+            batch.write("hello")
+        ```
+
+        :param raise_on_error: Raise a `RuntimeError` if an action fails, otherwise only report it in the results
+        :return: The batch to add actions to
+        """
+        return AsyncActionBatch(self, raise_on_error)
+
+    @overload
+    async def screenshot(self, format: Literal["stream"]) -> AsyncIterator[bytes]:
+        """
+        Take a screenshot and return it as a stream of bytes.
+        """
+
+    @overload
+    async def screenshot(
+        self,
+        format: Literal["bytes"],
+    ) -> bytearray:
+        """
+        Take a screenshot and return it as a bytearray.
+        """
+
+    async def screenshot(
+        self,
+        format: Literal["bytes", "stream"] = "bytes",
+    ):
+        """
+        Take a screenshot and return it in the specified format.
+
+        :param format: The format of the screenshot. Can be 'bytes' or 'stream'.
+        :returns: The screenshot in the specified format.
+        """
+        screenshot_path = f"/tmp/screenshot-{uuid4()}.png"
+
+        await self.commands.run(f"scrot --pointer {screenshot_path}")
+
+        file = await self.files.read(screenshot_path, format=format)
+        await self.files.remove(screenshot_path)
+        return file
+
+    async def capture_screen(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> bytes:
+        """
+        Take a screenshot in a single round trip, see `Sandbox.capture_screen`.
+        """
+        result = await self.commands.run(
+            _ffmpeg_grab_command(
+                self._display, region, scale, image_format, quality, pointer
+            )
+        )
+        return b64decode(result.stdout)
+
+    async def changed_since(self, token: Optional[str] = None) -> ScreenChanges:
+        """
+        Tell which parts of the screen changed since an earlier call, see `Sandbox.changed_since`.
+        """
+        server = await self._input()
+        if server:
+            reply = await server.send([["damage", token]])
+            if reply["ok"]:
+                return parse_changes(reply["result"])
+            logger.debug(f"Input server could not track changes: {reply['error']}")
+        return untracked_changes(await self.get_screen_size())
+
+    async def wait_until_settled(
+        self, quiet_ms: int = 300, timeout: float = 10
+    ) -> bool:
+        """
+        Wait until the screen stopped changing, see `Sandbox.wait_until_settled`.
+        """
+        server = await self._input()
+        if server:
+            reply = await server.send(
+                [["settle", quiet_ms, int(timeout * 1000)]], timeout * 1000
+            )
+            if reply["ok"]:
+                return reply["result"]["settled"]
+            logger.debug(f"Input server could not track changes: {reply['error']}")
+        result = await self.commands.run(
+            settle_script(self._display, quiet_ms, timeout), timeout=timeout + 30
+        )
+        return parse_wait(result.stdout).ready
+
+    async def capture_window(
+        self,
+        window_id: str,
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> WindowCapture:
+        """
+        Take a screenshot of only one window, see `Sandbox.capture_window`.
+        """
+        captures = await self.capture_windows(
+            [window_id], scale, image_format, quality, pointer
+        )
+        if not captures:
+            raise RuntimeError(f"Could not capture window {window_id}")
+        return next(iter(captures.values()))
+
+    async def capture_windows(
+        self,
+        window_ids: List[str],
+        scale: float = 1.0,
+        image_format: Literal["png", "jpeg", "webp", "raw"] = "png",
+        quality: Optional[int] = None,
+        pointer: bool = True,
+    ) -> Dict[str, WindowCapture]:
+        """
+        Take screenshots of several windows in parallel, see `Sandbox.capture_windows`.
+        """
+        window_ids = [check_window_id(window_id) for window_id in window_ids]
+        if not window_ids:
+            return {}
+        script = capture_windows_script(
+            window_ids,
+            await self.get_screen_size(),
+            lambda region: _ffmpeg_grab_command(
+                self._display, region, scale, image_format, quality, pointer
+            ),
+        )
+        return parse_window_captures(
+            window_ids, (await self.commands.run(script)).stdout, scale
+        )
+
+    async def left_click(self, x: Optional[int] = None, y: Optional[int] = None):
+        """
+        Left click on the mouse position.
+        """
+        await self._run_action(actions.click("left_click", MOUSE_BUTTONS["left"], x, y))
+
+    async def double_click(self, x: Optional[int] = None, y: Optional[int] = None):
+        """
+        Double left click on the mouse position.
+        """
+        await self._run_action(
+            actions.click("double_click", MOUSE_BUTTONS["left"], x, y, repeat=2)
+        )
+
+    async def right_click(self, x: Optional[int] = None, y: Optional[int] = None):
+        """
+        Right click on the mouse position.
+        """
+        if (x is None) != (y is None):
+            raise ValueError("Both x and y must be provided together")
+        await self._run_action(
+            actions.click("right_click", MOUSE_BUTTONS["right"], x, y)
+        )
+
+    async def middle_click(self, x: Optional[int] = None, y: Optional[int] = None):
+        """
+        Middle click on the mouse position.
+        """
+        await self._run_action(
+            actions.click("middle_click", MOUSE_BUTTONS["middle"], x, y)
+        )
+
+    async def scroll(self, direction: Literal["up", "down"] = "down", amount: int = 1):
+        """
+        Scroll the mouse wheel by the given amount.
+
+        :param direction: The direction to scroll. Can be "up" or "down".
+        :param amount: The amount to scroll.
+        """
+        await self._run_action(actions.scroll(4 if direction == "up" else 5, amount))
+
+    async def move_mouse(self, x: int, y: int):
+        """
+        Move the mouse to the given coordinates.
+
+        :param x: The x coordinate.
+        :param y: The y coordinate.
+        """
+        await self._run_action(actions.move_mouse(x, y))
+
+    async def mouse_press(self, button: Literal["left", "right", "middle"] = "left"):
+        """
+        Press the mouse button.
+        """
+        await self._run_action(actions.mouse_press(MOUSE_BUTTONS[button]))
+
+    async def mouse_release(self, button: Literal["left", "right", "middle"] = "left"):
+        """
+        Release the mouse button.
+        """
+        await self._run_action(actions.mouse_release(MOUSE_BUTTONS[button]))
+
+    async def get_cursor_position(self, refresh: bool = False) -> Tuple[int, int]:
+        """
+        Get the current cursor position, see `Sandbox.get_cursor_position`.
+
+        :param refresh: Read the position from the sandbox even if it is known
+        :return: A tuple with the x and y coordinates
+        :raises RuntimeError: If the cursor position cannot be determined
+        """
+        if self._state.cursor and not refresh:
+            return self._state.cursor
+        position = parse_cursor_position(
+            (await self.commands.run("xdotool getmouselocation")).stdout
+        )
+        self._state.update({"pointer": position})
+        return position
+
+    async def get_screen_size(self, refresh: bool = False) -> Tuple[int, int]:
+        """
+        Get the current screen size, see `Sandbox.get_screen_size`.
+
+        :param refresh: Read the size from the sandbox even if it is known
+        :return: A tuple with the width and height
+        :raises RuntimeError: If the screen size cannot be determined
+        """
+        if self._state.screen_size and not refresh:
+            return self._state.screen_size
+        size = parse_screen_size((await self.commands.run("xrandr")).stdout)
+        self._state.update({"screen": size})
+        return size
+
+    async def write(
+        self,
+        text: str,
+        *,
+        chunk_size: int = 25,
+        delay_in_ms: int = 75,
+        strategy: Optional[Strategy] = None,
+        paste_key: Union[str, List[str]] = ["ctrl", "v"],
+    ) -> None:
+        """
+        Write the given text at the current cursor position, see `Sandbox.write`.
+
+        :param text: The text to write.
+        :param chunk_size: The size of each chunk of text to write.
+        :param delay_in_ms: The delay between each chunk of text.
+        :param strategy: Write the text in bulk: "auto", "xtest", "file" or "clipboard".
+        :param paste_key: The keys the "clipboard" strategy pastes with.
+        """
+        if strategy is None:
+            await self._run_action(actions.write(text, chunk_size, delay_in_ms))
+            return
+
+        bulk_text.check_strategy(strategy)
+        server = await self._input()
+        if strategy == "auto":
+            strategy = bulk_text.choose_strategy(text, server is not None)
+        if strategy == "xtest" and server:
+            await self._run_action(actions.write(text, max(1, len(text)), 0))
+            return
+        if strategy == "xtest":
+            logger.warning(
+                'Input server is not running, writing with the "file" strategy instead of "xtest"'
+            )
+
+        path = f"/tmp/e2b-text-{uuid4()}"
+        encoded = bulk_text.encode(text)
+        if encoded is None:
+            await self.files.write(path, text)
+        if strategy == "clipboard":
+            script = bulk_text.clipboard_script(encoded, path, map_keys(paste_key))
+        else:
+            script = bulk_text.type_file_script(encoded, path)
+        await self.commands.run(script, timeout=60 + len(text) / 1000)
+
+    async def press(self, key: Union[str, List[str]]):
+        """
+        Press a key.
+
+        :param key: The key to press (e.g. "enter", "space", "backspace", etc.).
+        """
+        await self._run_action(actions.press(map_keys(key)))
+
+    async def drag(self, fr: Tuple[int, int], to: Tuple[int, int]):
+        """
+        Drag the mouse from the given position to the given position.
+
+        :param from: The starting position.
+        :param to: The ending position.
+        """
+        await self._run_action(actions.drag(fr, to, MOUSE_BUTTONS["left"]))
+
+    async def wait(self, ms: int):
+        """
+        Wait for the given amount of time, without blocking the event loop.
+
+        :param ms: The amount of time to wait in milliseconds.
+        """
+        await asyncio.sleep(ms / 1000)
+
+    async def open(self, file_or_url: str):
+        """
+        Open a file or a URL in the default application.
+
+        :param file_or_url: The file or URL to open.
+        """
+        await self.commands.run(f"xdg-open {file_or_url}", background=True)
+
+    async def get_current_window_id(self) -> str:
+        """
+        Get the current window ID.
+        """
+        return (await self.commands.run("xdotool getwindowfocus")).stdout.strip()
+
+    async def get_application_windows(self, application: str) -> List[str]:
+        """
+        Get the window IDs of all windows for the given application.
+        """
+        result = await self.commands.run(
+            f"xdotool search --onlyvisible --class {application}"
+        )
+        return result.stdout.strip().split("\n")
+
+    async def get_window_title(self, window_id: str) -> str:
+        """
+        Get the title of the window with the given ID.
+        """
+        return (
+            await self.commands.run(f"xdotool getwindowname {window_id}")
+        ).stdout.strip()
+
+    async def get_window_geometry(self, window_id: str) -> WindowGeometry:
+        """
+        Get the position and size of the window with the given ID, see `Sandbox.get_window_geometry`.
+        """
+        result = await self.commands.run(
+            f"xdotool getwindowgeometry --shell {check_window_id(window_id)}"
+        )
+        return parse_window_geometry(result.stdout)
+
+    async def launch(self, application: str, uri: Optional[str] = None):
+        """
+        Launch an application.
+        """
+        await self.commands.run(
+            f"gtk-launch {application} {uri or ''}", background=True, timeout=0
+        )
@@ -0,0 +1,293 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from e2b import TimeoutException
+
+from .main import Sandbox
+
+logger = logging.getLogger(__name__)
+
+
+def boot_sandbox(**options) -> Sandbox:
+    """
+    Create a desktop sandbox and wait until its desktop is up, the pool's default factory.
+    """
+    sandbox = Sandbox(**options)
+    if not sandbox.wait_for_desktop():
+        logger.warning("Pooled sandbox desktop did not come up in time")
+    return sandbox
+
+
+class SandboxPool:
+    """
+    Keeps a number of desktop sandboxes booted and ready, and refills in the background.
+
+    ```python
+    pool = SandboxPool(size=2, resolution=(1280, 800))
+    with pool.sandbox() as desktop:
+        desktop.left_click(100, 200)
+    pool.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        factory: Optional[Callable[[], Any]] = None,
+        reset: Optional[Callable[[Any], bool]] = None,
+        max_uses: int = 1,
+        max_idle: Optional[float] = None,
+        max_failures: int = 5,
+        retry_backoff: float = 1.0,
+        **sandbox_options,
+    ):
+        """
+        :param size: Number of ready sandboxes to keep
+        :param factory: Creates a ready sandbox, defaults to `boot_sandbox(**sandbox_options)`
+        :param reset: Prepares a used sandbox for the next user and returns True on success. Without it, used sandboxes are killed
+        :param max_uses: How many times a sandbox is handed out before it is killed, only applies with `reset`
+        :param max_idle: Seconds a ready sandbox may wait before it is replaced, e.g. to stay below the sandbox timeout
+        :param max_failures: Failed creations in a row after which `acquire()` raises instead of retrying
+        :param retry_backoff: Seconds to wait before retrying a failed creation, doubled after every failure
+        :param sandbox_options: Passed to `Sandbox()` by the default factory
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.size = size
+        self._factory = factory or (lambda: boot_sandbox(**sandbox_options))
+        self._reset = reset
+        self._max_uses = max_uses if reset else 1
+        self._max_idle = max_idle
+        self._max_failures = max_failures
+        self._retry_backoff = retry_backoff
+
+        # (sandbox, ready since, uses so far), oldest first
+        self._idle: List[Tuple[Any, float, int]] = []
+        self._uses: Dict[int, int] = {}
+        self._creating = 0
+        self._failures = 0  # Failed creations in a row
+        self._last_error: Optional[Exception] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="sandbox-pool"
+        )
+
+        self.stats = {
+            "acquired": 0,
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "failed": 0,
+            "reused": 0,
+            "killed": 0,
+        }
+        self._wait_ms: List[float] = []
+
+        with self._cond:
+            self._refill()
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """
+        Take a ready sandbox, waiting for one to finish booting if none is ready.
+
+        :param timeout: Seconds to wait at most
+        :raises TimeoutException: If no sandbox became ready in time
+        :raises RuntimeError: If creating sandboxes failed `max_failures` times in a row
+        """
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Sandbox pool is closed")
+            self.stats["acquired"] += 1
+            hit = True
+            if self._gave_up():
+                # Start a new round of attempts
+                self._failures = 0
+
+            while True:
+                self._expire_idle()
+                if self._idle:
+                    sandbox, _, uses = self._idle.pop(0)
+                    break
+                hit = False
+                if self._gave_up():
+                    raise RuntimeError(
+                        f"Could not create a pooled sandbox after {self._failures} attempts"
+                    ) from self._last_error
+                # Make sure a sandbox is on its way even if the pool is full of users
+                if self._creating == 0:
+                    self._spawn()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutException("No pooled sandbox became ready in time")
+                self._cond.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("Sandbox pool is closed")
+
+            self.stats["hits" if hit else "misses"] += 1
+            self._wait_ms.append((time.perf_counter() - start) * 1000)
+            self._uses[id(sandbox)] = uses + 1
+            self._refill()
+        return sandbox
+
+    def release(self, sandbox: Any, reuse: bool = True) -> None:
+        """
+        Give a sandbox back: it is reset and returned to the pool, or killed and replaced.
+
+        :param reuse: False to always kill it, e.g. after an error left it in an unknown state
+        """
+        with self._cond:
+            uses = self._uses.pop(id(sandbox), self._max_uses)
+            reuse = (
+                reuse
+                and not self._closed
+                and self._reset is not None
+                and uses < self._max_uses
+            )
+
+        if reuse:
+            try:
+                reuse = bool(self._reset(sandbox))
+            except Exception as e:
+                logger.warning(f"Could not reset pooled sandbox: {e}")
+                reuse = False
+
+        if not reuse:
+            self._kill(sandbox)
+            with self._cond:
+                self._refill()
+            return
+
+        with self._cond:
+            self.stats["reused"] += 1
+            self._idle.append((sandbox, time.monotonic(), uses))
+            self._cond.notify()
+
+    @contextmanager
+    def sandbox(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        Acquire a sandbox for the `with` block, it is not reused if the block raises.
+        """
+        sandbox = self.acquire(timeout)
+        try:
+            yield sandbox
+        except BaseException:
+            self.release(sandbox, reuse=False)
+            raise
+        self.release(sandbox)
+
+    def metrics(self) -> Dict[str, Optional[float]]:
+        """
+        Hit rate and the time `acquire()` waited, in milliseconds.
+        """
+        with self._cond:
+            waits = sorted(self._wait_ms)
+            acquired = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "ready": len(self._idle),
+                "booting": self._creating,
+                "hit_rate": self.stats["hits"] / acquired if acquired else None,
+                "wait_p50_ms": waits[len(waits) // 2] if waits else None,
+                "wait_p95_ms": (
+                    waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+                    if waits
+                    else None
+                ),
+                "wait_max_ms": waits[-1] if waits else None,
+            }
+
+    def close(self) -> None:
+        """
+        Stop refilling and kill the sandboxes that are not in use.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for sandbox, _, _ in idle:
+            self._kill(sandbox)
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self) -> "SandboxPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _gave_up(self) -> bool:
+        # Called with the lock held
+        return self._failures >= self._max_failures
+
+    def _refill(self) -> None:
+        # Called with the lock held
+        while (
+            not self._closed
+            and not self._gave_up()
+            and len(self._idle) + self._creating < self.size
+        ):
+            self._spawn()
+
+    def _spawn(self) -> None:
+        # Called with the lock held, waits before retrying after failures
+        self._creating += 1
+        delay = self._retry_backoff * 2 ** (self._failures - 1) if self._failures else 0
+        self._executor.submit(self._create, delay)
+
+    def _create(self, delay: float = 0) -> None:
+        if delay:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, delay)
+        try:
+            if self._closed:
+                raise RuntimeError("Sandbox pool is closed")
+            sandbox = self._factory()
+        except Exception as e:
+            with self._cond:
+                self._creating -= 1
+                if not self._closed:
+                    logger.warning(f"Could not create pooled sandbox: {e}")
+                    self.stats["failed"] += 1
+                    self._failures += 1
+                    self._last_error = e
+                    self._refill()
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            self._creating -= 1
+            self._failures = 0
+            self.stats["created"] += 1
+            if not self._closed:
+                self._idle.append((sandbox, time.monotonic(), 0))
+                self._cond.notify()
+                return
+        self._kill(sandbox)
+
+    def _expire_idle(self) -> None:
+        # Called with the lock held
+        if self._max_idle is None:
+            return
+        now = time.monotonic()
+        expired = [entry for entry in self._idle if now - entry[1] > self._max_idle]
+        if not expired:
+            return
+        self._idle = [entry for entry in self._idle if entry not in expired]
+        for sandbox, _, _ in expired:
+            self._executor.submit(self._kill, sandbox)
+        self._refill()
+
+    def _kill(self, sandbox: Any) -> None:
+        with self._cond:
+            self.stats["killed"] += 1
+        try:
+            sandbox.kill()
+        except Exception as e:
+            logger.warning(f"Could not kill pooled sandbox: {e}")
@@ -0,0 +1,49 @@
+"""
+Readiness checks that wait inside the sandbox.
+
+The wait loop runs remotely as one shell command with exponential backoff and
+a wall-clock deadline, so waiting costs a single round trip however many
+attempts it takes.
+"""
+
+from typing import NamedTuple
+
+
+class WaitResult(NamedTuple):
+    ready: bool
+    # Time spent waiting inside the sandbox, in milliseconds
+    elapsed_ms: float
+    attempts: int
+
+
+def wait_script(
+    check: str, timeout: float, interval: float = 0.05, max_interval: float = 1.0
+) -> str:
+    """
+    Shell script retrying the `check` command until it succeeds or `timeout` seconds passed.
+
+    The pause between attempts starts at `interval` and doubles up to `max_interval`.
+    It prints "ready|timeout <elapsed ns> <attempts>" and always exits with 0.
+    """
+    return (
+        f"start=$(date +%s%N); deadline=$(( start + {int(timeout * 1e9)} )); "
+        f"delay={max(1, int(interval * 1000))}; attempts=0; "
+        "while :; do "
+        "attempts=$(( attempts + 1 )); "
+        f'if ( {check} ) >/dev/null 2>&1; then echo "ready $(( $(date +%s%N) - start )) $attempts"; exit 0; fi; '
+        "now=$(date +%s%N); "
+        'if (( now >= deadline )); then echo "timeout $(( now - start )) $attempts"; exit 0; fi; '
+        # Never sleep past the deadline
+        "left=$(( (deadline - now) / 1000000 )); sleep_ms=$(( delay < left ? delay : left )); "
+        "sleep $(( sleep_ms / 1000 )).$(printf %03d $(( sleep_ms % 1000 ))); "
+        f"delay=$(( delay * 2 < {int(max_interval * 1000)} ? delay * 2 : {int(max_interval * 1000)} )); "
+        "done"
+    )
+
+
+def parse_wait(stdout: str) -> WaitResult:
+    """
+    Parse the output of `wait_script()`.
+    """
+    status, elapsed_ns, attempts = stdout.split()
+    return WaitResult(status == "ready", int(elapsed_ns) / 1e6, int(attempts))
@@ -0,0 +1,60 @@
+"""
+Local copy of the display state: screen size and cursor position.
+
+It is kept up to date from the actions the SDK runs and the state the input
+server reports with every reply, including resolution changes it pushes on
+its own, so reading it needs no round trip unless the state is unknown.
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+from .actions import Action, ActionResult
+
+
+class DisplayState:
+    def __init__(self, screen_size: Optional[Tuple[int, int]] = None) -> None:
+        self._lock = threading.Lock()
+        self.screen_size = screen_size
+        self.cursor: Optional[Tuple[int, int]] = None
+
+    def invalidate(self, screen_size: bool = True, cursor: bool = True) -> None:
+        """
+        Forget the cached state, so it's read from the sandbox next time.
+        """
+        with self._lock:
+            if screen_size:
+                self.screen_size = None
+            if cursor:
+                self.cursor = None
+
+    def update(self, message: dict) -> None:
+        """
+        Take the `pointer` and `screen` fields of an input server message.
+        """
+        with self._lock:
+            if message.get("pointer"):
+                self.cursor = tuple(message["pointer"])
+            if message.get("screen"):
+                self.screen_size = tuple(message["screen"])
+
+    def apply(self, action: Action) -> None:
+        """
+        Track where an action ran through xdotool left the cursor.
+        """
+        moves = [op for op in action.ops if op[0] == "move"]
+        if moves:
+            with self._lock:
+                self.cursor = (moves[-1][1], moves[-1][2])
+
+    def apply_results(self, batch: List[Action], results: List[ActionResult]) -> None:
+        """
+        Track the cursor after a batch ran through xdotool.
+        """
+        for action, result in zip(batch, results):
+            if result.ok:
+                self.apply(action)
+            elif result.duration_ms is not None:
+                # It failed halfway, the cursor may have moved or not
+                self.invalidate(screen_size=False)
+                return
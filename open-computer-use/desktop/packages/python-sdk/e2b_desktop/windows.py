@@ -0,0 +1,123 @@
+"""
+Window-scoped screenshots.
+
+A window is captured by grabbing only its part of the screen: one shell command
+looks up the window geometry with xdotool, clips it to the screen and grabs it
+with ffmpeg. Several windows are grabbed by parallel ffmpeg processes in the
+same command.
+"""
+
+from base64 import b64decode
+from re import fullmatch
+from shlex import quote as quote_string
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+
+class WindowGeometry(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        """
+        Translate a position relative to the window to screen coordinates.
+        """
+        return self.x + x, self.y + y
+
+
+class WindowCapture(NamedTuple):
+    window_id: str
+    # Part of the screen that was captured, the window clipped to the screen
+    geometry: WindowGeometry
+    scale: float
+    image: bytes
+
+    def to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        """
+        Translate a position in the image to screen coordinates, e.g. to click it.
+        """
+        return self.geometry.to_screen(round(x / self.scale), round(y / self.scale))
+
+
+def parse_window_geometry(stdout: str) -> WindowGeometry:
+    """
+    Parse the output of `xdotool getwindowgeometry --shell`.
+    """
+    values = dict(line.split("=", 1) for line in stdout.split() if "=" in line)
+    try:
+        return WindowGeometry(
+            int(values["X"]),
+            int(values["Y"]),
+            int(values["WIDTH"]),
+            int(values["HEIGHT"]),
+        )
+    except (KeyError, ValueError) as e:
+        raise RuntimeError(
+            f"Failed to parse window geometry from output: {stdout}"
+        ) from e
+
+
+def capture_windows_script(
+    window_ids: List[str],
+    screen_size: Tuple[int, int],
+    grab_command: Callable[[Tuple[str, str, str, str]], str],
+) -> str:
+    """
+    Shell script capturing every window in parallel.
+
+    For each window it prints two lines, "<x> <y> <width> <height>" and the base64
+    image, or "error" and an empty line if the window could not be captured.
+
+    :param grab_command: Builds the grab command for a region given as shell variables
+    """
+    screen_width, screen_height = screen_size
+    grab = grab_command(("${x}", "${y}", "${w}", "${h}"))
+    lines = ["d=$(mktemp -d)"]
+    for i, window_id in enumerate(window_ids):
+        lines.append(
+            "{ ( "
+            f'eval "$(xdotool getwindowgeometry --shell {quote_string(window_id)})" || exit 1; '
+            # x11grab fails on regions outside the screen
+            "x=$(( X < 0 ? 0 : X )); y=$(( Y < 0 ? 0 : Y )); "
+            f"w=$(( (X + WIDTH > {screen_width} ? {screen_width} : X + WIDTH) - x )); "
+            f"h=$(( (Y + HEIGHT > {screen_height} ? {screen_height} : Y + HEIGHT) - y )); "
+            "(( w > 0 && h > 0 )) || exit 1; "
+            f'echo "$x $y $w $h"; {grab}'
+            f' ) > "$d/{i}" 2>/dev/null; echo $? > "$d/{i}.status"; }} &'
+        )
+    lines.append("wait")
+    lines.append(
+        f"for i in $(seq 0 {len(window_ids) - 1}); do "
+        'if [ "$(cat "$d/$i.status")" = 0 ]; then cat "$d/$i"; echo; else printf \'error\\n\\n\'; fi; '
+        "done"
+    )
+    lines.append('rm -rf "$d"')
+    return "\n".join(lines)
+
+
+def parse_window_captures(
+    window_ids: List[str], stdout: str, scale: float
+) -> Dict[str, WindowCapture]:
+    """
+    Parse the output of `capture_windows_script()`, leaving out the windows that failed.
+    """
+    lines = stdout.split("\n")
+    captures = {}
+    for i, window_id in enumerate(window_ids):
+        header, data = lines[2 * i], lines[2 * i + 1]
+        if header == "error":
+            continue
+        geometry = WindowGeometry(*map(int, header.split()))
+        captures[window_id] = WindowCapture(window_id, geometry, scale, b64decode(data))
+    return captures
+
+
+def check_window_id(window_id: str) -> str:
+    """
+    Window IDs are numbers, as returned by `get_current_window_id()` and `get_application_windows()`.
+    """
+    window_id = str(window_id).strip()
+    if not fullmatch(r"\d+|0x[0-9a-fA-F]+", window_id):
+        raise ValueError(f"Invalid window ID: {window_id!r}")
+    return window_id
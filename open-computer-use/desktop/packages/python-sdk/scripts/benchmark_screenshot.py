@@ -0,0 +1,69 @@
+"""
+Compare the latency of Sandbox.screenshot() (scrot + files.read + files.remove)
+with the single round trip Sandbox.capture_screen() in its different modes.
+
+Needs E2B_API_KEY. Run it in the `python-sdk/` directory:
+
+    poetry run python scripts/benchmark_screenshot.py --iterations 20
+"""
+
+import argparse
+import statistics
+import time
+
+from e2b_desktop import Sandbox
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def cases(sandbox, width, height):
+    return {
+        "screenshot (3 calls)": lambda: sandbox.screenshot(),
+        "capture png": lambda: sandbox.capture_screen(),
+        "capture jpeg": lambda: sandbox.capture_screen(image_format="jpeg"),
+        "capture webp": lambda: sandbox.capture_screen(image_format="webp"),
+        "capture raw": lambda: sandbox.capture_screen(image_format="raw"),
+        "capture png x0.5": lambda: sandbox.capture_screen(scale=0.5),
+        "capture png region": lambda: sandbox.capture_screen(
+            region=(0, 0, width // 2, height // 2)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument(
+        "--resolution", default="1024x768", help="Sandbox screen size, WIDTHxHEIGHT"
+    )
+    args = parser.parse_args()
+
+    width, height = map(int, args.resolution.split("x"))
+    sandbox = Sandbox(resolution=(width, height))
+    try:
+        # Let the desktop finish drawing so every run captures the same content
+        time.sleep(5)
+
+        print(f"{'case':<22} {'mean ms':>8} {'p50 ms':>8} {'p90 ms':>8} {'bytes':>10}")
+        for name, capture in cases(sandbox, width, height).items():
+            capture()  # warm up
+            latencies = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                image = capture()
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(
+                f"{name:<22} {statistics.mean(latencies):>8.1f} {percentile(latencies, 50):>8.1f} "
+                f"{percentile(latencies, 90):>8.1f} {len(image):>10}"
+            )
+    finally:
+        sandbox.kill()
+
+
+if __name__ == "__main__":
+    main()
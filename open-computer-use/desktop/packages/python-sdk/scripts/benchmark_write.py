@@ -0,0 +1,106 @@
+"""
+Compare how fast Sandbox.write() gets text into an application with each strategy.
+
+Every strategy writes into a terminal running `cat`, so the received text can
+be checked. Typing like a person (the default) is slow, it only writes the
+first --baseline-chars characters.
+
+Needs E2B_API_KEY. Run it in the `python-sdk/` directory:
+
+    poetry run python scripts/benchmark_write.py --chars 2000
+"""
+
+import argparse
+import time
+
+from e2b_desktop import Sandbox
+from e2b_desktop.bulk_text import choose_strategy
+
+LINE = "The quick brown fox jumps over the lazy dog, 0123456789 (){}[]<>;:'\"\t~!"
+UNICODE_LINE = "Příliš žluťoučký kůň úpěl ďábelské ódy — naïve café, Grüße, 東京, ✓"
+
+# Terminals paste with ctrl+shift+v
+PASTE_KEY = ["ctrl", "shift", "v"]
+
+
+def make_text(line, chars):
+    text = ""
+    while len(text) < chars:
+        text += line + "\n"
+    return text[:chars]
+
+
+def open_terminal(sandbox, output):
+    sandbox.commands.run(
+        f"xfce4-terminal --disable-server -x sh -c 'stty -echo; cat > {output}'",
+        background=True,
+        timeout=0,
+    )
+    sandbox.commands.run(
+        "xdotool search --sync --onlyvisible --class xfce4-terminal windowactivate --sync",
+        timeout=30,
+    )
+    # Let the shell inside reach `cat`
+    time.sleep(1)
+
+
+def received(sandbox, output):
+    # A newline flushes the last line, ctrl+d closes cat
+    sandbox.press("enter")
+    sandbox.press(["ctrl", "d"])
+    time.sleep(0.5)
+    return sandbox.files.read(output)
+
+
+def run(sandbox, name, text, **options):
+    output = f"/tmp/benchmark-write-{int(time.time() * 1000)}.txt"
+    open_terminal(sandbox, output)
+    start = time.perf_counter()
+    sandbox.write(text, **options)
+    elapsed = time.perf_counter() - start
+
+    result = received(sandbox, output)
+    correct = result.rstrip("\n") == text.rstrip("\n")
+    print(
+        f"{name:<28} {len(text):>6} {elapsed * 1000:>9.0f} {len(text) / elapsed:>9.0f}   {'yes' if correct else 'NO'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--chars", type=int, default=2000, help="Length of the text written in bulk"
+    )
+    parser.add_argument(
+        "--baseline-chars",
+        type=int,
+        default=200,
+        help="Length of the text typed like a person",
+    )
+    args = parser.parse_args()
+
+    sandbox = Sandbox()
+    try:
+        sandbox.wait_for_desktop()
+
+        print(f"{'strategy':<28} {'chars':>6} {'ms':>9} {'chars/s':>9}   correct")
+        for label, line in (("ascii", LINE), ("unicode", UNICODE_LINE)):
+            text = make_text(line, args.chars)
+            run(sandbox, f"{label} typed (default)", text[: args.baseline_chars])
+            for strategy in ("xtest", "file", "clipboard"):
+                run(
+                    sandbox,
+                    f"{label} {strategy}",
+                    text,
+                    strategy=strategy,
+                    paste_key=PASTE_KEY,
+                )
+            print(f"{label} auto picks: {choose_strategy(text, input_server=True)}")
+    finally:
+        sandbox.kill()
+
+
+if __name__ == "__main__":
+    main()
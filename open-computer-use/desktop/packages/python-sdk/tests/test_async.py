@@ -0,0 +1,316 @@
+import asyncio
+import base64
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+import pytest
+from e2b import CommandExitException, CommandResult
+from e2b_desktop import AsyncSandbox
+
+# Simulated round trip of every fake RPC
+LATENCY = 0.05
+
+
+class FakeHandle:
+    def __init__(self, pid: int, on_stdout: Optional[Callable[[str], None]]) -> None:
+        self.pid = pid
+        self.on_stdout = on_stdout
+        self._done = asyncio.Event()
+
+    async def wait(self) -> CommandResult:
+        await self._done.wait()
+        return CommandResult(stdout="", stderr="", exit_code=0, error=None)
+
+    async def kill(self) -> bool:
+        self._done.set()
+        return True
+
+
+class FakeCommands:
+    """
+    Stands in for `AsyncSandbox.commands`: answers from a table of command prefixes.
+    """
+
+    def __init__(self, outputs: Dict[str, str], input_server: bool = False) -> None:
+        self.outputs = outputs
+        self.input_server = input_server
+        self.ran: List[str] = []
+        self.stdin: List[dict] = []
+        self.server: Optional[FakeHandle] = None
+
+    async def run(self, cmd, background=False, timeout=60, on_stdout=None, **kwargs):
+        self.ran.append(cmd)
+        await asyncio.sleep(LATENCY)
+        if background:
+            handle = FakeHandle(len(self.ran), on_stdout)
+            if cmd.startswith("python3") and self.input_server:
+                self.server = handle
+                on_stdout('{"ready": true}\n')
+            return handle
+
+        for prefix, stdout in self.outputs.items():
+            if cmd.startswith(prefix):
+                return CommandResult(stdout=stdout, stderr="", exit_code=0, error=None)
+        raise CommandExitException(
+            stdout="", stderr=f"unknown command: {cmd}", exit_code=127, error=None
+        )
+
+    async def send_stdin(self, pid: int, data: str) -> None:
+        await asyncio.sleep(LATENCY)
+        message = json.loads(data)
+        self.stdin.append(message)
+        # Split the reply in two chunks, output is not line buffered on the way back
+        moves = [op for op in message["ops"] if op[0] == "move"] or [["move", 0, 0]]
+        reply = {
+            "id": message["id"],
+            "ok": True,
+            "timings": [1.0] * len(message["ops"]),
+            "pointer": moves[-1][1:],
+            "screen": [1024, 768],
+        }
+        if message["ops"][-1][0] == "damage":
+            # Everything changed on the first call, one tile since then
+            changed = (
+                [[0, 0, 1024, 768]]
+                if message["ops"][-1][1] is None
+                else [[32, 0, 32, 32]]
+            )
+            reply["result"] = {
+                "token": f"t:{message['id']}",
+                "changed": True,
+                "rects": changed,
+            }
+        reply = json.dumps(reply) + "\n"
+        self.server.on_stdout(reply[:5])
+        self.server.on_stdout(reply[5:])
+
+
+class FakeFiles:
+    def __init__(self) -> None:
+        self.written: Dict[str, str] = {}
+
+    async def write(self, path: str, data: str) -> None:
+        await asyncio.sleep(LATENCY)
+        self.written[path] = data
+
+
+def make_sandbox(commands: FakeCommands, input_server: bool = False) -> AsyncSandbox:
+    # Skip the E2B connection setup, the controls only go through commands and files
+    sandbox = AsyncSandbox.__new__(AsyncSandbox)
+    sandbox._commands = commands
+    sandbox._filesystem = FakeFiles()
+    sandbox._setup_desktop(":0", input_server)
+    return sandbox
+
+
+def test_controls_run_xdotool():
+    async def main():
+        commands = FakeCommands(
+            {"xdotool getmouselocation": "x:512 y:384 screen:0 window:1", "xdotool": ""}
+        )
+        sandbox = make_sandbox(commands)
+
+        await sandbox.left_click(10, 20)
+        await sandbox.press(["ctrl", "c"])
+        # Known from the click, then read from the sandbox
+        assert await sandbox.get_cursor_position() == (10, 20)
+        assert await sandbox.get_cursor_position(refresh=True) == (512, 384)
+        return commands.ran
+
+    assert asyncio.run(main()) == [
+        "xdotool mousemove --sync 10 20 click 1",
+        "xdotool key Control_L+c",
+        "xdotool getmouselocation",
+    ]
+
+
+def test_capture_screen_decodes_output():
+    image = b"\x89PNG fake image"
+
+    async def main():
+        sandbox = make_sandbox(
+            FakeCommands({"set -o pipefail; ffmpeg": base64.b64encode(image).decode()})
+        )
+        return await sandbox.capture_screen(region=(0, 0, 100, 50), image_format="jpeg")
+
+    assert asyncio.run(main()) == image
+
+
+def test_calls_overlap():
+    async def call_model():
+        await asyncio.sleep(LATENCY)
+
+    async def main():
+        sandbox = make_sandbox(
+            FakeCommands({"set -o pipefail; ffmpeg": "", "xdotool": ""})
+        )
+        start = time.perf_counter()
+        await asyncio.gather(
+            sandbox.capture_screen(), sandbox.left_click(1, 1), call_model()
+        )
+        return time.perf_counter() - start
+
+    # Sequential calls would take three round trips
+    assert asyncio.run(main()) < 2 * LATENCY
+
+
+def test_input_server_batch():
+    async def main():
+        commands = FakeCommands({}, input_server=True)
+        sandbox = make_sandbox(commands, input_server=True)
+
+        async with sandbox.batch() as batch:
+            batch.left_click(10, 20).write("hi", delay_in_ms=0)
+        return commands, batch
+
+    commands, batch = asyncio.run(main())
+    assert commands.stdin == [
+        {"id": 1, "ops": [["move", 10, 20], ["click", 1, 1], ["type", "hi", 0]]}
+    ]
+    assert [(r.action, r.ok, r.duration_ms) for r in batch.results] == [
+        ("left_click", True, 2.0),
+        ("write", True, 1.0),
+    ]
+
+
+def test_click_at_zero_coordinates_moves():
+    async def main():
+        xdotool = FakeCommands({"xdotool": ""})
+        await make_sandbox(xdotool).left_click(0, 300)
+        server = FakeCommands({}, input_server=True)
+        await make_sandbox(server, input_server=True).right_click(300, 0)
+        return xdotool.ran, server.stdin
+
+    ran, stdin = asyncio.run(main())
+    assert ran == ["xdotool mousemove --sync 0 300 click 1"]
+    assert stdin == [{"id": 1, "ops": [["move", 300, 0], ["click", 3, 1]]}]
+
+
+def test_batch_needs_async_with():
+    sandbox = make_sandbox(FakeCommands({}))
+    with pytest.raises(TypeError):
+        with sandbox.batch():
+            pass
+
+
+def test_wait_for_desktop_is_one_round_trip():
+    async def main():
+        commands = FakeCommands({"start=$(date +%s%N)": "ready 1500000 3\n"})
+        sandbox = make_sandbox(commands)
+        return (
+            await sandbox.wait_for_desktop(timeout=5),
+            commands.ran,
+            sandbox.startup_timings,
+        )
+
+    ready, ran, timings = asyncio.run(main())
+    assert ready
+    assert len(ran) == 1 and "xdotool search --onlyvisible --class xfdesktop" in ran[0]
+    assert timings["desktop_ready"] >= LATENCY * 1000
+
+
+def test_display_state_from_input_server():
+    async def main():
+        commands = FakeCommands({}, input_server=True)
+        sandbox = make_sandbox(commands, input_server=True)
+
+        await sandbox.move_mouse(30, 40)
+        cursor, size = (
+            await sandbox.get_cursor_position(),
+            await sandbox.get_screen_size(),
+        )
+        # Resolution change pushed by the server on its own
+        commands.server.on_stdout('{"screen": [1280, 800]}\n')
+        return cursor, size, await sandbox.get_screen_size(), commands.ran
+
+    cursor, size, resized, ran = asyncio.run(main())
+    assert cursor == (30, 40) and size == (1024, 768) and resized == (1280, 800)
+    # Only the input server was started, nothing was queried
+    assert len(ran) == 1
+
+
+def test_write_strategies():
+    async def main():
+        commands = FakeCommands({"f=$(mktemp)": ""}, input_server=True)
+        sandbox = make_sandbox(commands, input_server=True)
+
+        await sandbox.write("a" * 500, strategy="auto")
+        await sandbox.write("ž" * 500, strategy="auto")
+        await sandbox.write("hi", strategy="file")
+        return commands
+
+    commands = asyncio.run(main())
+    assert commands.stdin == [{"id": 1, "ops": [["type", "a" * 500, 0]]}]
+    clipboard, file = commands.ran[1:]
+    assert "xclip -selection clipboard" in clipboard
+    assert "xdotool type --delay 0 --file" in file and "xclip" not in file
+
+
+def test_xtest_strategy_without_input_server_is_logged(caplog):
+    commands = FakeCommands({"f=$(mktemp)": ""})
+    sandbox = make_sandbox(commands)
+    asyncio.run(sandbox.write("hi", strategy="xtest"))
+    assert "xdotool type --delay 0 --file" in commands.ran[-1]
+    assert 'instead of "xtest"' in caplog.text
+
+
+def test_unknown_write_strategy():
+    commands = FakeCommands({})
+    sandbox = make_sandbox(commands)
+    with pytest.raises(ValueError):
+        asyncio.run(sandbox.write("hi", strategy="clipbaord"))
+    assert commands.ran == []
+
+
+def test_capture_windows_in_one_round_trip():
+    image = b"\x89PNG window"
+    output = f"10 20 300 200\n{base64.b64encode(image).decode()}\nerror\n\n"
+
+    async def main():
+        commands = FakeCommands({"d=$(mktemp -d)": output})
+        sandbox = make_sandbox(commands)
+        sandbox._state.update({"screen": [1024, 768]})
+        return await sandbox.capture_windows(["123", "456"], scale=0.5), commands.ran
+
+    captures, ran = asyncio.run(main())
+    assert len(ran) == 1 and ran[0].count("xdotool getwindowgeometry --shell") == 2
+    assert list(captures) == ["123"]
+    capture = captures["123"]
+    assert capture.image == image
+    assert capture.to_screen(50, 10) == (110, 40)
+
+
+def test_invalid_window_id():
+    sandbox = make_sandbox(FakeCommands({}))
+    with pytest.raises(ValueError):
+        asyncio.run(sandbox.get_window_geometry("1; rm -rf /"))
+
+
+def test_changed_since():
+    async def main():
+        commands = FakeCommands({}, input_server=True)
+        sandbox = make_sandbox(commands, input_server=True)
+        first = await sandbox.changed_since()
+        return first, await sandbox.changed_since(first.token), commands.stdin
+
+    first, second, stdin = asyncio.run(main())
+    assert first.rects == [(0, 0, 1024, 768)]
+    assert second == ("t:2", True, [(32, 0, 32, 32)])
+    assert stdin[1]["ops"] == [["damage", "t:1"]]
+
+
+def test_changes_without_input_server():
+    async def main():
+        commands = FakeCommands({"start=$(date +%s%N)": "ready 400000000 5\n"})
+        sandbox = make_sandbox(commands)
+        sandbox._state.update({"screen": [800, 600]})
+        return (
+            await sandbox.changed_since("t:1"),
+            await sandbox.wait_until_settled(),
+            commands.ran,
+        )
+
+    changes, settled, ran = asyncio.run(main())
+    assert changes == (None, True, [(0, 0, 800, 600)])
+    assert settled and len(ran) == 1 and "x11grab" in ran[0]
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+from e2b import TimeoutException
+from e2b_desktop import SandboxPool
+
+# Simulated boot time of a sandbox
+BOOT = 0.05
+
+
+class FakeSandbox:
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.killed = False
+
+    def kill(self) -> None:
+        self.killed = True
+
+
+class FakeFactory:
+    def __init__(self, boot: float = BOOT, fail: int = 0) -> None:
+        self.boot = boot
+        self.fail = fail
+        self.created = []
+        self._lock = threading.Lock()
+
+    def __call__(self) -> FakeSandbox:
+        time.sleep(self.boot)
+        with self._lock:
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("boot failed")
+            sandbox = FakeSandbox(len(self.created))
+            self.created.append(sandbox)
+            return sandbox
+
+
+def wait_ready(pool: SandboxPool, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while pool.metrics()["ready"] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_acquire_from_warm_pool_is_a_hit():
+    factory = FakeFactory()
+    with SandboxPool(size=2, factory=factory) as pool:
+        wait_ready(pool, 2)
+        with pool.sandbox() as sandbox:
+            assert not sandbox.killed
+        metrics = pool.metrics()
+
+    assert metrics["hits"] == 1 and metrics["hit_rate"] == 1.0
+    assert metrics["wait_max_ms"] < BOOT * 1000
+    # Used without reset, so it's recycled
+    assert sandbox.killed
+
+
+def test_cold_acquire_waits_and_pool_refills():
+    factory = FakeFactory()
+    with SandboxPool(size=1, factory=factory) as pool:
+        first = pool.acquire()
+        second = pool.acquire()
+        assert first is not second
+        wait_ready(pool, 1)
+        metrics = pool.metrics()
+
+    assert metrics["misses"] >= 1
+    assert metrics["created"] == 3
+
+
+def test_reset_reuses_sandbox_up_to_max_uses():
+    factory = FakeFactory()
+    resets = []
+    with SandboxPool(
+        size=1, factory=factory, reset=lambda s: resets.append(s) or True, max_uses=2
+    ) as pool:
+        wait_ready(pool, 1)
+        with pool.sandbox() as first:
+            pass
+        with pool.sandbox() as second:
+            pass
+
+    assert first is second and resets == [first]
+    assert first.killed
+    assert pool.stats["reused"] == 1
+
+
+def test_failed_block_is_not_reused():
+    factory = FakeFactory()
+    with SandboxPool(size=1, factory=factory, reset=lambda s: True, max_uses=5) as pool:
+        with pytest.raises(ValueError):
+            with pool.sandbox() as sandbox:
+                raise ValueError()
+        assert sandbox.killed
+
+
+def test_failed_boot_is_retried():
+    factory = FakeFactory(fail=1)
+    with SandboxPool(size=1, factory=factory, retry_backoff=0.01) as pool:
+        sandbox = pool.acquire(timeout=5)
+        assert pool.stats["failed"] == 1
+        pool.release(sandbox)
+
+
+def test_failed_boot_is_refilled_in_the_background():
+    factory = FakeFactory(fail=2)
+    with SandboxPool(size=1, factory=factory, retry_backoff=0.01) as pool:
+        wait_ready(pool, 1)
+        assert pool.stats["failed"] == 2
+
+
+def test_acquire_raises_after_max_failures():
+    factory = FakeFactory(boot=0, fail=100)
+    with SandboxPool(
+        size=1, factory=factory, max_failures=3, retry_backoff=0.01
+    ) as pool:
+        with pytest.raises(RuntimeError, match="after 3 attempts"):
+            pool.acquire()
+        # No tight loop of retries
+        assert pool.stats["failed"] == 3
+
+
+def test_acquire_timeout():
+    with SandboxPool(size=1, factory=FakeFactory(boot=1)) as pool:
+        with pytest.raises(TimeoutException):
+            pool.acquire(timeout=0.05)
+
+
+def test_close_kills_ready_sandboxes():
+    factory = FakeFactory()
+    pool = SandboxPool(size=2, factory=factory)
+    wait_ready(pool, 2)
+    pool.close()
+
+    assert all(sandbox.killed for sandbox in factory.created)
+    with pytest.raises(RuntimeError):
+        pool.acquire()
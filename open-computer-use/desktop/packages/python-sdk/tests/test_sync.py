@@ -0,0 +1,223 @@
+import base64
+import json
+import threading
+from typing import Callable, Dict, List, Optional
+
+import pytest
+from e2b import CommandExitException, CommandResult
+from e2b_desktop import Sandbox
+from e2b_desktop.main import _InputServer
+from e2b_desktop.state import DisplayState
+
+
+class FakeHandle:
+    def __init__(self, pid: int, ready: bool) -> None:
+        self.pid = pid
+        self.ready = ready
+        self.on_stdout: Optional[Callable[[str], None]] = None
+        self._done = threading.Event()
+
+    def wait(self, on_stdout=None, on_stderr=None) -> CommandResult:
+        self.on_stdout = on_stdout
+        if self.ready:
+            on_stdout('{"ready": true}\n')
+        self._done.wait()
+        return CommandResult(stdout="", stderr="", exit_code=0, error=None)
+
+    def kill(self) -> bool:
+        self._done.set()
+        return True
+
+
+class FakeCommands:
+    """
+    Stands in for `Sandbox.commands`, like the one in test_async.py: answers from a table of command prefixes.
+    """
+
+    def __init__(self, outputs: Dict[str, str], input_server: bool = False) -> None:
+        self.outputs = outputs
+        self.input_server = input_server
+        self.ran: List[str] = []
+        self.stdin: List[dict] = []
+        self.server: Optional[FakeHandle] = None
+
+    def run(self, cmd, background=False, timeout=60, on_stdout=None, **kwargs):
+        self.ran.append(cmd)
+        if background:
+            handle = FakeHandle(
+                len(self.ran), cmd.startswith("python3") and self.input_server
+            )
+            if handle.ready:
+                self.server = handle
+            return handle
+
+        for prefix, stdout in self.outputs.items():
+            if cmd.startswith(prefix):
+                return CommandResult(stdout=stdout, stderr="", exit_code=0, error=None)
+        raise CommandExitException(
+            stdout="", stderr=f"unknown command: {cmd}", exit_code=127, error=None
+        )
+
+    def send_stdin(self, pid: int, data: str) -> None:
+        message = json.loads(data)
+        self.stdin.append(message)
+        moves = [op for op in message["ops"] if op[0] == "move"] or [["move", 0, 0]]
+        reply = {
+            "id": message["id"],
+            "ok": True,
+            "timings": [1.0] * len(message["ops"]),
+            "pointer": moves[-1][1:],
+            "screen": [1024, 768],
+        }
+        if message["ops"][-1][0] == "damage":
+            changed = (
+                [[0, 0, 1024, 768]]
+                if message["ops"][-1][1] is None
+                else [[32, 0, 32, 32]]
+            )
+            reply["result"] = {
+                "token": f"t:{message['id']}",
+                "changed": True,
+                "rects": changed,
+            }
+        self.server.on_stdout(json.dumps(reply) + "\n")
+
+
+class FakeFiles:
+    def __init__(self) -> None:
+        self.written: Dict[str, str] = {}
+
+    def write(self, path: str, data: str) -> None:
+        self.written[path] = data
+
+
+def make_sandbox(commands: FakeCommands, input_server: bool = False) -> Sandbox:
+    # Skip the E2B connection and the desktop startup, the controls only go through commands and files
+    sandbox = Sandbox.__new__(Sandbox)
+    sandbox._commands = commands
+    sandbox._filesystem = FakeFiles()
+    sandbox._display = ":0"
+    sandbox._startup_timings = {}
+    sandbox._state = DisplayState((1024, 768))
+    sandbox._input_server = _InputServer(sandbox) if input_server else None
+    sandbox._input_server_started = False
+    sandbox._input_server_lock = threading.Lock()
+    return sandbox
+
+
+def test_batch_through_input_server():
+    commands = FakeCommands({}, input_server=True)
+    sandbox = make_sandbox(commands, input_server=True)
+
+    with sandbox.batch() as batch:
+        batch.move_mouse(10, 20).left_click()
+
+    assert commands.stdin == [{"id": 1, "ops": [["move", 10, 20], ["click", 1, 1]]}]
+    assert [(r.action, r.ok) for r in batch.results] == [
+        ("move_mouse", True),
+        ("left_click", True),
+    ]
+    assert sandbox.get_cursor_position() == (10, 20)
+
+
+def test_batch_through_xdotool_script():
+    error = base64.b64encode(b"no such window").decode()
+    commands = FakeCommands(
+        {
+            "t=$(date +%s%N)": f"0 ok 2000000\n1 error 1000000 {error}\n",
+            "xdotool getmouselocation": "x:512 y:384 screen:0 window:1",
+        }
+    )
+    sandbox = make_sandbox(commands)
+
+    with sandbox.batch(raise_on_error=False) as batch:
+        batch.move_mouse(10, 20).press("enter").write("not run")
+
+    assert len(commands.ran) == 1
+    assert [(r.action, r.ok, r.error) for r in batch.results] == [
+        ("move_mouse", True, None),
+        ("press", False, "no such window"),
+        ("write", False, "Not run"),
+    ]
+    # A failed action may have left the pointer anywhere, so it is read again
+    assert sandbox.get_cursor_position() == (512, 384)
+    assert commands.ran[-1] == "xdotool getmouselocation"
+
+
+def test_capture_screen_decodes_output():
+    image = b"\x89PNG fake image"
+    commands = FakeCommands(
+        {"set -o pipefail; ffmpeg": base64.b64encode(image).decode()}
+    )
+    sandbox = make_sandbox(commands)
+
+    assert sandbox.capture_screen(region=(0, 0, 100, 50), image_format="jpeg") == image
+    assert len(commands.ran) == 1 and "x11grab" in commands.ran[0]
+
+
+def test_write_strategies():
+    commands = FakeCommands({"f=$(mktemp)": ""}, input_server=True)
+    sandbox = make_sandbox(commands, input_server=True)
+
+    sandbox.write("a" * 500, strategy="auto")
+    sandbox.write("ž" * 500, strategy="auto")
+    sandbox.write("hi", strategy="file")
+
+    assert commands.stdin == [{"id": 1, "ops": [["type", "a" * 500, 0]]}]
+    clipboard, file = commands.ran[1:]
+    assert "xclip -selection clipboard" in clipboard
+    assert "xdotool type --delay 0 --file" in file and "xclip" not in file
+    with pytest.raises(ValueError):
+        sandbox.write("hi", strategy="clipbaord")
+
+
+def test_wait_for_desktop_is_one_round_trip():
+    commands = FakeCommands({"start=$(date +%s%N)": "ready 1500000000 7\n"})
+    sandbox = make_sandbox(commands)
+
+    assert sandbox.wait_for_desktop()
+    assert not make_sandbox(
+        FakeCommands({"start=$(date +%s%N)": "timeout 30000000000 40\n"})
+    ).wait_for_desktop()
+    assert len(commands.ran) == 1
+    assert "desktop_ready" in sandbox.startup_timings
+
+
+def test_changed_since():
+    commands = FakeCommands({}, input_server=True)
+    sandbox = make_sandbox(commands, input_server=True)
+
+    first = sandbox.changed_since()
+    second = sandbox.changed_since(first.token)
+
+    assert first.rects == [(0, 0, 1024, 768)]
+    assert second == ("t:2", True, [(32, 0, 32, 32)])
+    assert commands.stdin[1]["ops"] == [["damage", "t:1"]]
+
+
+def test_changes_without_input_server():
+    commands = FakeCommands({"start=$(date +%s%N)": "ready 400000000 5\n"})
+    sandbox = make_sandbox(commands)
+
+    assert sandbox.changed_since("t:1") == (None, True, [(0, 0, 1024, 768)])
+    assert sandbox.wait_until_settled()
+    assert len(commands.ran) == 1 and "x11grab" in commands.ran[0]
+
+
+def test_capture_windows_in_one_round_trip():
+    image = b"\x89PNG window"
+    output = f"10 20 300 200\n{base64.b64encode(image).decode()}\nerror\n\n"
+    commands = FakeCommands({"d=$(mktemp -d)": output})
+    sandbox = make_sandbox(commands)
+
+    captures = sandbox.capture_windows(["123", "456"], scale=0.5)
+
+    assert (
+        len(commands.ran) == 1
+        and commands.ran[0].count("xdotool getwindowgeometry --shell") == 2
+    )
+    assert list(captures) == ["123"]
+    assert captures["123"].image == image
+    assert captures["123"].to_screen(50, 10) == (110, 40)
+    with pytest.raises(ValueError):
+        sandbox.get_window_geometry("1; rm -rf /")
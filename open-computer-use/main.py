@@ -1,26 +1,39 @@
-from os_computer_use.streaming import Sandbox
-from os_computer_use.browser import Browser
-from os_computer_use.sandbox_agent import SandboxAgent
-from os_computer_use.logging import Logger
-import asyncio
 import argparse
+import asyncio
 import os
+
 from dotenv import load_dotenv
+from os_computer_use.browser import Browser
+from os_computer_use.grounding_cache import GroundingCache
+from os_computer_use.logging import Logger
+from os_computer_use.sandbox_agent import SandboxAgent
+from os_computer_use.streaming import Sandbox
 
 logger = Logger()
 load_dotenv()
 os.environ["E2B_API_KEY"] = os.getenv("E2B_API_KEY")
 
+
 async def start(user_input=None, output_dir=None):
     sandbox = None
 
     try:
         sandbox = Sandbox()
-        await asyncio.sleep(5)  # Wait for boot
+        # Wait for boot
+        if not sandbox.wait_for_desktop():
+            print("The desktop did not come up in time, continuing anyway.")
+        print(
+            "Sandbox startup: "
+            + ", ".join(
+                f"{phase} {ms:.0f} ms" for phase, ms in sandbox.startup_timings.items()
+            )
+        )
 
         # ✅ FFmpeg skipped due to timeouts
 
-        agent = SandboxAgent(sandbox, output_dir)
+        # Grounded positions are kept across runs
+        grounding_cache = GroundingCache("./output/grounding_cache.json")
+        agent = SandboxAgent(sandbox, output_dir, grounding_cache=grounding_cache)
 
         print("Starting the VNC server...")
         sandbox.stream.start()
@@ -62,6 +75,7 @@ def initialize_output_directory(directory_format):
     os.makedirs(directory_format(run_id), exist_ok=True)
     return directory_format(run_id)
 
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--prompt", type=str, help="User prompt for the agent")
@@ -71,6 +85,6 @@ def main():
     loop = asyncio.get_event_loop()
     loop.run_until_complete(start(user_input=args.prompt, output_dir=output_dir))
 
+
 if __name__ == "__main__":
     main()
-
@@ -2,15 +2,17 @@
 
 from os_computer_use import providers
 
-grounding_model = providers.OSAtlasProvider()
+# grounding_model = providers.OSAtlasProvider()
 # grounding_model = providers.ShowUIProvider()
+# Ground common targets locally with OCR and templates, and ask OS-Atlas for the rest
+grounding_model = providers.LocalGroundingProvider(fallback=providers.OSAtlasProvider())
 
 # vision_model = providers.FireworksProvider("llama-3.2")
 # vision_model = providers.OpenAIProvider("gpt-4o")
 # vision_model = providers.AnthropicProvider("claude-3.5-sonnet")
 # vision_model = providers.MoonshotProvider("moonshot-v1-vision")
 # vision_model = providers.MistralProvider("pixtral")
-#vision_model = providers.GroqProvider("llama-3.2")
+# vision_model = providers.GroqProvider("llama-3.2")
 vision_model = providers.OpenRouterProvider("qwen-2.5-vl")
 
 # action_model = providers.FireworksProvider("llama-3.3")
@@ -18,4 +20,4 @@ vision_model = providers.OpenRouterProvider("qwen-2.5-vl")
 # action_model = providers.AnthropicProvider("claude-3.5-sonnet")
 # vision_model = providers.MoonshotProvider("moonshot-v1-vision")
 # action_model = providers.MistralProvider("mistral")
-action_model = providers.GroqProvider("llama-3.3")
\ No newline at end of file
+action_model = providers.GroqProvider("llama-3.3")
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import io
+
+from PIL import Image
+
+
+# One capture of the screen, decoded and encoded at most once however often it is used
+class Frame:
+    def __init__(self, data, path, digest):
+        self.data = data  # PNG bytes
+        self.path = path  # Where the PNG was saved
+        self.digest = digest  # Hash of the PNG bytes
+        self.format = "png"
+        self._image = None
+        self._base64 = None
+        self._stats = None
+
+    def image(self):
+        # Decoded image, as a copy so callers can draw on it
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.data))
+            self._image.load()
+            self._stats["decodes"] += 1
+        else:
+            self._stats["decodes_saved"] += 1
+        return self._image.copy()
+
+    def base64(self):
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode("utf-8")
+            self._stats["encodes"] += 1
+        else:
+            self._stats["encodes_saved"] += 1
+        return self._base64
+
+
+# Reuses the latest capture while the screen has not changed
+class FrameCache:
+    def __init__(self, capture, save, changed_since=None):
+        self.capture = capture  # Returns PNG bytes of the screen
+        self.save = save  # Saves PNG bytes, returns the file path
+        self.changed_since = (
+            changed_since  # Sandbox.changed_since if the screen changes are tracked
+        )
+        self.frame = None
+        self.token = None
+        self.stale = True
+        self.stats = {
+            "captures": 0,  # Screenshots taken
+            "captures_saved": 0,  # Screenshots skipped, the latest one was still current
+            "duplicates": 0,  # Screenshots identical to the latest one, not saved again
+            "decodes": 0,
+            "decodes_saved": 0,
+            "encodes": 0,
+            "encodes_saved": 0,
+        }
+
+    # Call after every action that may have changed the screen
+    def invalidate(self):
+        self.stale = True
+
+    def get(self):
+        # Check before capturing, so changes during the capture count for the next frame
+        changed = self.changed()
+        if self.frame is not None and not changed:
+            self.stats["captures_saved"] += 1
+            return self.frame
+
+        data = self.capture()
+        self.stats["captures"] += 1
+        self.stale = False
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if self.frame is not None and digest == self.frame.digest:
+            self.stats["duplicates"] += 1
+            return self.frame
+
+        self.frame = Frame(data, self.save(data), digest)
+        self.frame._stats = self.stats
+        return self.frame
+
+    def changed(self):
+        # Ask the sandbox if it tracks changes, so changes nobody caused are seen too
+        if self.changed_since is None:
+            return self.stale
+        try:
+            changes = self.changed_since(self.token)
+        except Exception:
+            self.token = None
+            return True
+        self.token = changes.token
+        # An app may not have repainted yet right after an action, so no damage
+        # doesn't mean a frame invalidated by an action is still current
+        return changes.changed or self.stale
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+from collections import OrderedDict
+
+# Part of the screen around a grounded position that must look the same for the position to be reused
+REGION_SIZE = 96
+# Bits of the region hashes that may differ, e.g. for the mouse pointer or a hover highlight
+MAX_DISTANCE = 6
+
+
+def normalize_query(query):
+    # "the Submit button." and "Submit button" should find the same element
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    query = re.sub(r"^(the|a|an) ", "", query)
+    return query.strip(" .,;:!?\"'")
+
+
+# Difference hash of the region around a position, 64 bits that barely change for small edits
+def region_hash(image, position):
+    x, y = position
+    half = REGION_SIZE // 2
+    box = (
+        max(0, int(x) - half),
+        max(0, int(y) - half),
+        min(image.width, int(x) + half),
+        min(image.height, int(y) + half),
+    )
+    pixels = list(image.crop(box).convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+# Grounded positions by query, reused while the screen around them has not changed
+class GroundingCache:
+    def __init__(self, path=None, max_entries=256, save_every=16):
+        self.path = path  # JSON file keeping the cache across runs
+        self.max_entries = max_entries
+        self.save_every = (
+            save_every  # Changes kept in memory before the file is rewritten
+        )
+        self.unsaved = 0
+        self.entries = OrderedDict()  # Least recently used first
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0,  # Cached positions dropped as the screen around them changed
+            "evictions": 0,
+        }
+        if path and os.path.exists(path):
+            self.load()
+
+    def key(self, query, image):
+        # Positions only make sense on a screen of the same size
+        return f"{image.width}x{image.height} {normalize_query(query)}"
+
+    def get(self, query, image):
+        key = self.key(query, image)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        distance = bin(region_hash(image, entry["position"]) ^ entry["region"]).count(
+            "1"
+        )
+        if distance > MAX_DISTANCE:
+            del self.entries[key]
+            self.unsaved += 1
+            self.stats["invalidations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return tuple(entry["position"])
+
+    def put(self, query, image, position):
+        if position is None:
+            return
+        key = self.key(query, image)
+        self.entries[key] = {
+            "position": list(position),
+            "region": region_hash(image, position),
+        }
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        # Saving rewrites the whole file, so it is done in batches and by flush()
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.flush()
+
+    # Save the changes, call at the end of a run
+    def flush(self):
+        if self.path and self.unsaved:
+            self.save()
+        self.unsaved = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            # A broken cache file only costs grounding calls
+            self.entries = OrderedDict()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write and rename, so an interrupted run does not leave half a file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.entries)
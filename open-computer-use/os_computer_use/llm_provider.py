@@ -1,11 +1,12 @@
-from openai import OpenAI
-from anthropic import Anthropic
-
-from PIL import Image
+import base64
 import io
 import json
 import re
-import base64
+
+from anthropic import Anthropic
+from openai import OpenAI
+from os_computer_use.frame_cache import Frame
+from PIL import Image
 
 
 def Message(content, role="assistant"):
@@ -69,8 +70,9 @@ class LLMProvider:
 
     # Wrap a content block in a text or an image object
     def wrap_block(self, block):
-        if isinstance(block, bytes):
+        if isinstance(block, (bytes, Frame)):
             # Pass raw bytes so that imghdr can detect the image type properly.
+            # A Frame knows its type and is base64-encoded only once.
             return self.create_image_block(block)
         else:
             return Text(block)
@@ -120,6 +122,14 @@ class OpenAIBaseProvider(LLMProvider):
         }
 
     def create_image_block(self, image_data: bytes):
+        if isinstance(image_data, Frame):
+            return {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/{image_data.format};base64,{image_data.base64()}"
+                },
+            }
+
         # Use Pillow to detect the image type
         image_type = "png"  # Default to PNG if detection fails
         try:
@@ -189,6 +199,8 @@ class AnthropicBaseProvider(LLMProvider):
         }
 
     def create_image_block(self, base64_image):
+        if isinstance(base64_image, Frame):
+            base64_image = base64_image.base64()
         return {
             "type": "image",
             "source": {
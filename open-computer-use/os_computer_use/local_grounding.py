@@ -0,0 +1,214 @@
+import os
+import re
+import time
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from os_computer_use.logging import logger
+from PIL import Image
+
+# The optional engines, the provider uses whichever are installed
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
+# Words describing the kind of element rather than what it says
+ELEMENT_WORDS = {
+    "the",
+    "a",
+    "an",
+    "on",
+    "in",
+    "of",
+    "button",
+    "icon",
+    "link",
+    "field",
+    "box",
+    "input",
+    "label",
+    "text",
+    "menu",
+    "item",
+    "tab",
+    "option",
+    "checkbox",
+    "entry",
+    "area",
+}
+# OCR words with a lower confidence (0-100) are ignored
+MIN_WORD_CONFIDENCE = 40
+# Longest run of words compared with the query
+MAX_SPAN_WORDS = 6
+# Candidates scoring within this margin of the best one make the result ambiguous
+AMBIGUITY_MARGIN = 0.05
+
+Candidate = namedtuple("Candidate", ["position", "confidence", "source"])
+
+
+def similarity(a, b):
+    return SequenceMatcher(None, a, b).ratio()
+
+
+# The text the element should show: quoted text if any, otherwise the query without element words
+def target_text(query):
+    # Single quotes only count at word boundaries, so apostrophes as in "Don't save" stay
+    quoted = re.findall(r"[\"“](.+?)[\"”]|(?<!\w)['‘](.+?)['’](?!\w)", query)
+    if quoted:
+        return " ".join(double or single for double, single in quoted).lower()
+    words = re.findall(r"[\w@.:/'’-]+", query.lower())
+    return " ".join(word for word in words if word not in ELEMENT_WORDS)
+
+
+# Lines of OCR words as lists of (text, (left, top, width, height))
+def ocr_lines(image):
+    data = pytesseract.image_to_data(
+        image.convert("L"), output_type=pytesseract.Output.DICT
+    )
+    lines = {}
+    for i, text in enumerate(data["text"]):
+        if not text.strip() or float(data["conf"][i]) < MIN_WORD_CONFIDENCE:
+            continue
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        box = (data["left"][i], data["top"][i], data["width"][i], data["height"][i])
+        lines.setdefault(line, []).append((text, box))
+    return list(lines.values())
+
+
+# Score every run of words against the text, centered on the words
+def match_text(text, lines):
+    candidates = []
+    for words in lines:
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + MAX_SPAN_WORDS, len(words)) + 1):
+                span = words[start:end]
+                score = similarity(text, " ".join(word for word, _ in span).lower())
+                left = min(box[0] for _, box in span)
+                top = min(box[1] for _, box in span)
+                right = max(box[0] + box[2] for _, box in span)
+                bottom = max(box[1] + box[3] for _, box in span)
+                candidates.append(
+                    Candidate(((left + right) / 2, (top + bottom) / 2), score, "ocr")
+                )
+    return candidates
+
+
+# Best candidate, with its confidence lowered if another one elsewhere scores about the same
+def best_candidate(candidates, radius=20):
+    if not candidates:
+        return None
+    candidates = sorted(candidates, key=lambda c: c.confidence, reverse=True)
+    best = candidates[0]
+    for other in candidates[1:]:
+        if other.confidence < best.confidence - AMBIGUITY_MARGIN:
+            break
+        dx, dy = (
+            other.position[0] - best.position[0],
+            other.position[1] - best.position[1],
+        )
+        if dx * dx + dy * dy > radius * radius:
+            return best._replace(confidence=best.confidence / 2)
+    return best
+
+
+class LocalGroundingProvider:
+    """
+    Grounds common targets on the CPU: template images named after the element,
+    and text found by OCR. It hands off to the fallback provider, like OS-Atlas,
+    when it is not confident.
+    """
+
+    def __init__(
+        self,
+        fallback=None,
+        template_dir=None,
+        min_confidence=0.85,
+        template_threshold=0.8,
+    ):
+        self.fallback = fallback  # Remote grounding provider
+        self.min_confidence = min_confidence
+        self.template_threshold = template_threshold  # Match score templates need
+        self.templates = {}  # Grayscale templates by name, e.g. "firefox address bar"
+        if template_dir and cv2 is not None:
+            for filename in sorted(os.listdir(template_dir)):
+                name, extension = os.path.splitext(filename)
+                if extension.lower() in (".png", ".jpg", ".jpeg"):
+                    template = cv2.imread(
+                        os.path.join(template_dir, filename), cv2.IMREAD_GRAYSCALE
+                    )
+                    if template is not None:
+                        self.templates[target_text(name.replace("_", " "))] = template
+        if pytesseract is None and not self.templates:
+            logger.log(
+                "local grounding has no OCR or templates, all queries go to the fallback",
+                "gray",
+            )
+        self.stats = {"local": 0, "fallback": 0}
+
+    # Templates whose name is close to the query, found on the screen
+    def find_templates(self, query, image):
+        text = target_text(query)
+        names = [name for name in self.templates if similarity(text, name) >= 0.8]
+        if not names:
+            return []
+        screen = np.array(image.convert("L"))
+        candidates = []
+        for name in names:
+            template = self.templates[name]
+            height, width = template.shape
+            if height > screen.shape[0] or width > screen.shape[1]:
+                continue
+            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            if score >= self.template_threshold:
+                position = (x + width / 2, y + height / 2)
+                candidates.append(
+                    Candidate(position, score * similarity(text, name), "template")
+                )
+        return candidates
+
+    def find_text(self, query, image):
+        text = target_text(query)
+        if pytesseract is None or not text:
+            return []
+        return match_text(text, ocr_lines(image))
+
+    def ground(self, query, image):
+        # Templates first, they are much faster than OCR
+        best = best_candidate(self.find_templates(query, image))
+        if best is None or best.confidence < self.min_confidence:
+            found = [best, best_candidate(self.find_text(query, image))]
+            best = max(
+                (c for c in found if c), key=lambda c: c.confidence, default=None
+            )
+        return best
+
+    def call(self, prompt, image_data):
+        start = time.perf_counter()
+        try:
+            best = self.ground(prompt, Image.open(image_data))
+            outcome = f"{best.confidence:.2f}" if best else "no match"
+        except Exception as e:
+            # A broken local engine, e.g. pytesseract without the tesseract binary, must not break clicks
+            best, outcome = None, f"error ({e})"
+        elapsed = (time.perf_counter() - start) * 1000
+        if best and (best.confidence >= self.min_confidence or self.fallback is None):
+            self.stats["local"] += 1
+            logger.log(
+                f"local grounding: {best.source} {outcome} in {elapsed:.0f} ms", "gray"
+            )
+            return best.position
+        if self.fallback is None:
+            raise RuntimeError(f"Could not find {prompt!r} on the screen: {outcome}")
+        self.stats["fallback"] += 1
+        logger.log(
+            f"local grounding: {outcome} in {elapsed:.0f} ms, using the fallback",
+            "gray",
+        )
+        return self.fallback.call(prompt, image_data)
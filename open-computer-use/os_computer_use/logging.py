@@ -1,4 +1,5 @@
 import os
+import threading
 
 
 # A logger to write to the console and a log file in color
@@ -34,6 +35,9 @@ class Logger:
         self.logs = []  # Output logs
         self.log_file = None  # Output log file
         self.log_file_template = None  # Store the log file template
+        self.writer = None  # Executor to write the log file in the background
+        self.write_pending = False
+        self.lock = threading.Lock()
 
         # Load the HTML template when the logger is initialized
         try:
@@ -76,11 +80,29 @@ class Logger:
         if print:
             self.print_colored(text, color)
         # Write to the log file
-        self.logs.append({"text": text, "color": color})
+        with self.lock:
+            self.logs.append({"text": text, "color": color})
         if self.log_file:
-            self.write_log_file(self.logs, self.log_file)
+            if self.writer:
+                self.schedule_write()
+            else:
+                self.write_log_file(self.logs, self.log_file)
         return text
 
+    # Write the log file soon, logs added meanwhile go into the same write
+    def schedule_write(self):
+        with self.lock:
+            if self.write_pending:
+                return
+            self.write_pending = True
+        self.writer.submit(self.write_pending_logs)
+
+    def write_pending_logs(self):
+        with self.lock:
+            self.write_pending = False
+            logs = list(self.logs)
+        self.write_log_file(logs, self.log_file)
+
 
 # Create a global logger
 logger = Logger()
@@ -0,0 +1,135 @@
+import math
+
+from os_computer_use.llm_provider import Message
+
+# Rough token counts, good enough to keep prompts within a budget
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 1000
+
+
+def count_tokens(messages):
+    tokens = 0
+    for message in messages:
+        content = message["content"]
+        for block in content if isinstance(content, list) else [content]:
+            if isinstance(block, str):
+                tokens += math.ceil(len(block) / CHARS_PER_TOKEN)
+            else:
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+# Keep the start and the end of a long text, where errors and results usually are
+def truncate(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n... [{len(text) - 2 * half} characters truncated] ...\n{text[-half:]}"
+
+
+# Default summarizer: one short line per message, no model call needed
+def summarize_lines(summary, messages, line_chars=150):
+    lines = [summary] if summary else []
+    for message in messages:
+        content = message["content"]
+        text = (
+            content
+            if isinstance(content, str)
+            else " ".join(b for b in content if isinstance(b, str))
+        )
+        first_line = text.strip().split("\n")[0]
+        lines.append(
+            first_line
+            if len(first_line) <= line_chars
+            else first_line[: line_chars - 3] + "..."
+        )
+    return "\n".join(lines)
+
+
+# Summarizer asking a model to fold old messages into the summary
+def model_summarizer(model):
+    def summarize(summary, messages):
+        return model.call(
+            [
+                Message(
+                    "Summarize the progress of a computer use agent in a few short lines: "
+                    "what has been done, what was learned, and what state the computer is in.",
+                    role="system",
+                ),
+                Message(f"Summary so far:\n{summary or '(none)'}", role="user"),
+                *messages,
+                Message("Write the updated summary.", role="user"),
+            ]
+        )
+
+    return summarize
+
+
+# Bounded agent memory: the objective, a summary of older steps and a window of recent messages
+class ConversationMemory:
+    def __init__(
+        self,
+        token_budget=6000,
+        window=20,
+        max_message_chars=2000,
+        max_summary_chars=3000,
+        summarize=summarize_lines,
+    ):
+        self.token_budget = token_budget  # Tokens the remembered messages may take
+        self.window = window  # Most recent messages kept word for word
+        self.max_message_chars = max_message_chars  # Longer messages are truncated
+        self.max_summary_chars = max_summary_chars
+        self.summarize = summarize
+        self.objective = None
+        self.summary = ""
+        self.recent = []
+        self.summarized = 0  # Messages folded into the summary so far
+
+    def set_objective(self, text):
+        self.objective = Message(f"OBJECTIVE: {text}")
+
+    def append(self, message):
+        if isinstance(message["content"], str):
+            message = {
+                **message,
+                "content": truncate(message["content"], self.max_message_chars),
+            }
+        self.recent.append(message)
+        self.compact()
+
+    def messages(self):
+        messages = [self.objective] if self.objective else []
+        if self.summary:
+            messages.append(Message(f"SUMMARY OF EARLIER STEPS:\n{self.summary}"))
+        return messages + self.recent
+
+    def tokens(self):
+        return count_tokens(self.messages())
+
+    # Fold the oldest messages into the summary until the window and the budget fit
+    def compact(self):
+        # Leave room for the objective and a summary of the maximum size
+        fixed = count_tokens([self.objective] if self.objective else [])
+        budget = (
+            self.token_budget
+            - fixed
+            - math.ceil(self.max_summary_chars / CHARS_PER_TOKEN)
+        )
+        if len(self.recent) <= self.window and count_tokens(self.recent) <= budget:
+            return
+        # Fold several messages at once, so the summary is not redone every step
+        window, budget = self.window * 3 // 4, budget * 3 // 4
+        old = []
+        while len(self.recent) > 1 and (
+            len(self.recent) > window or count_tokens(self.recent) > budget
+        ):
+            old.append(self.recent.pop(0))
+        self.summary = self.summarize(self.summary, old)
+        if len(self.summary) > self.max_summary_chars:
+            self.summary = (
+                "...\n" + self.summary[-self.max_summary_chars :].split("\n", 1)[-1]
+            )
+        self.summarized += len(old)
+
+    def __len__(self):
+        return len(self.messages())
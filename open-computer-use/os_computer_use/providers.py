@@ -1,10 +1,12 @@
 import os
+
 from dotenv import load_dotenv
 from os_computer_use.llm_provider import (
-    OpenAIBaseProvider,
     AnthropicBaseProvider,
     MistralBaseProvider,
+    OpenAIBaseProvider,
 )
+from os_computer_use.local_grounding import LocalGroundingProvider
 from os_computer_use.osatlas_provider import OSAtlasProvider
 from os_computer_use.showui_provider import ShowUIProvider
 
@@ -25,7 +27,7 @@ class OpenRouterProvider(OpenAIBaseProvider):
     api_key = os.getenv("OPENROUTER_API_KEY")
     aliases = {
         "llama-3.2": "meta-llama/llama-3.2-90b-vision-instruct",
-        "qwen-2.5-vl":"qwen/qwen2.5-vl-72b-instruct:free"
+        "qwen-2.5-vl": "qwen/qwen2.5-vl-72b-instruct:free",
     }
 
 
@@ -1,16 +1,26 @@
-from os_computer_use.config import vision_model, action_model, grounding_model
-from os_computer_use.llm_provider import Message
-from os_computer_use.logging import logger
-from os_computer_use.grounding import draw_big_dot
-
-import shlex
+import json
 import os
+import shlex
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from os_computer_use.frame_cache import FrameCache
+from os_computer_use.grounding import draw_big_dot
+from os_computer_use.grounding_cache import GroundingCache
+from os_computer_use.llm_provider import Message
+from os_computer_use.logging import logger
+from os_computer_use.memory import ConversationMemory, count_tokens
 from PIL import Image
-import json
 
 TYPING_DELAY_MS = 12
 TYPING_GROUP_SIZE = 50
+# Longer texts are written in bulk instead of typed key by key
+BULK_TEXT_LENGTH = 100
+# Tools that don't change the screen right away, the next screenshot can be taken while they run
+PASSIVE_TOOLS = {"run_command", "run_background_command"}
 
 tools = {
     "stop": {
@@ -22,13 +32,57 @@ tools = {
 
 class SandboxAgent:
 
-    def __init__(self, sandbox, output_dir=".", save_logs=True):
+    def __init__(
+        self,
+        sandbox,
+        output_dir=".",
+        save_logs=True,
+        memory=None,
+        pipelined=False,
+        vision_model=None,
+        action_model=None,
+        grounding_model=None,
+        grounding_cache=None,
+    ):
         super().__init__()
-        self.messages = []  # Agent memory
+        if None in (vision_model, action_model, grounding_model):
+            # Only load the configured models if some are not passed in
+            from os_computer_use import config
+
+            vision_model = vision_model or config.vision_model
+            action_model = action_model or config.action_model
+            grounding_model = grounding_model or config.grounding_model
+        self.vision_model = vision_model
+        self.action_model = action_model
+        self.grounding_model = grounding_model
+        self.memory = (
+            memory if memory is not None else ConversationMemory()
+        )  # Agent memory
+        self.grounding_cache = (
+            grounding_cache if grounding_cache is not None else GroundingCache()
+        )  # Grounded positions by query
         self.sandbox = sandbox  # E2B sandbox
         self.latest_screenshot = None  # Most recent PNG of the scren
         self.image_counter = 0  # Current screenshot number
         self.tmp_dir = tempfile.mkdtemp()  # Folder to store screenshots
+        # Latest screenshot, reused while the screen has not changed
+        self.frames = FrameCache(
+            self.sandbox.screenshot,
+            lambda data: self.save_image(data, "screenshot"),
+            getattr(self.sandbox, "changed_since", None),
+        )
+        # Pipelined mode starts the next screenshot and vision call while slow tools run,
+        # and writes images and logs in the background
+        self.pipelined = pipelined
+        self.executor = (
+            ThreadPoolExecutor(max_workers=3, thread_name_prefix="agent")
+            if pipelined
+            else None
+        )
+        self.pending_files = {}  # Images being written in the background, by path
+        self.timings = []  # Milliseconds each stage took, for every step
+        # Guards the image counter, the pending files and the frame cache, used by the prefetch too
+        self.lock = threading.RLock()
 
         # Set the log file location
         if save_logs:
@@ -48,6 +102,15 @@ class SandboxAgent:
                 return result
             except Exception as e:
                 return f"Error executing function: {str(e)}"
+            finally:
+                # Any action may have changed the screen. Passive tools only change it later,
+                # like a started app opening a window, which damage tracking sees when available.
+                if (
+                    name.lower() not in PASSIVE_TOOLS
+                    or self.frames.changed_since is None
+                ):
+                    with self.lock:
+                        self.frames.invalidate()
         else:
             return "Function not implemented."
 
@@ -59,23 +122,65 @@ class SandboxAgent:
         return decorator
 
     def save_image(self, image, prefix="image"):
-        self.image_counter += 1
-        filename = f"{prefix}_{self.image_counter}.png"
-        filepath = os.path.join(self.tmp_dir, filename)
+        with self.lock:
+            self.image_counter += 1
+            filename = f"{prefix}_{self.image_counter}.png"
+            filepath = os.path.join(self.tmp_dir, filename)
+            if self.executor:
+                self.pending_files[filepath] = self.executor.submit(
+                    self.write_image, image, filepath
+                )
+                return filepath
+        self.write_image(image, filepath)
+        return filepath
+
+    def write_image(self, image, filepath):
         if isinstance(image, Image.Image):
             image.save(filepath)
         else:
             with open(filepath, "wb") as f:
                 f.write(image)
+
+    # Wait until an image saved in the background is written
+    def wait_for_file(self, filepath):
+        with self.lock:
+            future = self.pending_files.pop(filepath, None)
+        if future:
+            future.result()
         return filepath
 
+    # Write the log file in the background during pipelined runs only
+    @contextmanager
+    def background_logging(self):
+        if not self.pipelined:
+            yield
+            return
+        logger.writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="agent-log"
+        )
+        try:
+            yield
+        finally:
+            writer, logger.writer = logger.writer, None
+            writer.shutdown(wait=True)
+
+    @contextmanager
+    def timed(self, stage, timings):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[stage] = (
+                timings.get(stage, 0) + (time.perf_counter() - start) * 1000
+            )
+
     def screenshot(self):
-        file = self.sandbox.screenshot()
-        filename = self.save_image(file, "screenshot")
-        logger.log(f"screenshot {filename}", "gray")
-        self.latest_screenshot = filename
-        with open(filename, "rb") as image_file:
-            return image_file.read()
+        with self.lock:
+            frame = self.frames.get()
+            if frame.path != self.latest_screenshot:
+                logger.log(f"screenshot {frame.path}", "gray")
+            self.latest_screenshot = frame.path
+        return frame
 
     @tool(
         description="Run a shell command and return the result.",
@@ -112,20 +217,38 @@ class SandboxAgent:
         params={"text": "Text to type"},
     )
     def type_text(self, text):
-        self.sandbox.write(text, chunk_size=TYPING_GROUP_SIZE, delay_in_ms=TYPING_DELAY_MS)
+        if len(text) >= BULK_TEXT_LENGTH:
+            self.sandbox.write(text, strategy="auto")
+        else:
+            self.sandbox.write(
+                text, chunk_size=TYPING_GROUP_SIZE, delay_in_ms=TYPING_DELAY_MS
+            )
         return "The text has been typed."
 
     def click_element(self, query, click_command, action_name="click"):
-        """Base method for all click operations"""
-        self.screenshot()
-        position = grounding_model.call(query, self.latest_screenshot)
-        dot_image = draw_big_dot(Image.open(self.latest_screenshot), position)
+        """Base method for all click operations, click_command names a Sandbox click method"""
+        frame = self.screenshot()
+        image = frame.image()
+        position = self.grounding_cache.get(query, image)
+        if position is None:
+            position = self.grounding_model.call(query, self.wait_for_file(frame.path))
+            self.grounding_cache.put(query, image, position)
+        else:
+            logger.log(f"grounding cache hit for {query!r}", "gray")
+        dot_image = draw_big_dot(image, position)
         filepath = self.save_image(dot_image, "location")
         logger.log(f"{action_name} {filepath})", "gray")
 
         x, y = position
-        self.sandbox.move_mouse(x, y)
-        click_command()
+        # Move and click in a single round trip
+        with self.sandbox.batch() as batch:
+            batch.move_mouse(x, y)
+            getattr(batch, click_command)()
+        logger.log(
+            f"{action_name} took {batch.round_trip_ms:.0f} ms "
+            f"({', '.join(f'{r.action} {r.duration_ms:.0f} ms' for r in batch.results)})",
+            "gray",
+        )
         return f"The mouse has {action_name}ed."
 
     @tool(
@@ -133,29 +256,29 @@ class SandboxAgent:
         params={"query": "Item or UI element on the screen to click"},
     )
     def click(self, query):
-        return self.click_element(query, self.sandbox.left_click)
+        return self.click_element(query, "left_click")
 
     @tool(
         description="Double click on a specified UI element.",
         params={"query": "Item or UI element on the screen to double click"},
     )
     def double_click(self, query):
-        return self.click_element(query, self.sandbox.double_click, "double click")
+        return self.click_element(query, "double_click", "double click")
 
     @tool(
         description="Right click on a specified UI element.",
         params={"query": "Item or UI element on the screen to right click"},
     )
     def right_click(self, query):
-        return self.click_element(query, self.sandbox.right_click, "right click")
+        return self.click_element(query, "right_click", "right click")
 
-    def append_screenshot(self):
-        return vision_model.call(
+    def append_screenshot(self, messages=None, frame=None):
+        return self.vision_model.call(
             [
-                *self.messages,
+                *(self.memory.messages() if messages is None else messages),
                 Message(
                     [
-                        self.screenshot(),
+                        frame or self.screenshot(),
                         "This image shows the current display of the computer. Please respond in the following format:\n"
                         "The objective is: [put the objective here]\n"
                         "On the screen, I see: [an extensive list of everything that might be relevant to the objective including windows, icons, menus, apps, and UI elements]\n"
@@ -168,48 +291,114 @@ class SandboxAgent:
             ]
         )
 
+    # Screenshot and vision call, returns what the vision model sees
+    def perceive(self, messages, timings):
+        with self.timed("screenshot", timings):
+            frame = self.screenshot()
+        with self.timed("vision", timings):
+            return self.append_screenshot(messages, frame)
+
+    # In pipelined mode, start perceiving the next screen in the background
+    def prefetch(self, should_continue):
+        if not self.pipelined or not should_continue:
+            return None
+        timings = {}
+        return timings, self.executor.submit(
+            self.perceive, self.memory.messages(), timings
+        )
+
     def run(self, instruction):
+        with self.background_logging():
+            self.memory.set_objective(instruction)
+            logger.log(f"USER: {instruction}", print=False)
 
-        self.messages.append(Message(f"OBJECTIVE: {instruction}"))
-        logger.log(f"USER: {instruction}", print=False)
+            step = 0
+            prefetched = None
+            should_continue = True
+            while should_continue:
+                step += 1
+                start = time.perf_counter()
+                # Stop the sandbox from timing out
+                self.sandbox.set_timeout(60)
 
-        should_continue = True
-        while should_continue:
-            # Stop the sandbox from timing out
-            self.sandbox.set_timeout(60)
+                if prefetched:
+                    timings, perception = prefetched
+                    with self.timed("perception_wait", timings):
+                        thought = perception.result()
+                else:
+                    timings = {}
+                    thought = self.perceive(self.memory.messages(), timings)
+                prefetched = None
 
-            content, tool_calls = action_model.call(
-                [
+                messages = [
                     Message(
                         "You are an AI assistant with computer use abilities.",
                         role="system",
                     ),
-                    *self.messages,
-                    Message(
-                        logger.log(f"THOUGHT: {self.append_screenshot()}", "green")
-                    ),
+                    *self.memory.messages(),
+                    Message(logger.log(f"THOUGHT: {thought}", "green")),
                     Message(
                         "I will now use tool calls to take these actions, or use the stop command if the objective is complete.",
                     ),
-                ],
-                tools,
-            )
+                ]
+                logger.log(
+                    f"step {step}: ~{count_tokens(messages)} prompt tokens, "
+                    f"{self.memory.tokens()} in memory, {self.memory.summarized} messages summarized",
+                    "gray",
+                )
+                with self.timed("action", timings):
+                    content, tool_calls = self.action_model.call(messages, tools)
+
+                if content:
+                    self.memory.append(
+                        Message(logger.log(f"THOUGHT: {content}", "blue"))
+                    )
+
+                names = [tool_call.get("name") for tool_call in tool_calls]
+                should_continue = bool(names) and "stop" not in names
+                # Once the tools that change the screen ran, the next screen can be perceived
+                # while the remaining tools run. It misses their results, which is the speculation.
+                last_screen_tool = max(
+                    (i for i, name in enumerate(names) if name not in PASSIVE_TOOLS),
+                    default=-1,
+                )
+                with self.timed("tools", timings):
+                    for i, tool_call in enumerate(tool_calls):
+                        if i == last_screen_tool + 1:
+                            prefetched = self.prefetch(should_continue)
+                        name, parameters = tool_call.get("name"), tool_call.get(
+                            "parameters"
+                        )
+                        if name == "stop":
+                            break
+                        # Print the tool-call in an easily readable format
+                        logger.log(f"ACTION: {name} {str(parameters)}", "red")
+                        # Write the tool-call to the message history using the same format used by the model
+                        self.memory.append(Message(json.dumps(tool_call)))
+                        result = self.call_function(name, parameters)
 
-            if content:
-                self.messages.append(Message(logger.log(f"THOUGHT: {content}", "blue")))
-
-            should_continue = False
-            for tool_call in tool_calls:
-                name, parameters = tool_call.get("name"), tool_call.get("parameters")
-                should_continue = name != "stop"
-                if not should_continue:
-                    break
-                # Print the tool-call in an easily readable format
-                logger.log(f"ACTION: {name} {str(parameters)}", "red")
-                # Write the tool-call to the message history using the same format used by the model
-                self.messages.append(Message(json.dumps(tool_call)))
-                result = self.call_function(name, parameters)
-
-                self.messages.append(
-                    Message(logger.log(f"OBSERVATION: {result}", "yellow"))
+                        self.memory.append(
+                            Message(logger.log(f"OBSERVATION: {result}", "yellow"))
+                        )
+
+                timings["step"] = (time.perf_counter() - start) * 1000
+                self.timings.append(timings)
+                logger.log(
+                    f"step {step} timings: "
+                    + ", ".join(
+                        f"{stage} {ms:.0f} ms" for stage, ms in timings.items()
+                    ),
+                    "gray",
                 )
+
+            for filepath in list(self.pending_files):
+                self.wait_for_file(filepath)
+            stats = ", ".join(
+                f"{value} {name}" for name, value in self.frames.stats.items()
+            )
+            logger.log(f"frame cache: {stats}", "gray")
+            stats = ", ".join(
+                f"{value} {name}" for name, value in self.grounding_cache.stats.items()
+            )
+            logger.log(f"grounding cache: {stats}", "gray")
+            self.grounding_cache.flush()
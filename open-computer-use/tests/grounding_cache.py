@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from os_computer_use.grounding_cache import GroundingCache
+from os_computer_use.sandbox_agent import SandboxAgent
+from sandbox_agent import MockSandbox
+
+
+class FakeVisionModel:
+    def call(self, messages):
+        return "On the screen, I see a desktop."
+
+
+# Plays back a script of tool calls, one list per step
+class FakeActionModel:
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    def call(self, messages, functions=None):
+        return None, self.steps.pop(0)
+
+
+class CountingGroundingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, query, image_path):
+        self.calls += 1
+        return 100, 200
+
+
+def run(cache):
+    grounding_model = CountingGroundingModel()
+    agent = SandboxAgent(
+        MockSandbox(),
+        save_logs=False,
+        vision_model=FakeVisionModel(),
+        action_model=FakeActionModel(
+            [
+                [{"name": "click", "parameters": {"query": "Submit button"}}],
+                [{"name": "click", "parameters": {"query": "the submit button"}}],
+                [{"name": "stop", "parameters": {}}],
+            ]
+        ),
+        grounding_model=grounding_model,
+        grounding_cache=cache,
+    )
+    # An empty cache must not be replaced by a default one
+    assert agent.grounding_cache is cache
+    agent.run("Submit the form")
+    return grounding_model.calls
+
+
+if __name__ == "__main__":
+    path = os.path.join(tempfile.mkdtemp(), "grounding_cache.json")
+
+    # The second click on the unchanged screen is a cache hit
+    assert run(GroundingCache(path)) == 1
+    assert os.path.exists(path)
+
+    # The next run loads the cache from disk and doesn't ground at all
+    cache = GroundingCache(path)
+    assert len(cache) == 1
+    assert run(cache) == 0
+    print("\nThe grounding cache was kept, saved and reused")
@@ -0,0 +1,98 @@
+import os
+import time
+
+from os_computer_use.logging import logger
+from os_computer_use.sandbox_agent import SandboxAgent
+from sandbox_agent import MockSandbox
+
+# Simulated latencies in seconds
+SCREENSHOT_LATENCY = 0.1
+COMMAND_LATENCY = 0.3
+VISION_LATENCY = 0.4
+ACTION_LATENCY = 0.2
+GROUNDING_LATENCY = 0.1
+
+
+# A mock sandbox that takes time to respond, like a remote one
+class SlowMockSandbox(MockSandbox):
+    def screenshot(self):
+        time.sleep(SCREENSHOT_LATENCY)
+        return super().screenshot()
+
+    def run(self, command, timeout=None, background=False):
+        time.sleep(COMMAND_LATENCY)
+        return super().run(command, timeout, background)
+
+
+class FakeVisionModel:
+    def call(self, messages):
+        time.sleep(VISION_LATENCY)
+        return "On the screen, I see a desktop."
+
+
+# Plays back a script of tool calls, one list per step
+class FakeActionModel:
+    def __init__(self, steps):
+        self.steps = list(steps)
+
+    def call(self, messages, functions=None):
+        time.sleep(ACTION_LATENCY)
+        return None, self.steps.pop(0)
+
+
+class FakeGroundingModel:
+    def call(self, query, image_path):
+        time.sleep(GROUNDING_LATENCY)
+        # Screenshots saved in the background must be written before grounding
+        assert os.path.exists(image_path), image_path
+        return 100, 200
+
+
+def steps():
+    return [
+        [
+            {"name": "click", "parameters": {"query": "terminal icon"}},
+            {"name": "run_background_command", "parameters": {"command": "firefox"}},
+            {"name": "run_command", "parameters": {"command": "sleep 1"}},
+        ],
+        [
+            {"name": "double_click", "parameters": {"query": "file"}},
+            {"name": "run_command", "parameters": {"command": "ls"}},
+        ],
+        [{"name": "stop", "parameters": {}}],
+    ]
+
+
+def run(pipelined):
+    sandbox = SlowMockSandbox()
+    agent = SandboxAgent(
+        sandbox,
+        save_logs=False,
+        pipelined=pipelined,
+        vision_model=FakeVisionModel(),
+        action_model=FakeActionModel(steps()),
+        grounding_model=FakeGroundingModel(),
+    )
+    start = time.perf_counter()
+    agent.run("Open the Firefox browser")
+    return time.perf_counter() - start, sandbox.actions, agent
+
+
+if __name__ == "__main__":
+    serial_time, serial_actions, _ = run(pipelined=False)
+    pipelined_time, pipelined_actions, agent = run(pipelined=True)
+
+    assert serial_actions == pipelined_actions, (serial_actions, pipelined_actions)
+    assert len(agent.timings) == 3
+    # The background log writer only lives as long as the run
+    assert logger.writer is None
+    assert all("perception_wait" in timings for timings in agent.timings[1:])
+
+    print("\nStage timings of the pipelined run (ms):")
+    for step, timings in enumerate(agent.timings, 1):
+        print(
+            f"  step {step}: "
+            + ", ".join(f"{stage} {ms:.0f}" for stage, ms in timings.items())
+        )
+    print(f"\nSerial: {serial_time:.2f} s, pipelined: {pipelined_time:.2f} s")
+    assert pipelined_time < serial_time
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from os_computer_use.sandbox_agent import SandboxAgent
 
 
@@ -6,6 +8,7 @@ class MockSandbox:
     def __init__(self):
         self.timeout = 60
         self.commands = self
+        self.actions = []  # Input actions run through batch()
 
     def screenshot(self):
         with open("./tests/test_screenshot.png", "rb") as f:
@@ -22,6 +25,28 @@ class MockSandbox:
     def set_timeout(self, timeout):
         self.timeout = timeout
 
+    # Records the batched input actions instead of running them
+    @contextmanager
+    def batch(self):
+        class MockActionResult:
+            def __init__(self, action):
+                self.action = action
+                self.duration_ms = 0
+
+        class MockBatch:
+            def __init__(self):
+                self.results = []
+                self.round_trip_ms = 0
+
+            def __getattr__(self, action):
+                return lambda *args, **kwargs: self.results.append(
+                    MockActionResult(action)
+                )
+
+        batch = MockBatch()
+        yield batch
+        self.actions += [r.action for r in batch.results]
+
 
 if __name__ == "__main__":
     # Create an instance of SandboxAgent with the mock sandbox
@@ -1,28 +1,36 @@
 # Enhanced Ubuntu AI RPA Agent with Visual Awareness
 # Combines best features from both approaches
 
+import atexit
+import json
+import logging
 import os
+import re
 import subprocess
-import requests
-import streamlit as st
-import pyautogui
+import time
+from datetime import datetime
+
 import cv2
 import numpy as np
+import pyautogui
+import requests
+import streamlit as st
 from PIL import Image
-import re
-import time
-from datetime import datetime
-import json
-import logging
+
+from screen_grabber import create_grabber
+from screenshot_writer import ScreenshotWriter
+from template_matching import (
+    TemplateLibrary,
+    TemplateMatcher,
+    scale_steps,
+    wait_for_template,
+)
 
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("rpa_agent.log"),
-        logging.StreamHandler()
-    ]
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[logging.FileHandler("rpa_agent.log"), logging.StreamHandler()],
 )
 
 # SETTINGS
@@ -32,10 +40,56 @@ LOG_DIR = "logs"
 TEMPLATE_DIR = "templates"
 HISTORY_FILE = "action_history.json"
 
+# Template search: 0 = exhaustive full resolution search, N = match on a frame
+# downscaled by 2**N first, then refine within PYRAMID_REFINE_MARGIN pixels
+PYRAMID_LEVELS = 0
+PYRAMID_REFINE_MARGIN = 8
+# Pixels searched around a template's last hit before falling back to a full
+# screen search (None disables the last-known-location hints)
+LOCATION_HINT_PADDING = 32
+# Template scales to try when templates were captured with a different display
+# scaling, e.g. scale_steps(0.5, 2.0, 9). The winning scale is remembered per
+# display. None only matches templates at their captured size.
+TEMPLATE_SCALES = None
+# wait_for_ui_element polls every WAIT_MIN_INTERVAL seconds while the screen
+# changes and backs off up to WAIT_MAX_INTERVAL while it is static
+WAIT_MIN_INTERVAL = 0.05
+WAIT_MAX_INTERVAL = 0.5
+# Step screenshots: "png" (quality = compression level 0-9), "jpeg" or "webp"
+# (quality 0-100, None = default), downscaled by SCREENSHOT_SCALE and written in
+# the background, dropping the oldest when more than SCREENSHOT_QUEUE_SIZE wait
+SCREENSHOT_FORMAT = "png"
+SCREENSHOT_QUALITY = None
+SCREENSHOT_SCALE = 1.0
+SCREENSHOT_QUEUE_SIZE = 16
+
 # Create necessary directories
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(TEMPLATE_DIR, exist_ok=True)
 
+# Screen capture backend: X11 MIT-SHM when available, pyautogui otherwise
+screen_grabber = create_grabber()
+
+# Encodes and writes step screenshots off the action loop
+screenshot_writer = ScreenshotWriter(
+    LOG_DIR,
+    image_format=SCREENSHOT_FORMAT,
+    quality=SCREENSHOT_QUALITY,
+    scale=SCREENSHOT_SCALE,
+    max_queue=SCREENSHOT_QUEUE_SIZE,
+)
+atexit.register(screenshot_writer.close)
+
+# Decoded templates, loaded once and hot-reloaded when a file changes
+template_library = TemplateLibrary(TEMPLATE_DIR, pyramid_levels=max(2, PYRAMID_LEVELS))
+template_matcher = TemplateMatcher(
+    template_library,
+    pyramid_levels=PYRAMID_LEVELS,
+    refine_margin=PYRAMID_REFINE_MARGIN,
+    hint_padding=LOCATION_HINT_PADDING,
+    scales=TEMPLATE_SCALES,
+)
+
 # Extended App Map for Ubuntu
 APP_MAP = {
     "terminal": "gnome-terminal",
@@ -53,89 +107,109 @@ APP_MAP = {
     "discord": "discord",
     "slack": "slack",
     "settings": "gnome-control-center",
-    "system monitor": "gnome-system-monitor"
+    "system monitor": "gnome-system-monitor",
 }
 
+
 # Screenshot Logger with enhanced metadata
+# Returns the path right away, the file is written in the background
 def log_screenshot(step_id, action_type="unknown", command="unknown"):
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    path = os.path.join(LOG_DIR, f"step{step_id}_{timestamp}.png")
-    img = pyautogui.screenshot()
-    img.save(path)
-    
+    frame = screen_grabber.grab()
+
     # Save metadata
     metadata = {
         "timestamp": timestamp,
         "step_id": step_id,
         "action_type": action_type,
-        "command": command
+        "command": command,
     }
-    
-    meta_path = os.path.join(LOG_DIR, f"step{step_id}_{timestamp}.json")
-    with open(meta_path, 'w') as f:
-        json.dump(metadata, f)
-    
-    return path
+
+    return screenshot_writer.submit(frame, f"step{step_id}_{timestamp}", metadata)
+
+
+# Grab the screen as a single grayscale frame for template matching
+def capture_screen_gray():
+    return screen_grabber.grab_gray()
+
 
 # Enhanced OpenCV Template Matching with multiple strategies
-def find_template_on_screen(template_name, threshold=0.7):
-    # First try direct template path
-    if os.path.exists(template_name):
-        template_path = template_name
-    else:
-        # Then try from template directory
-        template_path = os.path.join(TEMPLATE_DIR, f"{template_name}.png")
-        if not os.path.exists(template_path):
-            logging.warning(f"Template not found: {template_name}")
-            return None
+# region: optional (left, top, width, height) to restrict the search to
+def find_template_on_screen(template_name, threshold=0.7, region=None):
+    return find_templates_on_screen([template_name], threshold, region)[template_name]
 
+
+# Resolve several templates against one screenshot, so all results share a screen state
+def find_templates_on_screen(template_names, threshold=0.7, region=None):
     try:
-        screen = pyautogui.screenshot()
-        screen_np = np.array(screen)
-        screen_gray = cv2.cvtColor(screen_np, cv2.COLOR_RGB2GRAY)
-        template = cv2.imread(template_path, 0)
-        
-        # Try multiple matching methods if the first one fails
-        methods = [cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED]
-        
-        for method in methods:
-            res = cv2.matchTemplate(screen_gray, template, method)
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-            
-            if max_val >= threshold:
-                # Calculate center of template
-                w, h = template.shape[::-1]
-                center_x = max_loc[0] + w//2
-                center_y = max_loc[1] + h//2
-                return (center_x, center_y, max_val)
-        
-        return None
+        screen_gray = capture_screen_gray()
+    except Exception as e:
+        logging.error(f"Template matching error: {e}")
+        return {name: None for name in template_names}
+
+    return template_matcher.match_many(screen_gray, template_names, threshold, region)
+
+
+# Find every instance of a template (e.g. a column of checkboxes) in one pass
+# sort_by: "position" for reading order or "score" for best match first
+def find_all_on_screen(
+    template_name, threshold=0.8, max_results=None, sort_by="position", region=None
+):
+    try:
+        screen_gray = capture_screen_gray()
+        return template_matcher.find_all(
+            screen_gray, template_name, threshold, max_results, sort_by, region
+        )
+    except Exception as e:
+        logging.error(f"Template matching error: {e}")
+        return []
+
+
+# Wait for UI element to appear with timeout, re-matching only where the screen changed
+def wait_for_ui_element(template_name, timeout=10, threshold=0.7, region=None):
+    try:
+        result, metrics = wait_for_template(
+            template_matcher,
+            capture_screen_gray,
+            template_name,
+            timeout=timeout,
+            threshold=threshold,
+            region=region,
+            min_interval=WAIT_MIN_INTERVAL,
+            max_interval=WAIT_MAX_INTERVAL,
+        )
     except Exception as e:
         logging.error(f"Template matching error: {e}")
         return None
 
-# Wait for UI element to appear with timeout
-def wait_for_ui_element(template_name, timeout=10, threshold=0.7):
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        result = find_template_on_screen(template_name, threshold)
-        if result:
-            return result
-        time.sleep(0.5)
-    return None
+    if result:
+        logging.info(
+            f"Found {template_name} after {metrics['time_to_detect_ms']:.0f} ms "
+            f"({metrics['change_to_detect_ms']:.0f} ms after the frame that showed it, "
+            f"{metrics['frames']} frames, {metrics['searches']} searches)"
+        )
+    else:
+        logging.info(
+            f"{template_name} not found within {timeout}s "
+            f"({metrics['frames']} frames, {metrics['static_frames']} static, {metrics['searches']} searches, {metrics['full_searches']} full)"
+        )
+    return result
+
 
 # Enhanced Command Execution with verification
 def execute_command(action, command, step_id, active_app=None):
     logging.info(f"Executing: {action} -> {command}")
-    
+
     # Clean command
     if isinstance(command, str):
         command = command.strip()
-    
+
     # Execute based on action type
     if action == "shell_command":
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
+            result = subprocess.run(
+                command, shell=True, capture_output=True, text=True, timeout=30
+            )
             output = result.stdout or result.stderr or "✅ Command executed"
             log_path = log_screenshot(step_id, "shell", command)
             return output, log_path
@@ -149,10 +223,12 @@ def execute_command(action, command, step_id, active_app=None):
         if command.startswith("click "):
             target = command.replace("click ", "").strip()
             coords = find_template_on_screen(target)
-            
+
             if coords:
                 x, y, confidence = coords
-                logging.info(f"Found {target} at ({x}, {y}) with confidence {confidence:.2f}")
+                logging.info(
+                    f"Found {target} at ({x}, {y}) with confidence {confidence:.2f}"
+                )
                 pyautogui.moveTo(x, y, duration=0.5)
                 pyautogui.click()
                 time.sleep(0.5)  # Wait for UI to respond
@@ -160,35 +236,35 @@ def execute_command(action, command, step_id, active_app=None):
                 return f"🖱️ Clicked {target} (confidence: {confidence:.2f})", log_path
             else:
                 return f"⚠️ Could not find UI element: {target}", None
-        
+
         # Type action
         elif command.startswith("type "):
             text = command.replace("type ", "").strip()
             # Remove quotes if present
             if text.startswith('"') and text.endswith('"'):
                 text = text[1:-1]
-            
+
             pyautogui.write(text, interval=0.05)
             log_path = log_screenshot(step_id, "type", text)
             return f"⌨️ Typed: {text}", log_path
-        
+
         # Press key action
         elif command.startswith("press "):
             key = command.replace("press ", "").strip().lower()
             if key == "enter":
-                pyautogui.press('enter')
+                pyautogui.press("enter")
             elif key == "tab":
-                pyautogui.press('tab')
+                pyautogui.press("tab")
             elif key == "space":
-                pyautogui.press('space')
+                pyautogui.press("space")
             elif key == "escape" or key == "esc":
-                pyautogui.press('escape')
+                pyautogui.press("escape")
             else:
                 pyautogui.press(key)
-            
+
             log_path = log_screenshot(step_id, "press", key)
             return f"⌨️ Pressed {key}", log_path
-        
+
         # Open app action
         elif command.startswith("open app "):
             app = command.replace("open app ", "").strip().lower()
@@ -198,16 +274,18 @@ def execute_command(action, command, step_id, active_app=None):
                 log_path = log_screenshot(step_id, "open", app)
                 return f"🚀 Opened {app}", log_path
             return f"⚠️ Unknown app: {app}", None
-        
+
         # Wait action
         elif command.startswith("wait "):
             # Wait for seconds or for UI element
             parts = command.replace("wait ", "").strip().split(" for ")
-            
+
             if len(parts) == 1:
                 # Just wait seconds
                 try:
-                    seconds = float(parts[0].replace("seconds", "").replace("s", "").strip())
+                    seconds = float(
+                        parts[0].replace("seconds", "").replace("s", "").strip()
+                    )
                     time.sleep(seconds)
                     log_path = log_screenshot(step_id, "wait", f"{seconds} seconds")
                     return f"⏱️ Waited {seconds} seconds", log_path
@@ -222,39 +300,47 @@ def execute_command(action, command, step_id, active_app=None):
                     return f"👁️ Found element {element}", log_path
                 else:
                     return f"⚠️ Element {element} not found after timeout", None
-        
+
         # Drag action
         elif command.startswith("drag "):
             # Format: drag from element1 to element2
             match = re.search(r"drag from (.*) to (.*)", command)
             if match:
-                element1, element2 = match.groups()
-                coords1 = find_template_on_screen(element1.strip())
-                coords2 = find_template_on_screen(element2.strip())
-                
+                element1, element2 = (element.strip() for element in match.groups())
+                # Resolve both endpoints from the same frame
+                found = find_templates_on_screen([element1, element2])
+                coords1 = found[element1]
+                coords2 = found[element2]
+
                 if coords1 and coords2:
                     x1, y1, _ = coords1
                     x2, y2, _ = coords2
                     pyautogui.moveTo(x1, y1, duration=0.5)
                     pyautogui.dragTo(x2, y2, duration=1)
-                    log_path = log_screenshot(step_id, "drag", f"{element1} to {element2}")
+                    log_path = log_screenshot(
+                        step_id, "drag", f"{element1} to {element2}"
+                    )
                     return f"🖱️ Dragged from {element1} to {element2}", log_path
                 else:
-                    return "⚠️ Could not find one or both elements for drag operation", None
+                    return (
+                        "⚠️ Could not find one or both elements for drag operation",
+                        None,
+                    )
             else:
                 return "⚠️ Invalid drag command format", None
-    
+
     return "⚠️ Unknown action or command", None
 
+
 # Call LLM with automatic retry and follow-up
 def ask_llm(prompt, model, max_retries=3, retry_delay=2):
     for attempt in range(max_retries):
         try:
-            response = requests.post(OLLAMA_URL, json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False
-            }, timeout=30)
+            response = requests.post(
+                OLLAMA_URL,
+                json={"model": model, "prompt": prompt, "stream": False},
+                timeout=30,
+            )
             response.raise_for_status()
             return response.json()["response"]
         except requests.exceptions.RequestException as e:
@@ -265,11 +351,12 @@ def ask_llm(prompt, model, max_retries=3, retry_delay=2):
                 raise
     return ""
 
+
 # Process LLM response and follow up if needed
 def process_llm_response(prompt, model, response):
     # Extract actions from response
     actions = re.findall(r"ACTION:\s*(\w+)_command\s+([^\n]+)", response)
-    
+
     # If too few actions, try to get more
     if len(actions) < 2:
         logging.info("Initial response has too few actions, requesting follow-up")
@@ -277,83 +364,95 @@ def process_llm_response(prompt, model, response):
         try:
             follow_up_response = ask_llm(follow_up_prompt, model)
             # Clean up the response to avoid duplicating ACTION prefixes
-            cleaned_follow_up = re.sub(r"^(.*?ACTION:)", "ACTION:", follow_up_response, flags=re.DOTALL)
+            cleaned_follow_up = re.sub(
+                r"^(.*?ACTION:)", "ACTION:", follow_up_response, flags=re.DOTALL
+            )
             return response.strip() + "\n\n" + cleaned_follow_up.strip()
         except Exception as e:
             logging.error(f"Follow-up request failed: {e}")
             return response
-    
+
     return response
 
+
 # Record action history
 def save_action_history(task, actions, results):
     history = []
     if os.path.exists(HISTORY_FILE):
         try:
-            with open(HISTORY_FILE, 'r') as f:
+            with open(HISTORY_FILE, "r") as f:
                 history = json.load(f)
         except:
             pass
-    
+
     # Append new entry
-    history.append({
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "task": task,
-        "actions": [{"type": t, "command": c} for t, c in actions],
-        "results": results
-    })
-    
+    history.append(
+        {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "task": task,
+            "actions": [{"type": t, "command": c} for t, c in actions],
+            "results": results,
+        }
+    )
+
     # Save updated history
-    with open(HISTORY_FILE, 'w') as f:
+    with open(HISTORY_FILE, "w") as f:
         json.dump(history, f, indent=2)
 
+
 # STREAMLIT UI
 def main():
     st.set_page_config(page_title="Ubuntu AI RPA Agent", layout="wide")
-    
+
     # Sidebar configuration
     st.sidebar.title("🧠 Agent Settings")
     model = st.sidebar.selectbox("Select LLM model", MODEL_OPTIONS, index=0)
-    
+
     # Advanced settings in sidebar
     with st.sidebar.expander("Advanced Settings"):
-        template_threshold = st.slider("Template matching threshold", 0.5, 0.95, 0.7, 0.05)
+        template_threshold = st.slider(
+            "Template matching threshold", 0.5, 0.95, 0.7, 0.05
+        )
         command_timeout = st.slider("Command timeout (seconds)", 5, 60, 30, 5)
         show_debug = st.checkbox("Show debug info", value=False)
-    
+
     # History in sidebar
     with st.sidebar.expander("Action History"):
         if os.path.exists(HISTORY_FILE):
             try:
-                with open(HISTORY_FILE, 'r') as f:
+                with open(HISTORY_FILE, "r") as f:
                     history = json.load(f)
                     for i, entry in enumerate(history[-5:]):  # Show last 5 entries
                         st.write(f"**{entry['timestamp']}**: {entry['task']}")
                         if st.button(f"Rerun #{i+1}", key=f"rerun_{i}"):
-                            st.session_state.user_input = entry['task']
+                            st.session_state.user_input = entry["task"]
             except:
                 st.write("Could not load history")
-    
+
     # Main content
     st.title("🤖 Ubuntu AI RPA Agent")
     st.write("Tell me what you want me to do on your Ubuntu desktop")
-    
+
     # Input area
     user_input = st.text_input("💬 What should I do?", key="user_input")
     col1, col2 = st.columns([1, 1])
     take_screenshot = col1.button("📸 Take Screenshot")
-    
+
     if take_screenshot:
         screenshot_path = log_screenshot("manual", "screenshot", "manual")
-        st.image(screenshot_path, caption="Current Screen", use_column_width=True)
-    
+        preview = screenshot_writer.preview(screenshot_path)
+        if preview is not None:
+            st.image(
+                preview, caption="Current Screen", use_column_width=True, channels="BGR"
+            )
+
     # Process user input
     if user_input:
         st.markdown("### 🧠 Thinking...")
-        
+
         # Take initial screenshot for context
         initial_screen = log_screenshot("initial", "context", user_input)
-        
+
         # Build prompt
         prompt = f"""
 You are an Ubuntu Desktop RPA (Robotic Process Automation) Agent that helps users automate tasks.
@@ -383,65 +482,87 @@ Important:
             # Get and process LLM response
             response = ask_llm(prompt, model)
             final_response = process_llm_response(user_input, model, response)
-            
+
             if final_response:
                 # Display LLM instructions
                 st.markdown("#### 📋 Planned Actions:")
                 st.code(final_response)
-                
+
                 # Extract actions
-                actions = re.findall(r"ACTION:\s*(\w+)_command\s+([^\n]+)", final_response)
-                
+                actions = re.findall(
+                    r"ACTION:\s*(\w+)_command\s+([^\n]+)", final_response
+                )
+
                 if actions:
                     # Display all steps
                     for i, (action_type, command) in enumerate(actions):
-                        st.markdown(f"**Step {i+1}**: {action_type}_command → {command}")
-                    
+                        st.markdown(
+                            f"**Step {i+1}**: {action_type}_command → {command}"
+                        )
+
                     # Run button
                     if st.button("✅ Execute All Steps"):
                         results = []
                         active_app = None
-                        
+
                         # Execute each action
                         for i, (action_type, command) in enumerate(actions):
-                            with st.spinner(f"Running step {i+1} → {action_type}_command → {command}"):
+                            with st.spinner(
+                                f"Running step {i+1} → {action_type}_command → {command}"
+                            ):
                                 # Update active app context if needed
-                                if action_type == "gui" and "open app" in command.lower():
-                                    app_name = command.lower().replace("open app", "").strip()
+                                if (
+                                    action_type == "gui"
+                                    and "open app" in command.lower()
+                                ):
+                                    app_name = (
+                                        command.lower().replace("open app", "").strip()
+                                    )
                                     active_app = app_name
-                                
+
                                 # Execute the command
                                 result, log_img = execute_command(
-                                    action_type + "_command", 
-                                    command, 
-                                    i+1,
-                                    active_app
+                                    action_type + "_command", command, i + 1, active_app
                                 )
-                                
+
                                 # Store result
                                 results.append(result)
-                                
+
                                 # Display result and screenshot
                                 st.success(f"✅ Step {i+1}: {result}")
-                                if log_img:
-                                    st.image(log_img, caption=f"📸 After Step {i+1}", use_column_width=True)
-                                
+                                preview = (
+                                    screenshot_writer.preview(log_img)
+                                    if log_img
+                                    else None
+                                )
+                                if preview is not None:
+                                    st.image(
+                                        preview,
+                                        caption=f"📸 After Step {i+1}",
+                                        use_column_width=True,
+                                        channels="BGR",
+                                    )
+
                                 # Short delay between steps
                                 time.sleep(1)
-                        
+
+                        # Make sure every step screenshot is on disk
+                        screenshot_writer.flush()
+
                         # Save action history
                         save_action_history(user_input, actions, results)
-                        
+
                         st.balloons()
                         st.success("🎉 Task completed!")
                 else:
                     st.error("❌ No valid actions detected in LLM response")
             else:
                 st.error("❌ Failed to get response from LLM")
-        
+
         except Exception as e:
             st.error(f"❌ Error: {str(e)}")
             logging.error(f"Error in main flow: {str(e)}")
 
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,325 @@
+"""
+Screen Capture Backends for Ubuntu AI RPA Agent
+XShmGrabber reads the X11 framebuffer through MIT-SHM into a reusable shared
+memory buffer, PyAutoGUIGrabber is the portable fallback.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+# X11 / SysV IPC constants
+Z_PIXMAP = 2
+ALL_PLANES = 0xFFFFFFFFFFFFFFFF
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class XImage(ctypes.Structure):
+    # Only the leading fields are read, the struct is always allocated by Xlib
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+
+class ScreenGrabber(ABC):
+    """Base class: grabs the screen, or a (left, top, width, height) region of it"""
+
+    @abstractmethod
+    def size(self):
+        """Return the screen size as (width, height)"""
+
+    @abstractmethod
+    def grab(self, region=None):
+        """Return the pixels as a BGR array the caller owns"""
+
+    def grab_gray(self, region=None):
+        """Return the pixels as a grayscale array the caller owns"""
+        return cv2.cvtColor(self.grab(region), cv2.COLOR_BGR2GRAY)
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIGrabber(ScreenGrabber):
+    """Portable fallback, goes through a PIL screenshot"""
+
+    def __init__(self):
+        import pyautogui
+
+        self._pyautogui = pyautogui
+
+    def size(self):
+        return tuple(self._pyautogui.size())
+
+    def _screenshot(self, region):
+        return np.asarray(self._pyautogui.screenshot(region=region))
+
+    def grab(self, region=None):
+        return cv2.cvtColor(self._screenshot(region), cv2.COLOR_RGB2BGR)
+
+    def grab_gray(self, region=None):
+        return cv2.cvtColor(self._screenshot(region), cv2.COLOR_RGB2GRAY)
+
+
+class _ShmImage:
+    """An XImage backed by a SysV shared memory segment, plus a NumPy view of it"""
+
+    def __init__(self, grabber, width, height):
+        self._grabber = grabber
+        x11, xext, libc = grabber._x11, grabber._xext, grabber._libc
+
+        self.info = XShmSegmentInfo()
+        image = xext.XShmCreateImage(
+            grabber._display,
+            grabber._visual,
+            grabber._depth,
+            Z_PIXMAP,
+            None,
+            ctypes.byref(self.info),
+            width,
+            height,
+        )
+        if not image:
+            raise RuntimeError("XShmCreateImage failed")
+        self.image = ctypes.cast(image, ctypes.POINTER(XImage))
+
+        stride = self.image.contents.bytes_per_line
+        if self.image.contents.bits_per_pixel != 32:
+            x11.XFree(image)
+            raise RuntimeError(
+                f"Unsupported pixel format: {self.image.contents.bits_per_pixel} bpp"
+            )
+
+        self.info.shmid = libc.shmget(IPC_PRIVATE, stride * height, IPC_CREAT | 0o600)
+        if self.info.shmid < 0:
+            x11.XFree(image)
+            raise RuntimeError("shmget failed")
+        self.info.shmaddr = libc.shmat(self.info.shmid, None, 0)
+        if self.info.shmaddr in (None, ctypes.c_void_p(-1).value):
+            libc.shmctl(self.info.shmid, IPC_RMID, None)
+            x11.XFree(image)
+            raise RuntimeError("shmat failed")
+        self.image.contents.data = self.info.shmaddr
+        self.info.readOnly = 0
+
+        attached = xext.XShmAttach(grabber._display, ctypes.byref(self.info))
+        x11.XSync(grabber._display, 0)
+        # Mark the segment for removal now, it goes away once both sides detach
+        libc.shmctl(self.info.shmid, IPC_RMID, None)
+        if not attached or grabber._x_error:
+            grabber._x_error = None
+            libc.shmdt(ctypes.c_void_p(self.info.shmaddr))
+            x11.XFree(image)
+            raise RuntimeError("XShmAttach failed")
+
+        buffer = (ctypes.c_uint8 * (stride * height)).from_address(self.info.shmaddr)
+        # BGRX rows, padded to bytes_per_line
+        self.view = (
+            np.ctypeslib.as_array(buffer)
+            .reshape(height, stride)[:, : width * 4]
+            .reshape(height, width, 4)
+        )
+
+    def release(self):
+        grabber = self._grabber
+        grabber._xext.XShmDetach(grabber._display, ctypes.byref(self.info))
+        grabber._x11.XSync(grabber._display, 0)
+        grabber._libc.shmdt(ctypes.c_void_p(self.info.shmaddr))
+        grabber._x11.XFree(self.image)
+
+
+class XShmGrabber(ScreenGrabber):
+    """X11 MIT-SHM capture: the X server writes straight into a reusable shared buffer"""
+
+    # Shared images kept around for region grabs of different sizes
+    MAX_CACHED_IMAGES = 4
+
+    def __init__(self, display_name=None):
+        self._x11 = self._load("X11")
+        self._xext = self._load("Xext")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._declare()
+
+        self._display = self._x11.XOpenDisplay(
+            display_name.encode() if display_name else None
+        )
+        if not self._display:
+            raise RuntimeError("Cannot open X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            raise RuntimeError("MIT-SHM extension not available")
+
+        # Record X errors instead of letting Xlib's default handler exit the process
+        self._x_error = None
+        self._error_handler = XErrorHandler(self._on_x_error)
+        self._x11.XSetErrorHandler(self._error_handler)
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XDefaultRootWindow(self._display)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+        self._size = (
+            self._x11.XDisplayWidth(self._display, screen),
+            self._x11.XDisplayHeight(self._display, screen),
+        )
+        if self._depth not in (24, 32):
+            self._x11.XCloseDisplay(self._display)
+            raise RuntimeError(f"Unsupported display depth: {self._depth}")
+
+        self._images = {}  # (width, height) -> _ShmImage, oldest first
+        # Re-entrant: grab() converts the view while still holding the lock
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _load(name):
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise RuntimeError(f"lib{name} not found")
+        return ctypes.CDLL(path)
+
+    def _declare(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XSetErrorHandler.argtypes = [XErrorHandler]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.c_void_p
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.POINTER(XShmSegmentInfo),
+            ctypes.c_uint,
+            ctypes.c_uint,
+        ]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.c_void_p,
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        ]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def _on_x_error(self, display, event):
+        self._x_error = event
+        return 0
+
+    def size(self):
+        return self._size
+
+    def grab_view(self, region=None):
+        """
+        Return a BGRX view of the shared buffer, without copying.
+        The view is overwritten by the next grab of the same size.
+        """
+        if region is None:
+            left, top, (width, height) = 0, 0, self._size
+        else:
+            left, top, width, height = (int(v) for v in region)
+            left, top = max(0, left), max(0, top)
+            width = min(width, self._size[0] - left)
+            height = min(height, self._size[1] - top)
+            if width <= 0 or height <= 0:
+                raise ValueError(f"Region {region} is outside the screen")
+
+        with self._lock:
+            image = self._image(width, height)
+            if not self._xext.XShmGetImage(
+                self._display, self._root, image.image, left, top, ALL_PLANES
+            ):
+                raise RuntimeError("XShmGetImage failed")
+            return image.view
+
+    def grab(self, region=None):
+        with self._lock:
+            return cv2.cvtColor(self.grab_view(region), cv2.COLOR_BGRA2BGR)
+
+    def grab_gray(self, region=None):
+        with self._lock:
+            return cv2.cvtColor(self.grab_view(region), cv2.COLOR_BGRA2GRAY)
+
+    def _image(self, width, height):
+        key = (width, height)
+        image = self._images.pop(key, None)
+        if image is None:
+            image = _ShmImage(self, width, height)
+            if len(self._images) >= self.MAX_CACHED_IMAGES:
+                oldest = next(iter(self._images))
+                self._images.pop(oldest).release()
+        self._images[key] = image
+        return image
+
+    def close(self):
+        with self._lock:
+            for image in self._images.values():
+                image.release()
+            self._images.clear()
+            if self._display:
+                self._x11.XCloseDisplay(self._display)
+                self._display = None
+
+
+def create_grabber(prefer_shm=True):
+    """Return the fastest grabber that works on this machine"""
+    if prefer_shm:
+        try:
+            grabber = XShmGrabber()
+            logging.info("Screen capture: X11 MIT-SHM")
+            return grabber
+        except (OSError, RuntimeError) as e:
+            logging.info(
+                f"MIT-SHM capture not available ({e}), falling back to pyautogui"
+            )
+    return PyAutoGUIGrabber()
@@ -0,0 +1,142 @@
+"""
+Background Screenshot Logging for Ubuntu AI RPA Agent
+The action loop hands over frames it already captured, encoding and writing
+happen on worker threads off the critical path.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+
+import cv2
+
+# format -> (file extension, OpenCV quality flag, default quality)
+IMAGE_FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, 3),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 90),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 90),
+}
+
+
+class ScreenshotWriter:
+    """Bounded queue of screenshots written by a pool of worker threads"""
+
+    def __init__(
+        self,
+        log_dir,
+        image_format="png",
+        quality=None,
+        scale=1.0,
+        max_queue=16,
+        workers=2,
+    ):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+
+        self.log_dir = log_dir
+        self.extension, quality_flag, default_quality = IMAGE_FORMATS[image_format]
+        # PNG: compression level 0-9, JPEG / WebP: quality 0-100
+        self.encode_params = [
+            quality_flag,
+            default_quality if quality is None else quality,
+        ]
+        self.scale = scale
+        self.max_queue = max_queue
+        self.stats = {"written": 0, "dropped": 0, "failed": 0}
+
+        self._queue = collections.deque()
+        self._pending = {}  # path -> frame, until the file is on disk
+        self._in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(
+                target=self._work, name=f"screenshot-writer-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, frame, basename, metadata=None):
+        """Queue a BGR frame the caller no longer touches, returns the path it will be written to"""
+        path = os.path.join(self.log_dir, basename + self.extension)
+        meta_path = (
+            os.path.join(self.log_dir, basename + ".json")
+            if metadata is not None
+            else None
+        )
+
+        with self._cond:
+            # Under pressure the oldest screenshot is the least useful one
+            while len(self._queue) >= self.max_queue:
+                dropped = self._queue.popleft()
+                self._pending.pop(dropped[0], None)
+                self.stats["dropped"] += 1
+                logging.warning(f"Screenshot queue full, dropped {dropped[0]}")
+
+            self._queue.append((path, frame, meta_path, metadata))
+            self._pending[path] = frame
+            self._cond.notify()
+        return path
+
+    def preview(self, path):
+        """The frame for a path: from memory while it is queued, from disk once written"""
+        with self._cond:
+            frame = self._pending.get(path)
+        if frame is not None:
+            return frame
+        return path if os.path.exists(path) else None
+
+    def flush(self, timeout=None):
+        """Block until every queued screenshot is on disk, returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and not self._in_flight, timeout
+            )
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                path, frame, meta_path, metadata = self._queue.popleft()
+                self._in_flight += 1
+
+            try:
+                self._write(path, frame, meta_path, metadata)
+                result = "written"
+            except Exception as e:
+                logging.error(f"Failed to write screenshot {path}: {e}")
+                result = "failed"
+
+            with self._cond:
+                self._in_flight -= 1
+                self._pending.pop(path, None)
+                self.stats[result] += 1
+                self._cond.notify_all()
+
+    def _write(self, path, frame, meta_path, metadata):
+        if self.scale != 1.0:
+            frame = cv2.resize(
+                frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+
+        ok, encoded = cv2.imencode(self.extension, frame, self.encode_params)
+        if not ok:
+            raise RuntimeError(f"Could not encode {self.extension}")
+        with open(path, "wb") as f:
+            f.write(encoded.tobytes())
+
+        if meta_path is not None:
+            with open(meta_path, "w") as f:
+                json.dump(metadata, f)
@@ -0,0 +1,822 @@
+"""
+Template Matching Helpers for Ubuntu AI RPA Agent
+Keeps UI element templates decoded in memory so lookups never touch the disk
+unless a template file actually changed.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+TEMPLATE_EXTENSION = ".png"
+
+# Matching methods, tried in order until one clears the threshold
+MATCH_METHODS = (cv2.TM_CCOEFF_NORMED, cv2.TM_CCORR_NORMED)
+
+# Location hints only trust the discriminative method: TM_CCORR_NORMED scores
+# almost any patch of similar brightness highly
+HINT_METHODS = (cv2.TM_CCOEFF_NORMED,)
+
+# Stop building pyramid levels once a template gets smaller than this
+MIN_PYRAMID_SIZE = 8
+
+# Downscaled scores are blurrier than full resolution ones, so the coarse pass
+# only has to reach this fraction of the threshold to be refined
+COARSE_THRESHOLD_RATIO = 0.8
+
+
+class Template:
+    """A grayscale template plus the data derived from it"""
+
+    def __init__(self, name, path, image, mtime, pyramid_levels=2):
+        self.name = name
+        self.path = path
+        self.image = image
+        self.mtime = mtime
+        self.height, self.width = image.shape[:2]
+        self.pyramid_levels = pyramid_levels
+        # Scale relative to the template file, see scaled()
+        self.scale = 1.0
+        self._variants = {}
+
+        mean, stddev = cv2.meanStdDev(image)
+        self.mean = float(mean[0][0])
+        self.stddev = float(stddev[0][0])
+
+        # pyramid[0] is the full resolution template, each level halves it
+        self.pyramid = [image]
+        for _ in range(pyramid_levels):
+            height, width = self.pyramid[-1].shape[:2]
+            if min(width, height) // 2 < MIN_PYRAMID_SIZE:
+                break
+            self.pyramid.append(cv2.pyrDown(self.pyramid[-1]))
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def scaled(self, scale):
+        """This template resized by scale, resized variants are cached"""
+        scale = round(scale, 3)
+        if scale == 1.0:
+            return self
+        variant = self._variants.get(scale)
+        if variant is None:
+            size = (
+                max(1, round(self.width * scale)),
+                max(1, round(self.height * scale)),
+            )
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            image = cv2.resize(self.image, size, interpolation=interpolation)
+            variant = Template(
+                self.name, self.path, image, self.mtime, self.pyramid_levels
+            )
+            variant.scale = scale
+            self._variants[scale] = variant
+        return variant
+
+
+def scale_steps(low, high, count):
+    """
+    count geometrically spaced scales from low to high, e.g. for TemplateMatcher(scales=...).
+    1.0 is always included when it lies in the range.
+    """
+    if count < 2:
+        return (1.0,)
+    scales = {round(low * (high / low) ** (i / (count - 1)), 3) for i in range(count)}
+    if low <= 1.0 <= high:
+        scales.add(1.0)
+    return tuple(sorted(scales))
+
+
+class TemplateLibrary:
+    """In-memory cache of the templates in a directory with mtime based hot-reload"""
+
+    def __init__(self, template_dir, pyramid_levels=2, check_interval=1.0):
+        self.template_dir = template_dir
+        self.pyramid_levels = pyramid_levels
+        # Minimum number of seconds between two mtime checks of the same file
+        self.check_interval = check_interval
+
+        self._templates = {}  # path -> Template
+        self._aliases = {}  # lookup name -> path
+        self._checked = {}  # path -> time of the last mtime check
+        self._lock = threading.RLock()
+
+        self.reload()
+
+    def reload(self):
+        """Load new or modified templates and forget the ones that were deleted"""
+        with self._lock:
+            seen = set()
+            if os.path.isdir(self.template_dir):
+                for entry in os.scandir(self.template_dir):
+                    if not entry.is_file() or not entry.name.endswith(
+                        TEMPLATE_EXTENSION
+                    ):
+                        continue
+                    seen.add(entry.path)
+                    self._refresh(entry.path, entry.stat().st_mtime)
+
+            template_dir = os.path.abspath(self.template_dir)
+            for path in list(self._templates):
+                if (
+                    os.path.dirname(os.path.abspath(path)) == template_dir
+                    and path not in seen
+                ):
+                    self._forget(path)
+
+            return len(self._templates)
+
+    def get(self, name):
+        """Return the Template for a file path or a name in the template directory"""
+        now = time.monotonic()
+        with self._lock:
+            path = self._aliases.get(name)
+            if (
+                path is not None
+                and now - self._checked.get(path, 0) < self.check_interval
+            ):
+                return self._templates.get(path)
+
+            path = self._resolve(name)
+            if path is None:
+                self._aliases.pop(name, None)
+                return None
+
+            self._aliases[name] = path
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                self._forget(path)
+                return None
+            return self._refresh(path, mtime)
+
+    def names(self):
+        """Names of all templates currently loaded from the template directory"""
+        with self._lock:
+            return sorted(t.name for t in self._templates.values())
+
+    def _resolve(self, name):
+        # First try direct template path, then the template directory
+        if os.path.isfile(name):
+            return name
+        path = os.path.join(self.template_dir, f"{name}{TEMPLATE_EXTENSION}")
+        if os.path.isfile(path):
+            return path
+        return None
+
+    def _refresh(self, path, mtime):
+        self._checked[path] = time.monotonic()
+        template = self._templates.get(path)
+        if template is not None and template.mtime == mtime:
+            return template
+
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            logging.warning(f"Could not decode template: {path}")
+            self._forget(path)
+            return None
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        template = Template(name, path, image, mtime, self.pyramid_levels)
+        self._templates[path] = template
+        logging.info(f"Loaded template {name} ({template.width}x{template.height})")
+        return template
+
+    def _forget(self, path):
+        self._templates.pop(path, None)
+        self._checked.pop(path, None)
+        for name, alias in list(self._aliases.items()):
+            if alias == path:
+                del self._aliases[name]
+
+
+class ScreenFrame:
+    """A grayscale screen frame with lazily built, cached pyramid levels"""
+
+    def __init__(self, gray):
+        self.gray = gray
+        self._pyramid = [gray]
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return (self.gray.shape[1], self.gray.shape[0])
+
+    def level(self, n):
+        """The frame downscaled by 2**n"""
+        with self._lock:
+            while len(self._pyramid) <= n:
+                self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+            return self._pyramid[n]
+
+
+def as_frame(screen):
+    return screen if isinstance(screen, ScreenFrame) else ScreenFrame(screen)
+
+
+def match_template(screen_gray, template, threshold=0.7, methods=MATCH_METHODS):
+    """Return (center_x, center_y, confidence) of the best match, or None"""
+    screen_height, screen_width = screen_gray.shape[:2]
+    if template.width > screen_width or template.height > screen_height:
+        return None
+
+    for method in methods:
+        res = cv2.matchTemplate(screen_gray, template.image, method)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+
+        if max_val >= threshold:
+            # Calculate center of template
+            center_x = max_loc[0] + template.width // 2
+            center_y = max_loc[1] + template.height // 2
+            return (center_x, center_y, max_val)
+
+    return None
+
+
+def _coarse_peaks(res, count, suppress_w, suppress_h):
+    # Best few peaks of a response map, blanking out a window around each one
+    res = res.copy()
+    peaks = []
+    for _ in range(count):
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if max_val == -np.inf:
+            break
+        peaks.append((max_val, max_loc))
+        x, y = max_loc
+        res[
+            max(0, y - suppress_h) : y + suppress_h + 1,
+            max(0, x - suppress_w) : x + suppress_w + 1,
+        ] = -np.inf
+    return peaks
+
+
+def match_template_pyramid(
+    frame,
+    template,
+    threshold=0.7,
+    levels=2,
+    refine_margin=8,
+    candidates=3,
+    methods=MATCH_METHODS,
+):
+    """Coarse-to-fine search: match on a downscaled frame, refine around the best peaks"""
+    frame = as_frame(frame)
+    level = min(levels, len(template.pyramid) - 1)
+    if level <= 0:
+        return match_template(frame.gray, template, threshold, methods)
+
+    screen_small = frame.level(level)
+    template_small = template.pyramid[level]
+    if (
+        template_small.shape[0] > screen_small.shape[0]
+        or template_small.shape[1] > screen_small.shape[1]
+    ):
+        return None
+
+    scale = 2**level
+    # The refine window must at least cover the rounding error of the coarse level
+    margin = max(refine_margin, scale)
+    screen_height, screen_width = frame.gray.shape[:2]
+
+    for method in methods:
+        res = cv2.matchTemplate(screen_small, template_small, method)
+        peaks = _coarse_peaks(
+            res, candidates, template_small.shape[1] // 2, template_small.shape[0] // 2
+        )
+
+        best = None
+        for coarse_val, (coarse_x, coarse_y) in peaks:
+            if coarse_val < threshold * COARSE_THRESHOLD_RATIO:
+                break
+
+            # Refine in a small window around the peak at full resolution
+            x0 = max(0, coarse_x * scale - margin)
+            y0 = max(0, coarse_y * scale - margin)
+            x1 = min(screen_width, coarse_x * scale + template.width + margin)
+            y1 = min(screen_height, coarse_y * scale + template.height + margin)
+            if x1 - x0 < template.width or y1 - y0 < template.height:
+                continue
+
+            roi_res = cv2.matchTemplate(
+                frame.gray[y0:y1, x0:x1], template.image, method
+            )
+            _, max_val, _, max_loc = cv2.minMaxLoc(roi_res)
+            if max_val >= threshold and (best is None or max_val > best[2]):
+                best = (
+                    x0 + max_loc[0] + template.width // 2,
+                    y0 + max_loc[1] + template.height // 2,
+                    max_val,
+                )
+
+        if best is not None:
+            return best
+
+    return None
+
+
+def non_max_suppression(boxes, scores, overlap=0.3, max_results=None):
+    """
+    Greedy NMS over (x0, y0, x1, y1) boxes: keep the best box, drop everything that
+    overlaps it by more than `overlap` (IoU), repeat. Returns the kept indices.
+    """
+    x0, y0, x1, y1 = (boxes[:, i].astype(np.float32) for i in range(4))
+    areas = (x1 - x0) * (y1 - y0)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size and (max_results is None or len(keep) < max_results):
+        best, rest = order[0], order[1:]
+        keep.append(int(best))
+        width = np.clip(
+            np.minimum(x1[best], x1[rest]) - np.maximum(x0[best], x0[rest]), 0, None
+        )
+        height = np.clip(
+            np.minimum(y1[best], y1[rest]) - np.maximum(y0[best], y0[rest]), 0, None
+        )
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection)
+        order = rest[iou <= overlap]
+    return keep
+
+
+def find_all_matches(
+    screen_gray,
+    template,
+    threshold=0.8,
+    max_results=None,
+    overlap=0.3,
+    sort_by="score",
+    method=cv2.TM_CCOEFF_NORMED,
+):
+    """Every match above the threshold from one response map, as (center_x, center_y, confidence)"""
+    screen_height, screen_width = screen_gray.shape[:2]
+    if template.width > screen_width or template.height > screen_height:
+        return []
+
+    res = cv2.matchTemplate(screen_gray, template.image, method)
+    # Local maxima above the threshold are the candidate peaks
+    peaks = (res >= threshold) & (res >= cv2.dilate(res, np.ones((3, 3), np.uint8)))
+    ys, xs = np.nonzero(peaks)
+    if not xs.size:
+        return []
+
+    scores = res[ys, xs]
+    boxes = np.stack([xs, ys, xs + template.width, ys + template.height], axis=1)
+    keep = non_max_suppression(boxes, scores, overlap, max_results)
+
+    results = [
+        (
+            int(xs[i]) + template.width // 2,
+            int(ys[i]) + template.height // 2,
+            float(scores[i]),
+        )
+        for i in keep
+    ]
+    if sort_by == "position":
+        # Reading order: rows of roughly half a template height, then left to right
+        row_height = max(1, template.height // 2)
+        results.sort(key=lambda r: (r[1] // row_height, r[0]))
+    elif sort_by != "score":
+        raise ValueError(f"Unknown sort order: {sort_by}")
+    return results
+
+
+def rank_scales(frame, variants, level=1):
+    """Order template variants by their best correlation on a downscaled frame"""
+    frame = as_frame(frame)
+    ranked = []
+    for variant in variants:
+        variant_level = min(level, len(variant.pyramid) - 1)
+        screen = frame.level(variant_level)
+        small = variant.pyramid[variant_level]
+        if small.shape[0] > screen.shape[0] or small.shape[1] > screen.shape[1]:
+            continue
+        res = cv2.matchTemplate(screen, small, cv2.TM_CCOEFF_NORMED)
+        ranked.append((cv2.minMaxLoc(res)[1], variant))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return [variant for _, variant in ranked]
+
+
+def clamp_region(region, size):
+    """Clip a (left, top, width, height) region to the frame, returns (x0, y0, x1, y1)"""
+    left, top, width, height = region
+    x0, y0 = max(0, int(left)), max(0, int(top))
+    x1, y1 = min(size[0], int(left + width)), min(size[1], int(top + height))
+    return x0, y0, x1, y1
+
+
+class TemplateMatcher:
+    """Resolves templates from a TemplateLibrary against grayscale screen frames"""
+
+    def __init__(
+        self,
+        library,
+        max_workers=None,
+        pyramid_levels=0,
+        refine_margin=8,
+        hint_padding=32,
+        hint_confidence=0.9,
+        scales=None,
+        scale_candidates=2,
+    ):
+        self.library = library
+        # 0 runs the exhaustive full resolution search, >0 the coarse-to-fine search
+        self.pyramid_levels = pyramid_levels
+        self.refine_margin = refine_margin
+        # Pixels searched around the last hit of a template before a full search,
+        # None disables the last-known-location hints
+        self.hint_padding = hint_padding
+        # A weak match next to the old spot is more likely a neighbour than the
+        # element itself, so hint hits must clear this confidence as well
+        self.hint_confidence = hint_confidence
+        # Template scales to sweep for DPI / scaling differences, None = 1.0 only.
+        # The sweep ranks every scale on a coarse frame and refines the best few.
+        self.scales = tuple(scales) if scales else None
+        self.scale_candidates = scale_candidates
+        # OpenCV releases the GIL inside matchTemplate, so threads run in parallel
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="template-match",
+        )
+
+        self._hints = {}  # template path -> (center x, center y, scale) of the last hit
+        self._hint_screen_size = None
+        self._scales = (
+            {}
+        )  # screen size or (screen size, template path) -> winning scale
+        self._hint_lock = threading.Lock()
+        self.stats = {
+            "hint_hits": 0,
+            "hint_misses": 0,
+            "region_searches": 0,
+            "full_searches": 0,
+            "scale_sweeps": 0,
+        }
+
+    def match(self, screen, name, threshold=0.7, region=None):
+        """Find a single template in a grayscale frame, optionally within a (left, top, width, height) region"""
+        template = self.library.get(name)
+        if template is None:
+            logging.warning(f"Template not found: {name}")
+            return None
+
+        frame = as_frame(screen)
+
+        # Try around the last known location first
+        hint = self._get_hint(template, frame.size)
+        if hint is not None and region is not None:
+            x0, y0, x1, y1 = clamp_region(region, frame.size)
+            if not (x0 <= hint[0] < x1 and y0 <= hint[1] < y1):
+                hint = None
+        if hint is not None:
+            variant = template.scaled(hint[2])
+            window = (
+                hint[0] - variant.width // 2 - self.hint_padding,
+                hint[1] - variant.height // 2 - self.hint_padding,
+                variant.width + 2 * self.hint_padding,
+                variant.height + 2 * self.hint_padding,
+            )
+            result = self._search(
+                frame,
+                variant,
+                max(threshold, self.hint_confidence),
+                window,
+                pyramid=False,
+                methods=HINT_METHODS,
+            )
+            self._count("hint_hits" if result else "hint_misses")
+            if result:
+                self._set_hint(template, result, variant.scale)
+                return result
+
+        self._count("full_searches" if region is None else "region_searches")
+        result, scale = self._search_scales(frame, template, threshold, region)
+        self._set_hint(template, result, scale)
+        return result
+
+    def find_all(
+        self,
+        screen,
+        name,
+        threshold=0.8,
+        max_results=None,
+        sort_by="score",
+        region=None,
+    ):
+        """Every instance of a template in the frame, in a single matchTemplate pass"""
+        template = self.library.get(name)
+        if template is None:
+            logging.warning(f"Template not found: {name}")
+            return []
+
+        frame = as_frame(screen)
+        if self.scales:
+            remembered = self._remembered_scale(template, frame.size)
+            if remembered is not None:
+                template = template.scaled(remembered)
+
+        if region is None:
+            gray, x0, y0 = frame.gray, 0, 0
+        else:
+            x0, y0, x1, y1 = clamp_region(region, frame.size)
+            gray = frame.gray[y0:y1, x0:x1]
+
+        matches = find_all_matches(
+            gray, template, threshold, max_results, sort_by=sort_by
+        )
+        return [(x + x0, y + y0, score) for x, y, score in matches]
+
+    def forget_hints(self):
+        """Drop every cached location, e.g. after the screen layout changed"""
+        with self._hint_lock:
+            self._hints.clear()
+
+    def _search_scales(self, frame, template, threshold, region=None):
+        if not self.scales:
+            return self._search(frame, template, threshold, region), 1.0
+
+        # Go straight to the scale that won on this display before. Like a location
+        # hint it only trusts TM_CCOEFF_NORMED, the fallback would accept the wrong scale
+        remembered = self._remembered_scale(template, frame.size)
+        if remembered is not None:
+            result = self._search(
+                frame,
+                template.scaled(remembered),
+                threshold,
+                region,
+                methods=HINT_METHODS,
+            )
+            if result:
+                return result, remembered
+
+        self._count("scale_sweeps")
+        if region is None:
+            screen = frame
+        else:
+            x0, y0, x1, y1 = clamp_region(region, frame.size)
+            screen = frame.gray[y0:y1, x0:x1]
+        variants = [
+            template.scaled(scale) for scale in self.scales if scale != remembered
+        ]
+        ranked = rank_scales(screen, variants, max(1, self.pyramid_levels))
+
+        for variant in ranked[: self.scale_candidates]:
+            result = self._search(frame, variant, threshold, region)
+            if result:
+                self._remember_scale(template, frame.size, variant.scale)
+                return result, variant.scale
+        return None, 1.0
+
+    def _remembered_scale(self, template, screen_size):
+        with self._hint_lock:
+            scale = self._scales.get((screen_size, template.path))
+            return scale if scale is not None else self._scales.get(screen_size)
+
+    def _remember_scale(self, template, screen_size, scale):
+        with self._hint_lock:
+            self._scales[(screen_size, template.path)] = scale
+            self._scales[screen_size] = scale
+
+    def _search(
+        self,
+        frame,
+        template,
+        threshold,
+        region=None,
+        pyramid=True,
+        methods=MATCH_METHODS,
+    ):
+        if region is None:
+            screen, x0, y0 = frame, 0, 0
+        else:
+            x0, y0, x1, y1 = clamp_region(region, frame.size)
+            if x1 - x0 < template.width or y1 - y0 < template.height:
+                return None
+            screen = frame.gray[y0:y1, x0:x1]
+
+        if pyramid and self.pyramid_levels > 0:
+            result = match_template_pyramid(
+                screen,
+                template,
+                threshold,
+                self.pyramid_levels,
+                self.refine_margin,
+                methods=methods,
+            )
+        else:
+            result = match_template(as_frame(screen).gray, template, threshold, methods)
+
+        if result is None:
+            return None
+        return (result[0] + x0, result[1] + y0, result[2])
+
+    def _get_hint(self, template, screen_size):
+        if self.hint_padding is None:
+            return None
+        with self._hint_lock:
+            # A resolution change invalidates every cached location
+            if screen_size != self._hint_screen_size:
+                self._hints.clear()
+                self._hint_screen_size = screen_size
+            return self._hints.get(template.path)
+
+    def _set_hint(self, template, result, scale=1.0):
+        if self.hint_padding is None:
+            return
+        with self._hint_lock:
+            if result is None:
+                self._hints.pop(template.path, None)
+            else:
+                self._hints[template.path] = (result[0], result[1], scale)
+
+    def _count(self, key):
+        with self._hint_lock:
+            self.stats[key] += 1
+
+    def match_many(self, screen, names, threshold=0.7, region=None):
+        """Find several templates in the same frame, returns {name: result or None}"""
+        # Share one frame (and its lazily built pyramid) between all the lookups
+        frame = as_frame(screen)
+
+        unique_names = list(dict.fromkeys(names))
+        if len(unique_names) == 1:
+            futures = None
+        else:
+            futures = {
+                name: self._executor.submit(self.match, frame, name, threshold, region)
+                for name in unique_names
+            }
+
+        results = {}
+        for name in unique_names:
+            try:
+                if futures is None:
+                    results[name] = self.match(frame, name, threshold, region)
+                else:
+                    results[name] = futures[name].result()
+            except Exception as e:
+                logging.error(f"Template matching error for {name}: {e}")
+                results[name] = None
+        return results
+
+
+class FrameChangeDetector:
+    """Compares cheap downsampled frames and reports which screen regions changed"""
+
+    def __init__(self, scale=8, diff_threshold=12, tile_size=4):
+        self.scale = scale  # Downsampling factor of the thumbnails
+        self.diff_threshold = diff_threshold  # Minimum gray level change that counts
+        self.tile_size = tile_size  # Thumbnail pixels per tile when grouping changes
+        self._previous = None
+
+    def reset(self):
+        self._previous = None
+
+    def update(self, gray):
+        """Return the changed (left, top, width, height) regions since the last frame, None for the first frame"""
+        height, width = gray.shape[:2]
+        thumb = cv2.resize(
+            gray,
+            (max(1, width // self.scale), max(1, height // self.scale)),
+            interpolation=cv2.INTER_AREA,
+        )
+        previous, self._previous = self._previous, thumb
+        if previous is None or previous.shape != thumb.shape:
+            return None
+
+        changed = cv2.absdiff(previous, thumb) > self.diff_threshold
+        if not changed.any():
+            return []
+
+        # Group changed pixels into tiles, then tiles into connected boxes
+        tiles_y = -(-changed.shape[0] // self.tile_size)
+        tiles_x = -(-changed.shape[1] // self.tile_size)
+        padded = np.zeros(
+            (tiles_y * self.tile_size, tiles_x * self.tile_size), np.uint8
+        )
+        padded[: changed.shape[0], : changed.shape[1]] = changed
+        tiles = padded.reshape(tiles_y, self.tile_size, tiles_x, self.tile_size).max(
+            axis=(1, 3)
+        )
+
+        count, _, boxes, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+        step = self.scale * self.tile_size
+        return [
+            (int(x * step), int(y * step), int(w * step), int(h * step))
+            for x, y, w, h, _ in boxes[1:count]
+        ]
+
+
+def intersect_regions(a, b):
+    """Intersection of two (left, top, width, height) regions, or None"""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def wait_for_template(
+    matcher,
+    capture,
+    name,
+    timeout=10,
+    threshold=0.7,
+    region=None,
+    min_interval=0.05,
+    max_interval=0.5,
+    backoff=1.5,
+    max_regions=4,
+    detector=None,
+    full_search_interval=None,
+):
+    """
+    Poll capture() until the template shows up, re-matching only where the screen changed.
+    The poll interval starts at min_interval and backs off towards max_interval while the
+    screen is static. Changes too small for the detector are still found by a search of
+    the whole region every full_search_interval seconds (max_interval by default).
+    Returns (result or None, metrics dict).
+    """
+    detector = detector or FrameChangeDetector()
+    if full_search_interval is None:
+        full_search_interval = max_interval
+    start = time.monotonic()
+    last_full_search = start
+    interval = min_interval
+    metrics = {
+        "frames": 0,
+        "static_frames": 0,
+        "searches": 0,
+        "full_searches": 0,
+        "time_to_detect_ms": None,
+        "change_to_detect_ms": None,
+    }
+
+    while True:
+        frame_time = time.monotonic()
+        frame = ScreenFrame(capture())
+        metrics["frames"] += 1
+        changes = detector.update(frame.gray)
+
+        if changes is None:
+            # First frame: search everything we were asked to
+            search_regions = [region]
+        elif not changes:
+            metrics["static_frames"] += 1
+            search_regions = []
+        else:
+            template = matcher.library.get(name)
+            largest = max(matcher.scales or (1.0,))
+            pad_x, pad_y = (
+                (int(template.width * largest), int(template.height * largest))
+                if template
+                else (0, 0)
+            )
+            search_regions = []
+            for left, top, width, height in changes:
+                padded = (
+                    left - pad_x,
+                    top - pad_y,
+                    width + 2 * pad_x,
+                    height + 2 * pad_y,
+                )
+                if region is not None:
+                    padded = intersect_regions(padded, region)
+                if padded is not None:
+                    search_regions.append(padded)
+            # Many scattered changes: one search over everything is cheaper
+            if len(search_regions) > max_regions:
+                search_regions = [region]
+
+        if (
+            search_regions != [region]
+            and frame_time - last_full_search >= full_search_interval
+        ):
+            metrics["full_searches"] += 1
+            search_regions = [region]
+        if search_regions == [region]:
+            last_full_search = frame_time
+
+        for search_region in search_regions:
+            metrics["searches"] += 1
+            result = matcher.match(frame, name, threshold, search_region)
+            if result:
+                now = time.monotonic()
+                metrics["time_to_detect_ms"] = (now - start) * 1000
+                metrics["change_to_detect_ms"] = (now - frame_time) * 1000
+                return result, metrics
+
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            return None, metrics
+
+        # Poll fast while the screen is moving, back off while it is static
+        interval = min_interval if changes else min(max_interval, interval * backoff)
+        time.sleep(min(interval, max(0.0, timeout - elapsed)))
@@ -0,0 +1,83 @@
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+import pytest
+
+from screen_grabber import ScreenGrabber, XShmGrabber
+
+XVFB_DISPLAY = ":99"
+XVFB_SIZE = (320, 240)
+
+
+def test_grabber_without_grab_cannot_be_created():
+    class SizeOnly(ScreenGrabber):
+        def size(self):
+            return (1, 1)
+
+    with pytest.raises(TypeError):
+        SizeOnly()
+
+
+@pytest.fixture(scope="module")
+def display():
+    """A display to capture: a fresh Xvfb if installed, else the current DISPLAY"""
+    if shutil.which("Xvfb"):
+        width, height = XVFB_SIZE
+        xvfb = subprocess.Popen(
+            ["Xvfb", XVFB_DISPLAY, "-screen", "0", f"{width}x{height}x24"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        socket = f"/tmp/.X11-unix/X{XVFB_DISPLAY[1:]}"
+        deadline = time.monotonic() + 5
+        while not os.path.exists(socket) and xvfb.poll() is None:
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        if os.path.exists(socket):
+            yield XVFB_DISPLAY, XVFB_SIZE
+            xvfb.terminate()
+            xvfb.wait()
+            return
+        xvfb.terminate()
+    if not os.environ.get("DISPLAY"):
+        pytest.skip("No Xvfb and no DISPLAY to capture")
+    yield os.environ["DISPLAY"], None
+
+
+@pytest.fixture
+def grabber(display):
+    name, _ = display
+    try:
+        grabber = XShmGrabber(name)
+    except (OSError, RuntimeError) as e:
+        pytest.skip(f"MIT-SHM capture not available: {e}")
+    yield grabber
+    grabber.close()
+
+
+def test_xshm_grab_matches_screen_size(grabber, display):
+    _, size = display
+    width, height = grabber.size()
+    if size is not None:
+        assert (width, height) == size
+
+    frame = grabber.grab()
+    assert frame.shape == (height, width, 3) and frame.dtype == np.uint8
+    assert grabber.grab_gray().shape == (height, width)
+
+
+def test_xshm_region_is_a_crop_of_the_screen(grabber, display):
+    frame = grabber.grab()
+    region = grabber.grab(region=(10, 20, 30, 40))
+    assert region.shape == (40, 30, 3)
+    # Only a fresh Xvfb is sure not to change between the grabs
+    _, size = display
+    if size is not None:
+        assert np.array_equal(region, frame[20:60, 10:40])
+    # Regions are clipped to the screen
+    width, height = grabber.size()
+    assert grabber.grab(region=(width - 5, height - 5, 50, 50)).shape == (5, 5, 3)